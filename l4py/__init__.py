@@ -1,3 +1,25 @@
-from .builder import LogConfigBuilder
-from .builder import LogConfigBuilderDjango
-from .builder import get_logger
+import importlib
+
+# resolved on first access, `import l4py` does not load the builder, logging.config or the formatters
+_EXPORTS = {
+    'LogConfigBuilder': 'l4py.builder',
+    'LogConfigBuilderDjango': 'l4py.builder',
+    'get_logger': 'l4py.builder',
+    'LoggerMixin': 'l4py.builder',
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name: str):
+    module_name = _EXPORTS.get(name)
+    if module_name is None:
+        # submodules, e.g. `l4py.context` after a plain `import l4py`
+        try:
+            return importlib.import_module(f'{__name__}.{name}')
+        except ModuleNotFoundError as e:
+            if e.name != f'{__name__}.{name}':
+                raise
+            raise AttributeError(f'module {__name__!r} has no attribute {name!r}') from None
+    value = globals()[name] = getattr(importlib.import_module(module_name), name)
+    return value
@@ -0,0 +1,3 @@
+from l4py.cli import main
+
+main()
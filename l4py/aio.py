@@ -0,0 +1,69 @@
+import asyncio
+import logging
+import uuid
+from typing import Callable, Optional
+
+from l4py.context import bind, reset_context
+from l4py.handlers import end_trace
+
+
+class LoggingContextMiddleware:
+    """
+    ASGI middleware binding `trace_id` (from the ``header_name`` request header or a new one) and
+    `user_id` (from ``user_id_getter(scope)``) for the request, the `trace_id` is sent back in the response headers.
+
+    Every request runs in its own task, so the context is isolated between concurrent requests
+    and is propagated to the tasks created while handling the request.
+    Combine it with `LogConfigBuilder().async_handlers(True)` so formatting and I/O do not run on the event loop.
+    """
+
+    def __init__(
+            self,
+            app,
+            header_name: str = 'X-Trace-Id',
+            user_id_getter: Callable[[dict], Optional[str]] = None,
+    ):
+        self.app = app
+        self.header_name = header_name.lower().encode('latin-1')
+        self.user_id_getter = user_id_getter
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] not in ('http', 'websocket'):
+            return await self.app(scope, receive, send)
+
+        trace_id = None
+        for name, value in scope.get('headers', ()):
+            if name == self.header_name:
+                trace_id = value.decode('latin-1')
+                break
+        trace_id = trace_id or uuid.uuid4().hex
+        user_id = self.user_id_getter(scope) if self.user_id_getter else None
+        trace_id_header = (self.header_name, trace_id.encode('latin-1'))
+
+        async def send_with_trace_id(message):
+            if message['type'] == 'http.response.start':
+                message = {**message, 'headers': [*message.get('headers', ()), trace_id_header]}
+            await send(message)
+
+        token = bind(trace_id=trace_id, user_id=user_id)
+        try:
+            await self.app(scope, receive, send_with_trace_id)
+        finally:
+            reset_context(token)
+            end_trace(trace_id)
+
+
+async def flush() -> None:
+    """
+    Flushes the handlers of the root logger in the default executor, the event loop keeps running meanwhile.
+    """
+    handlers = logging.getLogger().handlers[:]
+    await asyncio.get_running_loop().run_in_executor(None, lambda: [handler.flush() for handler in handlers])
+
+
+async def shutdown() -> None:
+    """
+    `logging.shutdown` (draining the async queue, flushing and closing the files) in the default executor,
+    await it in the shutdown hook of the application.
+    """
+    await asyncio.get_running_loop().run_in_executor(None, logging.shutdown)
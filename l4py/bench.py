@@ -0,0 +1,267 @@
+"""
+Throughput and latency benchmarks for the l4py formatters, filters, handlers and loggers.
+
+    python -m l4py.bench [--iterations 20000] [--output results.json]
+
+Every scenario reports records/sec (measured on an untimed loop) and per-call latency percentiles in nanoseconds.
+"""
+import argparse
+import importlib.metadata
+import json
+import logging
+import logging.handlers
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from typing import Callable
+
+from l4py import get_logger
+from l4py.context import ContextFilter, bind, reset_context
+from l4py.formatters import JsonFormatter, TextFormatter
+from l4py.handlers import BufferedRotatingFileHandler
+
+MESSAGE_SIZES = (32, 256, 4096)
+THREAD_COUNTS = (1, 4)
+
+
+def _percentiles(latencies: list[int]) -> dict[str, int]:
+    latencies = sorted(latencies)
+    last = len(latencies) - 1
+    return {
+        'p50': latencies[last * 50 // 100],
+        'p90': latencies[last * 90 // 100],
+        'p99': latencies[last * 99 // 100],
+        'max': latencies[last],
+    }
+
+
+def _make_record(message_size: int, with_exception: bool = False) -> logging.LogRecord:
+    exc_info = None
+    if with_exception:
+        try:
+            raise ValueError('benchmark')
+        except ValueError:
+            exc_info = sys.exc_info()
+    record = logging.LogRecord(
+        'l4py.bench', logging.INFO, __file__, 1, '%s', ('x' * message_size,), exc_info
+    )
+    record.trace_id = 'f' * 32
+    record.user_id = 'bench'
+    return record
+
+
+def measure(name: str, func: Callable[[], object], iterations: int, **params) -> dict:
+    perf_counter_ns = time.perf_counter_ns
+    start = perf_counter_ns()
+    for _ in range(iterations):
+        func()
+    elapsed = perf_counter_ns() - start
+
+    latencies = []
+    append = latencies.append
+    for _ in range(iterations):
+        t0 = perf_counter_ns()
+        func()
+        append(perf_counter_ns() - t0)
+
+    return {
+        'name': name,
+        **params,
+        'iterations': iterations,
+        'records_per_second': round(iterations / (elapsed / 1e9)) if elapsed else None,
+        'latency_ns': _percentiles(latencies),
+    }
+
+
+def measure_threaded(name: str, func: Callable[[], object], iterations: int, threads: int, **params) -> dict:
+    per_thread = max(iterations // threads, 1)
+    results: list[list[int]] = [[] for _ in range(threads)]
+    barrier = threading.Barrier(threads + 1)
+
+    def worker(latencies: list[int]):
+        perf_counter_ns = time.perf_counter_ns
+        barrier.wait()
+        for _ in range(per_thread):
+            t0 = perf_counter_ns()
+            func()
+            latencies.append(perf_counter_ns() - t0)
+
+    workers = [threading.Thread(target=worker, args=(latencies,)) for latencies in results]
+    [w.start() for w in workers]
+    barrier.wait()
+    start = time.perf_counter_ns()
+    [w.join() for w in workers]
+    elapsed = time.perf_counter_ns() - start
+
+    total = per_thread * threads
+    return {
+        'name': name,
+        **params,
+        'threads': threads,
+        'iterations': total,
+        'records_per_second': round(total / (elapsed / 1e9)) if elapsed else None,
+        'latency_ns': _percentiles([latency for latencies in results for latency in latencies]),
+    }
+
+
+def bench_formatters(iterations: int) -> list[dict]:
+    results = []
+    for formatter in (TextFormatter(), JsonFormatter()):
+        for message_size in MESSAGE_SIZES:
+            for with_exception in (False, True):
+                record = _make_record(message_size, with_exception)
+
+                def format_record(formatter=formatter, record=record):
+                    # measure the rendering, not a traceback cached on the record
+                    record.exc_text = None
+                    return formatter.format(record)
+
+                results.append(measure(
+                    f'formatter.{type(formatter).__name__}', format_record, iterations,
+                    message_size=message_size, exception=with_exception,
+                ))
+    return results
+
+
+def bench_context_filter(iterations: int) -> list[dict]:
+    context_filter = ContextFilter()
+    token = bind(trace_id='f' * 32, user_id='bench', tenant='acme')
+    try:
+        def filter_record():
+            record = logging.LogRecord('l4py.bench', logging.INFO, __file__, 1, 'message', (), None)
+            return context_filter.filter(record)
+
+        return [measure('filter.ContextFilter', filter_record, iterations)]
+    finally:
+        reset_context(token)
+
+
+def _bench_logger(name: str, handler: logging.Handler, iterations: int, **params) -> list[dict]:
+    logger = logging.getLogger(f'l4py.bench.{name}')
+    logger.propagate = False
+    logger.setLevel(logging.INFO)
+    logger.addHandler(handler)
+    results = []
+    try:
+        for message_size in MESSAGE_SIZES:
+            message = 'x' * message_size
+            for threads in THREAD_COUNTS:
+                results.append(measure_threaded(
+                    name, lambda: logger.info('%s', message), iterations, threads,
+                    message_size=message_size, **params,
+                ))
+    finally:
+        logger.removeHandler(handler)
+        handler.close()
+        if isinstance(handler, logging.StreamHandler) and not isinstance(handler, logging.FileHandler):
+            handler.stream.close()
+    return results
+
+
+def bench_handlers(iterations: int, directory: str) -> list[dict]:
+    console = logging.StreamHandler(open(os.devnull, 'w'))
+    console.setFormatter(TextFormatter())
+    console.addFilter(ContextFilter())
+
+    file = logging.handlers.RotatingFileHandler(
+        os.path.join(directory, 'bench.log'), maxBytes=10 * 1024 * 1024, backupCount=1
+    )
+    file.setFormatter(JsonFormatter())
+    file.addFilter(ContextFilter())
+
+    buffered = BufferedRotatingFileHandler(
+        os.path.join(directory, 'bench-buffered.log'), maxBytes=10 * 1024 * 1024, backupCount=1
+    )
+    buffered.setFormatter(JsonFormatter())
+    buffered.addFilter(ContextFilter())
+
+    return [
+        *_bench_logger('handler.console', console, iterations),
+        *_bench_logger('handler.file', file, iterations),
+        *_bench_logger('handler.file_buffered', buffered, iterations),
+    ]
+
+
+def bench_levels(iterations: int) -> list[dict]:
+    logger = get_logger('l4py.bench.levels')
+    logger.setLevel(logging.INFO)
+    logger.logger.propagate = False
+    if not logger.handlers:
+        logger.addHandler(logging.NullHandler())
+    return [
+        measure('logger.disabled', lambda: logger.debug('message %s', 1, field=1), iterations),
+        measure('logger.enabled', lambda: logger.info('message %s', 1, field=1), iterations),
+    ]
+
+
+class _BenchCaller:
+    def resolve(self):
+        return get_logger()
+
+
+def bench_get_logger(iterations: int) -> list[dict]:
+    caller = _BenchCaller()
+    return [
+        measure('get_logger.named', lambda: get_logger('l4py.bench'), iterations),
+        measure('get_logger.module', lambda: get_logger(), iterations),
+        measure('get_logger.class', caller.resolve, iterations),
+    ]
+
+
+def l4py_version() -> str:
+    """
+    The installed version, `git describe` of a source checkout or 'unknown'.
+    """
+    try:
+        return importlib.metadata.version('l4py')
+    except importlib.metadata.PackageNotFoundError:
+        pass
+    try:
+        result = subprocess.run(
+            ['git', 'describe', '--tags', '--always', '--dirty'],
+            cwd=os.path.dirname(os.path.abspath(__file__)), capture_output=True, text=True, timeout=5,
+        )
+    except (OSError, subprocess.SubprocessError):
+        return 'unknown'
+    return result.stdout.strip() if result.returncode == 0 and result.stdout.strip() else 'unknown'
+
+
+def run(iterations: int = 20000) -> dict:
+    with tempfile.TemporaryDirectory() as directory:
+        results = [
+            *bench_formatters(iterations),
+            *bench_context_filter(iterations),
+            *bench_handlers(iterations, directory),
+            *bench_levels(iterations),
+            *bench_get_logger(iterations),
+        ]
+    return {
+        'l4py': l4py_version(),
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+        'platform': platform.platform(),
+        'timestamp': time.time(),
+        'results': results,
+    }
+
+
+def main(argv: list[str] = None) -> None:
+    parser = argparse.ArgumentParser(prog='python -m l4py.bench', description='l4py logging benchmarks')
+    parser.add_argument('--iterations', type=int, default=20000, help='records per scenario')
+    parser.add_argument('--output', help='write the JSON results to this file instead of stdout')
+    args = parser.parse_args(argv)
+
+    output = json.dumps(run(args.iterations), indent=2)
+    if args.output:
+        with open(args.output, 'w') as file:
+            file.write(output + '\n')
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,237 @@
+"""
+Compact binary log files.
+
+A file is a sequence of frames: `<u32 length><u8 type><payload>`
+
+- HEADER (0): json `{"version": 1, "app_name": ...}`, starts a segment and resets the string table
+- STRING (1): `<u32 id><utf-8>`, adds a string to the string table of the segment
+- RECORD (2): `<f64 created><u32 level><u32 logger><u32 file><u32 line><u32 function>` (ids of the string table)
+  followed by `<u32 length><utf-8 message>` and `<u32 length><json extra>` (trace_id, user_id, context, fields, exception)
+
+Logger, level, file and function names are only written once per segment.
+"""
+import functools
+import json
+import logging
+import struct
+from typing import Iterable, Iterator
+
+from l4py import utils
+from l4py.context import TRACE_ID, USER_ID
+from l4py.formatters import JsonFormatter, TextFormatter
+from l4py.handlers import BufferedRotatingFileHandler
+
+VERSION = 1
+
+FRAME_HEADER = 0
+FRAME_STRING = 1
+FRAME_RECORD = 2
+
+_FRAME = struct.Struct('<IB')
+_STRING = struct.Struct('<I')
+_RECORD = struct.Struct('<dIIIII')
+_LENGTH = struct.Struct('<I')
+
+_DEFAULT_FORMATTER = logging.Formatter()
+
+
+def _frame(frame_type: int, payload: bytes) -> bytes:
+    return _FRAME.pack(len(payload) + 1, frame_type) + payload
+
+
+class BinaryEncoder:
+
+    def __init__(self, app_name: str = None):
+        self.app_name = app_name if app_name is not None else utils.get_app_name()
+        self._strings: dict[str, int] = {}
+
+    def header(self) -> bytes:
+        """
+        Starts a new segment, the strings are written again.
+        """
+        self._strings = {}
+        return _frame(FRAME_HEADER, json.dumps({'version': VERSION, 'app_name': self.app_name}).encode())
+
+    def _intern(self, value: str, frames: list[bytes]) -> int:
+        string_id = self._strings.get(value)
+        if string_id is None:
+            string_id = self._strings[value] = len(self._strings)
+            frames.append(_frame(FRAME_STRING, _STRING.pack(string_id) + value.encode('utf-8', 'replace')))
+        return string_id
+
+    def encode(self, record: logging.LogRecord, exception: str = None) -> bytes:
+        frames = []
+        intern = self._intern
+        header = _RECORD.pack(
+            record.created,
+            intern(record.levelname, frames),
+            intern(record.name, frames),
+            intern(record.filename, frames),
+            record.lineno or 0,
+            intern(record.funcName or '', frames),
+        )
+        message = record.getMessage().encode('utf-8', 'replace')
+
+        extra = {}
+        if trace_id := getattr(record, 'trace_id', None):
+            extra['trace_id'] = trace_id
+        if user_id := getattr(record, 'user_id', None):
+            extra['user_id'] = user_id
+        if context := getattr(record, 'context', None):
+            context = {k: v for k, v in context.items() if v is not None and k not in (TRACE_ID, USER_ID)}
+            if context:
+                extra['context'] = context
+        if fields := getattr(record, 'fields', None):
+            extra['fields'] = fields
+        if exception:
+            extra['exception'] = exception
+        extra = json.dumps(extra, default=str).encode() if extra else b''
+
+        frames.append(_frame(
+            FRAME_RECORD,
+            b''.join((header, _LENGTH.pack(len(message)), message, _LENGTH.pack(len(extra)), extra)),
+        ))
+        return b''.join(frames)
+
+
+class BinaryFileHandler(BufferedRotatingFileHandler):
+    """
+    Writes the records in the compact binary format, the formatter of the handler is not used.
+    Read the files with `l4py read <file>`.
+    """
+
+    def __init__(self, filename, app_name: str = None, **kwargs):
+        self.encoder = BinaryEncoder(app_name)
+        super().__init__(filename, **kwargs)
+
+    def _open(self):
+        stream = super()._open()
+        header = self.encoder.header()
+        stream.write(header)
+        self._size += len(header)
+        return stream
+
+    def emit(self, record: logging.LogRecord) -> None:
+        try:
+            if self.stream is None:
+                self.stream = self._open()
+            if record.exc_info and not record.exc_text:
+                # shared with the other handlers of the record
+                record.exc_text = (self.formatter or _DEFAULT_FORMATTER).formatException(record.exc_info)
+            exception = record.exc_text or None
+            data = self.encoder.encode(record, exception)
+            if self.maxBytes > 0 and self._size + self._buffered + len(data) >= self.maxBytes:
+                self.doRollover()
+                # the string table was reset by the new segment
+                data = self.encoder.encode(record, exception)
+            self._buffer.append(data)
+            self._buffered += len(data)
+            if self._buffered >= self.buffer_size or record.levelno >= self.flush_level:
+                self._write_buffer()
+        except RecursionError:
+            raise
+        except Exception:
+            self.handleError(record)
+
+
+def read_records(file_name: str) -> Iterator[dict]:
+    """
+    Yields the records of a binary log file as dicts:
+    `created`, `app_name`, `level`, `logger_name`, `file_name`, `line_number`, `function_name`, `message`
+    and, if present, `trace_id`, `user_id`, `context`, `fields` and `exception`.
+    """
+    strings: list[str] = []
+    app_name = None
+    with open(file_name, 'rb') as file:
+        read = file.read
+        while header := read(_FRAME.size):
+            if len(header) < _FRAME.size:
+                break
+            length, frame_type = _FRAME.unpack(header)
+            payload = read(length - 1)
+            if len(payload) < length - 1:
+                # incomplete last frame of a file that is still written
+                break
+            if frame_type == FRAME_RECORD:
+                created, level, logger, file_id, line, function = _RECORD.unpack_from(payload)
+                offset = _RECORD.size
+                (message_length,) = _LENGTH.unpack_from(payload, offset)
+                offset += _LENGTH.size
+                message = payload[offset:offset + message_length].decode('utf-8')
+                offset += message_length
+                (extra_length,) = _LENGTH.unpack_from(payload, offset)
+                offset += _LENGTH.size
+                entry = {
+                    'created': created,
+                    'app_name': app_name,
+                    'level': strings[level],
+                    'logger_name': strings[logger],
+                    'file_name': strings[file_id],
+                    'line_number': line,
+                    'function_name': strings[function],
+                    'message': message,
+                }
+                if extra_length:
+                    entry.update(json.loads(payload[offset:offset + extra_length]))
+                yield entry
+            elif frame_type == FRAME_STRING:
+                (string_id,) = _STRING.unpack_from(payload)
+                value = payload[_STRING.size:].decode('utf-8')
+                if string_id == len(strings):
+                    strings.append(value)
+                else:
+                    strings[string_id] = value
+            elif frame_type == FRAME_HEADER:
+                strings = []
+                app_name = json.loads(payload).get('app_name')
+
+
+class _ReplayMixin:
+    # the exception is stored as text, it is passed in place of the exc_info
+    def formatException(self, ei):
+        return ei
+
+
+class _ReplayJsonFormatter(_ReplayMixin, JsonFormatter):
+    pass
+
+
+class _ReplayTextFormatter(_ReplayMixin, TextFormatter):
+    pass
+
+
+def to_log_record(entry: dict) -> logging.LogRecord:
+    levelno = logging.getLevelName(entry['level'])
+    return logging.makeLogRecord({
+        'name': entry['logger_name'],
+        'levelname': entry['level'],
+        'levelno': levelno if isinstance(levelno, int) else logging.NOTSET,
+        'filename': entry['file_name'],
+        'lineno': entry['line_number'],
+        'funcName': entry['function_name'],
+        'created': entry['created'],
+        'msg': entry['message'],
+        'args': (),
+        'exc_info': entry.get('exception'),
+        'trace_id': entry.get('trace_id'),
+        'user_id': entry.get('user_id'),
+        'context': entry.get('context') or {},
+        'fields': entry.get('fields'),
+    })
+
+
+def render(entries: Iterable[dict], output_format: str = 'json', color: bool = False) -> Iterator[str]:
+    """
+    Renders the entries of `read_records` like the JsonFormatter or the TextFormatter would have.
+    """
+    if output_format == 'json':
+        formatter_class = _ReplayJsonFormatter
+    else:
+        formatter_class = functools.partial(_ReplayTextFormatter, color=color)
+    formatters: dict[str, logging.Formatter] = {}
+    for entry in entries:
+        app_name = entry.get('app_name') or utils.get_app_name()
+        formatter = formatters.get(app_name)
+        if formatter is None:
+            formatter = formatters[app_name] = formatter_class(app_name)
+        yield formatter.format(to_log_record(entry))
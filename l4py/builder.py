@@ -1,29 +1,67 @@
 import abc
-import inspect
 import logging
-import logging.config
-import platform
+import sys
+from typing import Mapping
 
 from l4py import utils
-from l4py.formatters import TextFormatter, JsonFormatter
+from l4py.filters import FilterChain
+from l4py.formatters import AbstractFormatter, TextFormatter, JsonFormatter
+from l4py.logger import StructuredLogger
+
+# (code object, class) of the caller -> logger
+_caller_loggers: dict[tuple, StructuredLogger] = {}
+_named_loggers: dict[str, StructuredLogger] = {}
+
+
+def _get_named_logger(logger_name: str) -> StructuredLogger:
+    logger = _named_loggers.get(logger_name)
+    if logger is None:
+        logger = _named_loggers[logger_name] = StructuredLogger(logging.getLogger(logger_name))
+    return logger
+
+
+def _get_caller_logger() -> StructuredLogger:
+    frame = sys._getframe(2)
+    code = frame.f_code
+    cls = None
+    if 'self' in code.co_varnames or 'self' in code.co_freevars:
+        self = frame.f_locals.get('self')
+        cls = None if self is None else type(self)
+    key = (code, cls)
+    logger = _caller_loggers.get(key)
+    if logger is None:
+        module_name = frame.f_globals.get('__name__', '<unknown>')
+        class_name = None if cls is None else cls.__name__
+        logger = _get_named_logger('.'.join(
+            [s for s in [module_name, class_name] if s is not None]
+        ))
+        _caller_loggers[key] = logger
+    return logger
 
 
-def _get_caller_info():
-    frame = inspect.currentframe().f_back.f_back
-    module_name = frame.f_globals.get('__name__', '<unknown>')
-    class_name = None
-    if 'self' in frame.f_locals:
-        class_name = type(frame.f_locals['self']).__name__
-    return module_name, class_name
+def get_logger(logger_name: str = None) -> StructuredLogger:
+    if logger_name is None:
+        return _get_caller_logger()
+    return _get_named_logger(logger_name)
 
 
-def get_logger(logger_name: str = None) -> logging.Logger:
-    if logger_name is None:
-        module_name, class_name = _get_caller_info()
-        logger_name = '.'.join(
-            [s for s in [module_name, class_name] if s is not None]
-        )
-    return logging.getLogger(logger_name)
+class LoggerDescriptor:
+    """
+    Resolves the `module.Class` logger of the owning class once per class.
+    """
+
+    def __init__(self):
+        self._loggers: dict[type, StructuredLogger] = {}
+
+    def __get__(self, instance, owner: type) -> StructuredLogger:
+        logger = self._loggers.get(owner)
+        if logger is None:
+            logger = self._loggers[owner] = _get_named_logger(f'{owner.__module__}.{owner.__name__}')
+        return logger
+
+
+class LoggerMixin:
+    logger: StructuredLogger = LoggerDescriptor()
 
 
 class AbstractLoggingBuilder:
@@ -38,9 +76,21 @@ class AbstractLoggingBuilder:
             '()': 'l4py.context.ContextFilter',
         }
     }
+    _samplers: dict[str, float] = {}
+    _rate_limits: dict[str, tuple[float, int]] = {}
+
+    # logger -> (outputs, level, propagate)
+    _routes: dict[str, tuple[tuple[str, ...], int, bool]] = {}
+    # output name -> file options
+    _file_outputs: dict[str, dict] = {}
+
     _console_enabled: bool = True
     _console_format: str = None
     _console_formatter: type[logging.Formatter] = _text_formatter
+    _text_layout: str = None
+    _exception_cache_size: int = 0
+    _json_exception_frames: bool = False
+    _json_fast_encoder: bool = False
 
     _file_enabled: bool = True
     _file: str = None
@@ -49,6 +99,30 @@ class AbstractLoggingBuilder:
     _file_format: str = None
     _file_formatter: type[logging.Formatter] = _json_formatter
 
+    _file_buffer_bytes: int = None
+    _file_flush_interval_ms: int = 1000
+    _file_multiprocess: str = None
+    _file_binary: bool = False
+    _file_rotation_when: str = None
+    _file_compression: str = None
+    _file_max_total_size: int = 0
+    _file_index: bool = False
+    _file_process: dict = None
+
+    _network: dict = None
+    _network_formatter: type[logging.Formatter] = JsonFormatter
+
+    _async_enabled: bool = False
+    _async_queue_size: int = 10000
+    _async_overflow: str = 'block'
+
+    _level_reload: dict = None
+
+    _metrics_enabled: bool = False
+
+    _tail_sampling_enabled: bool = False
+    _tail_sampling_options: dict = {}
+
     def app_name(self, app_name: str) -> 'AbstractLoggingBuilder':
         utils.set_app_name(app_name)
         return self
@@ -65,6 +139,14 @@ class AbstractLoggingBuilder:
         self._file_formatter = JsonFormatter if value else TextFormatter
         return self
 
+    def file_binary(self, value: bool) -> 'AbstractLoggingBuilder':
+        self._file_binary = value
+        return self
+
+    def file_index(self, value: bool) -> 'AbstractLoggingBuilder':
+        self._file_index = value
+        return self
+
     def file_max_size_mb(self, size_in_mb: int) -> 'AbstractLoggingBuilder':
         self._file_max_size = size_in_mb * 1024 * 1024
         return self
@@ -73,6 +155,43 @@ class AbstractLoggingBuilder:
         self._file_max_count = count
         return self
 
+    def file_rotation(self, when: str) -> 'AbstractLoggingBuilder':
+        self._file_rotation_when = when
+        return self
+
+    def file_compression(self, compression: str) -> 'AbstractLoggingBuilder':
+        self._file_compression = compression
+        return self
+
+    def file_max_total_size_mb(self, size_in_mb: int) -> 'AbstractLoggingBuilder':
+        self._file_max_total_size = size_in_mb * 1024 * 1024
+        return self
+
+    def file_buffering(self, buffer_bytes: int = 64 * 1024, interval_ms: int = 1000) -> 'AbstractLoggingBuilder':
+        self._file_buffer_bytes = buffer_bytes
+        self._file_flush_interval_ms = interval_ms
+        return self
+
+    def file_multiprocess(self, mode: str) -> 'AbstractLoggingBuilder':
+        self._file_multiprocess = mode
+        return self
+
+    def file_process(
+            self,
+            enabled: bool,
+            batch_size: int = 256,
+            flush_interval_ms: int = 100,
+            backlog: int = 10000,
+            overflow: str = 'block',
+    ) -> 'AbstractLoggingBuilder':
+        self._file_process = {
+            'batch_size': batch_size,
+            'flush_interval_ms': flush_interval_ms,
+            'backlog': backlog,
+            'overflow': overflow,
+        } if enabled else None
+        return self
+
     def console_enabled(self, enabled: bool) -> 'AbstractLoggingBuilder':
         self._console_enabled = enabled
         return self
@@ -97,12 +216,131 @@ class AbstractLoggingBuilder:
         self._file_format = format
         return self
 
+    def network(
+            self,
+            address,
+            protocol: str = 'tcp',
+            framing: str = 'ndjson',
+            json: bool = True,
+            batch_size: int = 64 * 1024,
+            flush_interval_ms: int = 200,
+            backlog: int = 10000,
+            max_backoff: float = 30.0,
+    ) -> 'AbstractLoggingBuilder':
+        self._network = {
+            'address': address,
+            'protocol': protocol,
+            'framing': framing,
+            'batch_size': batch_size,
+            'flush_interval_ms': flush_interval_ms,
+            'backlog': backlog,
+            'max_backoff': max_backoff,
+        }
+        self._network_formatter = JsonFormatter if json else TextFormatter
+        return self
+
+    def text_layout(self, layout: str) -> 'AbstractLoggingBuilder':
+        self._text_layout = layout
+        return self
+
+    def exception_cache(self, size: int) -> 'AbstractLoggingBuilder':
+        self._exception_cache_size = size
+        return self
+
+    def json_exception_frames(self, value: bool) -> 'AbstractLoggingBuilder':
+        self._json_exception_frames = value
+        return self
+
+    def json_fast_encoder(self, value: bool) -> 'AbstractLoggingBuilder':
+        """
+        Encodes the structured fields and context values with orjson / ujson when installed,
+        their output is not byte-compatible with json.dumps.
+        """
+        self._json_fast_encoder = value
+        return self
+
+    def async_handlers(
+            self,
+            enabled: bool,
+            queue_size: int = 10000,
+            overflow: str = 'block',
+    ) -> 'AbstractLoggingBuilder':
+        self._async_enabled = enabled
+        self._async_queue_size = queue_size
+        self._async_overflow = overflow
+        return self
+
+    def tail_sampling(
+            self,
+            enabled: bool,
+            flush_level: int = logging.ERROR,
+            max_records_per_trace: int = 1000,
+            max_traces: int = 10000,
+            ttl_seconds: float = 300.0,
+            max_total_records: int = 100000,
+    ) -> 'AbstractLoggingBuilder':
+        self._tail_sampling_enabled = enabled
+        self._tail_sampling_options = {
+            'flush_level': flush_level,
+            'max_records_per_trace': max_records_per_trace,
+            'max_traces': max_traces,
+            'ttl_seconds': ttl_seconds,
+            'max_total_records': max_total_records,
+        }
+        return self
+
+    def level_reload(self, file_name: str = None, interval: float = 1.0,
+                     sighup: bool = False) -> 'AbstractLoggingBuilder':
+        self._level_reload = {'file_name': file_name, 'interval': interval, 'sighup': sighup}
+        return self
+
+    def metrics(self, enabled: bool) -> 'AbstractLoggingBuilder':
+        self._metrics_enabled = enabled
+        return self
+
     def add_filter(self, name: str, filter: type[logging.Filter]) -> 'AbstractLoggingBuilder':
-        self._filters[name] = {'()': filter}
+        self._filters = {**self._filters, name: {'()': filter}}
+        return self
+
+    def add_sampler(self, logger: str, rate: float) -> 'AbstractLoggingBuilder':
+        self._samplers = {**self._samplers, logger: rate}
+        return self
+
+    def add_rate_limit(self, logger: str, per_second: float, burst: int = None) -> 'AbstractLoggingBuilder':
+        self._rate_limits = {**self._rate_limits, logger: (per_second, burst)}
         return self
 
     def add_logger(self, name: str, log_level: int) -> 'AbstractLoggingBuilder':
-        self._loggers[name] = log_level
+        self._loggers = {**self._loggers, name: log_level}
+        return self
+
+    def add_file_output(
+            self,
+            name: str,
+            file_name: str,
+            json: bool = True,
+            max_size_mb: int = 10,
+            max_count: int = 5,
+            rotation: str = None,
+    ) -> 'AbstractLoggingBuilder':
+        """
+        An additional file output, it is only written by the loggers routed to ``name``.
+        """
+        self._file_outputs = {**self._file_outputs, name: {
+            'file_name': file_name,
+            'json': json,
+            'max_size': max_size_mb * 1024 * 1024,
+            'max_count': max_count,
+            'rotation': rotation,
+        }}
+        return self
+
+    def route(self, logger: str, *outputs: str, level: int = None, propagate: bool = False) -> 'AbstractLoggingBuilder':
+        """
+        The records of ``logger`` (and its children) go to ``outputs`` instead of the outputs of the root logger:
+        'console', 'file', 'network' or the name of an `add_file_output`.
+        """
+        self._routes = {**self._routes, logger: (outputs, level, propagate)}
         return self
 
     def root_logger(self, log_level: int) -> 'AbstractLoggingBuilder':
@@ -113,15 +351,209 @@ class AbstractLoggingBuilder:
     def build_config(self) -> dict:
         pass
 
-    def init(self) -> None:
+    def init(self, direct: bool = False) -> None:
+        """
+        ``direct`` constructs the handlers without `logging.config.dictConfig`, see `l4py.config`.
+        """
+        from l4py import config
         config_dict = self.build_config()
-        logging.config.dictConfig(config_dict)
+        if direct:
+            config.apply_config(config_dict)
+        else:
+            import logging.config
+            # dictConfig adds filters to the root logger but never removes the ones of a previous configuration
+            root = logging.getLogger()
+            for chain in [f for f in root.filters if isinstance(f, FilterChain)]:
+                root.removeFilter(chain)
+            logging.config.dictConfig(config_dict)
+        config.routed_loggers.clear()
+        config.routed_loggers.update(self._routes)
+        if self._level_reload is not None:
+            from l4py import levels
+            levels.start_level_reload(**self._level_reload)
+        if self._metrics_enabled:
+            from l4py import metrics
+            metrics.instrument()
+
+    def save_snapshot(self, file_name: str) -> None:
+        from l4py import config
+        config.save_snapshot(
+            file_name, self.build_config(), self._level_reload, self._metrics_enabled, list(self._routes)
+        )
+
+    def _build_filters(self, environ: Mapping[str, str] = None) -> dict:
+        samplers = dict(self._samplers)
+        for sampler in utils.get_sample_rates_env(environ):
+            samplers[sampler['logger']] = sampler['rate']
+
+        rate_limits = dict(self._rate_limits)
+        for rate_limit in utils.get_rate_limits_env(environ):
+            rate_limits[rate_limit['logger']] = (rate_limit['per_second'], rate_limit['burst'])
+
+        # dropping records first saves the work of the other filters
+        filters = {}
+        for logger, rate in samplers.items():
+            filters[f'sampler.{logger or "root"}'] = {
+                '()': 'l4py.filters.SamplingFilter',
+                'logger_name': logger,
+                'rate': rate,
+            }
+        for logger, (per_second, burst) in rate_limits.items():
+            filters[f'rate_limit.{logger or "root"}'] = {
+                '()': 'l4py.filters.RateLimitFilter',
+                'logger_name': logger,
+                'per_second': per_second,
+                'burst': burst,
+            }
+        filters.update(self._filters)
+        return filters
+
+    def _formatter_config(self, formatter: type[logging.Formatter]) -> dict:
+        config = {'()': f'{formatter.__module__}.{formatter.__name__}'}
+        if self._text_layout and issubclass(formatter, TextFormatter):
+            config['layout'] = self._text_layout
+        if self._exception_cache_size and issubclass(formatter, AbstractFormatter):
+            config['exception_cache_size'] = self._exception_cache_size
+        if self._json_exception_frames and issubclass(formatter, JsonFormatter):
+            config['exception_frames'] = True
+        if self._json_fast_encoder and issubclass(formatter, JsonFormatter):
+            config['fast_encoder'] = True
+        return config
+
+    @staticmethod
+    def _share_formatters(formatters: dict, handlers: dict) -> None:
+        # handlers with identical formatter configurations share one formatter, it renders each record once
+        shared_names = {}
+        for handler in handlers.values():
+            name = handler.get('formatter')
+            if name is None:
+                continue
+            shared_name = shared_names.setdefault(repr(sorted(formatters[name].items())), name)
+            if shared_name != name:
+                handler['formatter'] = shared_name
+                del formatters[name]
+                if '()' in formatters[shared_name]:
+                    formatters[shared_name]['.'] = {'memoize': True}
+
+    def _build_file_handler(self, filter_names: list[str]) -> dict:
+        handler = {
+            'class': 'logging.handlers.RotatingFileHandler',
+            'filename': self._file if self._file else f'{utils.get_app_name()}-{utils.get_host_name()}.log',
+            'maxBytes': self._file_max_size,
+            'backupCount': self._file_max_count,
+            'formatter': 'file',
+            'filters': list(filter_names)
+        }
+        timed = self._file_rotation_when or self._file_compression or self._file_max_total_size
+        buffered = bool(self._file_buffer_bytes)
+
+        if self._file_index:
+            if self._file_binary or self._file_multiprocess or timed \
+                    or self._file_format or not issubclass(self._file_formatter, JsonFormatter):
+                raise ValueError(
+                    'file_index requires json file output and can not be combined with file_binary, '
+                    'file_multiprocess, file_rotation, file_compression or file_max_total_size_mb'
+                )
+            handler['class'] = 'l4py.index.IndexedBufferedRotatingFileHandler' \
+                if buffered else 'l4py.index.IndexedRotatingFileHandler'
+        elif self._file_binary:
+            if self._file_multiprocess or timed:
+                raise ValueError(
+                    'file_binary can not be combined with file_multiprocess, file_rotation, '
+                    'file_compression or file_max_total_size_mb'
+                )
+            handler['class'] = 'l4py.binary.BinaryFileHandler'
+        elif timed:
+            if buffered or self._file_multiprocess:
+                raise ValueError(
+                    'file_rotation, file_compression and file_max_total_size_mb '
+                    'can not be combined with file_buffering or file_multiprocess'
+                )
+            handler['class'] = 'l4py.handlers.TimedSizeRotatingFileHandler'
+            handler['when'] = self._file_rotation_when
+            handler['compression'] = self._file_compression
+            handler['maxTotalBytes'] = self._file_max_total_size
+        elif self._file_multiprocess == 'pid':
+            handler['class'] = 'l4py.handlers.PidBufferedRotatingFileHandler' \
+                if buffered else 'l4py.handlers.PidRotatingFileHandler'
+        elif self._file_multiprocess == 'lock':
+            if buffered:
+                raise ValueError("file_buffering can not be combined with file_multiprocess('lock')")
+            handler['class'] = 'l4py.handlers.LockingRotatingFileHandler'
+        elif self._file_multiprocess is not None:
+            raise ValueError(f"file_multiprocess must be 'pid', 'lock' or None, got {self._file_multiprocess!r}")
+        elif buffered:
+            handler['class'] = 'l4py.handlers.BufferedRotatingFileHandler'
+
+        if buffered:
+            handler['buffer_size'] = self._file_buffer_bytes
+            handler['flush_interval_ms'] = self._file_flush_interval_ms
+        return handler
+
+    def _async_handler_config(self, handlers_names: list[str]) -> dict:
+        return {
+            '()': 'l4py.handlers.AsyncQueueHandler',
+            'handlers': [f'cfg://handlers.{name}' for name in handlers_names],
+            'queue_size': self._async_queue_size,
+            'overflow': self._async_overflow,
+        }
+
+    def _build_routes(self, formatters: dict, handlers: dict, filter_names: list[str]) -> dict:
+        """
+        Adds the file outputs used by the routes and returns logger -> (handler names, level, propagate).
+        """
+        if self._routes and self._tail_sampling_enabled:
+            raise ValueError('route can not be combined with tail_sampling')
+        routes = {}
+        for logger, (outputs, level, propagate) in self._routes.items():
+            routes[logger] = ([], level, propagate)
+            for output in outputs:
+                if output in ('console', 'file', 'network'):
+                    if output not in handlers:
+                        raise ValueError(f'logger {logger!r} is routed to {output!r} which is not enabled')
+                    routes[logger][0].append(output)
+                    continue
+                options = self._file_outputs.get(output)
+                if options is None:
+                    raise ValueError(
+                        f"logger {logger!r} is routed to the unknown output {output!r}, "
+                        f"use 'console', 'file', 'network' or one of {tuple(self._file_outputs)}"
+                    )
+                # the names are referenced as cfg://handlers.<name>, they can not contain dots
+                name = f'file_{output}'
+                if name not in handlers:
+                    formatters[name] = self._formatter_config(JsonFormatter if options['json'] else TextFormatter)
+                    handlers[name] = {
+                        'class': 'logging.handlers.RotatingFileHandler',
+                        'filename': options['file_name'],
+                        'maxBytes': options['max_size'],
+                        'backupCount': options['max_count'],
+                        'formatter': name,
+                        'filters': list(filter_names),
+                    }
+                    if options['rotation']:
+                        handlers[name]['class'] = 'l4py.handlers.TimedSizeRotatingFileHandler'
+                        handlers[name]['when'] = options['rotation']
+                routes[logger][0].append(name)
+        return routes
 
     def build_default_config(self) -> dict:
 
         handlers_names = []
         formatters = {}
         handlers = {}
+        environ = utils.get_l4py_environ()
+        filters = self._build_filters(environ)
+        if filters:
+            # a single chain per record: the root logger and every handler reuse its decision,
+            # it is the last filter so the referenced filters are configured before it
+            filters['chain'] = {
+                '()': 'l4py.filters.FilterChain',
+                # cfg:// can not reference names containing dots (e.g. 'sampler.l4py.noisy'), pass the section and the names
+                'filters': 'cfg://filters',
+                'names': list(filters),
+            }
+        filter_names = ['chain'] if filters else []
 
         if self._console_enabled:
             if self._console_format:
@@ -129,14 +561,12 @@ class AbstractLoggingBuilder:
                     'format': self._console_format,
                 }
             else:
-                formatters['console'] = {
-                    '()': f'{self._console_formatter.__module__}.{self._console_formatter.__name__}',
-                }
+                formatters['console'] = self._formatter_config(self._console_formatter)
             handlers_names.append('console')
             handlers['console'] = {
-                'class': 'logging.StreamHandler',
+                'class': 'l4py.handlers.ConsoleHandler',
                 'formatter': 'console',
-                'filters': list(self._filters.keys())
+                'filters': list(filter_names)
             }
 
         if self._file_enabled:
@@ -145,28 +575,80 @@ class AbstractLoggingBuilder:
                     'format': self._file_format,
                 }
             else:
-                formatters['file'] = {
-                    '()': f'{self._file_formatter.__module__}.{self._file_formatter.__name__}',
-                }
+                formatters['file'] = self._formatter_config(self._file_formatter)
             handlers_names.append('file')
-            handlers['file'] = {
-                'class': 'logging.handlers.RotatingFileHandler',
-                'filename': self._file if self._file else f'{utils.get_app_name()}-{platform.uname().node}.log',
-                'maxBytes': self._file_max_size,
-                'backupCount': self._file_max_count,
-                'formatter': 'file',
-                'filters': list(self._filters.keys())
+            handlers['file'] = self._build_file_handler(filter_names)
+            if self._file_process is not None:
+                # the file handler and its formatter are built by the worker process, the filters run on the caller
+                handlers['file'] = {
+                    '()': 'l4py.process.ProcessHandler',
+                    'handlers': {'file': {**handlers['file'], 'filters': []}},
+                    'formatters': {'file': formatters.pop('file')},
+                    **self._file_process,
+                    'filters': list(filter_names),
+                }
+
+        if self._network is not None:
+            formatters['network'] = self._formatter_config(self._network_formatter)
+            handlers_names.append('network')
+            handlers['network'] = {
+                '()': 'l4py.handlers.NetworkHandler',
+                **self._network,
+                'formatter': 'network',
+                'filters': list(filter_names)
             }
 
+        routes = self._build_routes(formatters, handlers, filter_names)
+
+        self._share_formatters(formatters, handlers)
+
+        root_level = self._root_level if self._root_level else utils.get_log_level_root_from_env(environ)
+
+        # wrapping handlers are configured after the wrapped ones by dictConfig, their names sort after them
+        wrapped_handlers_names = handlers_names
+        if self._async_enabled and handlers_names:
+            handlers['queue'] = self._async_handler_config(handlers_names)
+            handlers_names = ['queue']
+
+        if self._tail_sampling_enabled and handlers_names:
+            # the root level only decides what is written, everything below it is buffered per trace,
+            # the loggers with their own level keep it and are written or buffered against it (see below)
+            handlers['tail_sampling'] = {
+                '()': 'l4py.handlers.TailSamplingHandler',
+                'handlers': [f'cfg://handlers.{name}' for name in handlers_names],
+                'threshold': root_level,
+                **self._tail_sampling_options,
+            }
+            handlers_names = ['tail_sampling']
+            root_level = logging.DEBUG
+
+        if handlers_names != wrapped_handlers_names:
+            # the filters run once on the outermost handler, on the caller thread where the contextvars are set
+            for name in wrapped_handlers_names:
+                handlers[name]['filters'] = []
+            handlers[handlers_names[0]]['filters'] = list(filter_names)
+
+        if self._async_enabled:
+            # every route gets its own queue in front of its outputs
+            for index, (logger, (route_handlers_names, level, propagate)) in enumerate(routes.items()):
+                queue_name = f'queue_route_{index}'
+                handlers[queue_name] = {
+                    **self._async_handler_config(route_handlers_names),
+                    'filters': list(filter_names),
+                }
+                for name in route_handlers_names:
+                    handlers[name]['filters'] = []
+                routes[logger] = ([queue_name], level, propagate)
+
         config_dict = {
             'version': 1,
             'disable_existing_loggers': False,
-            'filters': self._filters,
+            'filters': filters,
             'handlers': handlers,
             'root': {
-                'level': self._root_level if self._root_level else utils.get_log_level_root_from_env(),
+                'level': root_level,
                 "handlers": handlers_names,
-                "filters": list(self._filters.keys()),
+                "filters": list(filter_names),
                 'propagate': True,
             },
             'loggers': {
@@ -180,12 +662,35 @@ class AbstractLoggingBuilder:
                 'propagate': True,
             }
 
-        for logger_level_dict in utils.get_log_levels_env():
+        for logger_level_dict in utils.get_log_levels_env(environ):
             config_dict['loggers'][logger_level_dict['logger']] = {
                 'level': logger_level_dict['level'],
                 'propagate': True,
             }
 
+        # resolved here into the handler lists of the loggers, logging dispatches along them without extra filters
+        for logger, (route_handlers_names, level, propagate) in routes.items():
+            logger_config = config_dict['loggers'].setdefault(logger, {})
+            if level is not None:
+                logger_config['level'] = level
+            logger_config['handlers'] = list(route_handlers_names)
+            logger_config['propagate'] = propagate
+
+        if 'tail_sampling' in handlers:
+            handlers['tail_sampling']['levels'] = {
+                name: logger_config['level']
+                for name, logger_config in config_dict['loggers'].items() if logger_config.get('level')
+            }
+
+        # dictConfig leaves the loggers of a previous configuration alone, a route that was removed would keep
+        # its (closed) handlers and propagate=False
+        from l4py import config
+        for logger in config.routed_loggers - routes.keys():
+            logger_config = config_dict['loggers'].setdefault(logger, {})
+            logger_config.setdefault('level', logging.NOTSET)
+            logger_config['handlers'] = []
+            logger_config['propagate'] = True
+
         return config_dict
 
 
@@ -232,4 +737,10 @@ class LogConfigBuilderDjango(AbstractLoggingBuilder):
                 'propagate': False,
             }
 
+        if 'tail_sampling' in config_dict['handlers']:
+            levels = config_dict['handlers']['tail_sampling']['levels']
+            for name in ('django', 'django.db.backends'):
+                if name in config_dict['loggers']:
+                    levels[name] = config_dict['loggers'][name]['level']
+
         return config_dict
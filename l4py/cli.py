@@ -0,0 +1,72 @@
+import argparse
+import os
+import sys
+
+from l4py import binary, index
+from l4py.handlers import stream_supports_color
+
+
+def _read(args: argparse.Namespace) -> None:
+    write = sys.stdout.write
+    color = args.format == 'text' and stream_supports_color(sys.stdout)
+    for file_name in args.files:
+        for line in binary.render(binary.read_records(file_name), args.format, color):
+            write(line + '\n')
+
+
+def _index(args: argparse.Namespace) -> None:
+    for file_name in args.files:
+        built = index.build_index(file_name, args.block_size)
+        print(f'{file_name}: {len(built["blocks"])} blocks, {len(built["trace_ids"])} trace ids')
+    for directory in {os.path.dirname(os.path.abspath(file_name)) for file_name in args.files}:
+        if removed := index.prune_indexes(directory):
+            print(f'{directory}: removed {removed} indexes of deleted files')
+
+
+def _query(args: argparse.Namespace) -> None:
+    write = sys.stdout.buffer.write
+    for line in index.query(
+            args.files, trace_id=args.trace_id, since=args.since, until=args.until,
+            levels=args.level, logger=args.logger, block_size=args.block_size,
+    ):
+        write(line + b'\n')
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog='l4py', description='l4py log file tools')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    read = commands.add_parser('read', help='print binary log files as json lines or text')
+    read.add_argument('files', nargs='+', help='binary log files (e.g. app.log.2 app.log.1 app.log)')
+    read.add_argument('--format', choices=('json', 'text'), default='json')
+    read.set_defaults(handler=_read)
+
+    index_files = commands.add_parser('index', help='build or update the indexes of json log files')
+    index_files.add_argument('files', nargs='+', help='json log files (e.g. app.log.2 app.log.1 app.log)')
+    index_files.add_argument('--block-size', type=int, default=index.DEFAULT_BLOCK_SIZE)
+    index_files.set_defaults(handler=_index)
+
+    query = commands.add_parser('query', help='print the matching lines of json log files using the indexes')
+    query.add_argument('files', nargs='+', help='json log files (e.g. app.log.2 app.log.1 app.log)')
+    query.add_argument('--trace-id')
+    query.add_argument('--since', help='timestamp or timestamp prefix, e.g. 2024-05-01T10:00')
+    query.add_argument('--until', help='timestamp or timestamp prefix (inclusive), e.g. 2024-05-01T11')
+    query.add_argument('--level', action='append', help='can be given multiple times')
+    query.add_argument('--logger', help='exact logger name')
+    query.add_argument('--block-size', type=int, default=index.DEFAULT_BLOCK_SIZE)
+    query.set_defaults(handler=_query)
+
+    return parser
+
+
+def main(argv: list[str] = None) -> None:
+    args = build_parser().parse_args(argv)
+    try:
+        args.handler(args)
+    except BrokenPipeError:
+        # e.g. `l4py read app.log | head`
+        sys.stderr.close()
+
+
+if __name__ == '__main__':
+    main()
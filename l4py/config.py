@@ -0,0 +1,247 @@
+"""
+Applies the config dicts of the builders without `logging.config.dictConfig`.
+
+The handlers, formatters and filters are constructed directly, `cfg://` references are resolved
+against the objects built so far and class names are imported once.
+Only the subset of the dictConfig schema the builders produce is supported: `()` / `class` factories,
+`.` properties, `cfg://` / `ext://` values, `formatter` / `filters` / `level` of the handlers, `root` and `loggers`.
+
+A snapshot is a built config saved as json, it is applied without running the builder again.
+"""
+import importlib
+import json
+import logging
+import os
+from typing import Any, Mapping
+
+from l4py import utils
+
+SNAPSHOT_VERSION = 1
+
+# the loggers routed to their own outputs by the applied config, the next config resets the ones it does not route
+routed_loggers: set[str] = set()
+
+_SECTIONS = ('formatters', 'filters', 'handlers')
+
+
+def resolve(name: str) -> Any:
+    """
+    Imports `package.module.attribute` (or a nested attribute like `module.Class.Inner`).
+    """
+    parts = name.split('.')
+    module_name = parts.pop(0)
+    found = importlib.import_module(module_name)
+    for part in parts:
+        module_name = f'{module_name}.{part}'
+        try:
+            found = getattr(found, part)
+        except AttributeError:
+            found = importlib.import_module(module_name)
+    return found
+
+
+class _Section(Mapping):
+    # `cfg://filters`: the objects of a section, built on first access
+    def __init__(self, configurator: '_Configurator', section: str):
+        self._configurator = configurator
+        self._section = section
+
+    def __getitem__(self, name: str):
+        return self._configurator.get(self._section, name)
+
+    def __iter__(self):
+        return iter(self._configurator.config.get(self._section, {}))
+
+    def __len__(self) -> int:
+        return len(self._configurator.config.get(self._section, {}))
+
+
+class _Configurator:
+
+    def __init__(self, config: dict):
+        self.config = config
+        self.built: dict[str, dict] = {section: {} for section in _SECTIONS}
+
+    def get(self, section: str, name: str):
+        built = self.built[section]
+        if name not in built:
+            builder = getattr(self, f'_build_{section[:-1]}')
+            built[name] = builder(dict(self.config[section][name]))
+            if section == 'handlers':
+                built[name].name = name
+        return built[name]
+
+    def convert(self, value):
+        if isinstance(value, str):
+            if value.startswith('cfg://'):
+                section, _, name = value[len('cfg://'):].partition('.')
+                return self.get(section, name) if name else _Section(self, section)
+            if value.startswith('ext://'):
+                return resolve(value[len('ext://'):])
+        elif isinstance(value, list):
+            return [self.convert(item) for item in value]
+        elif isinstance(value, dict):
+            return {key: self.convert(item) for key, item in value.items()}
+        return value
+
+    def construct(self, config: dict, factory):
+        factory = resolve(factory) if isinstance(factory, str) else factory
+        properties = config.pop('.', None)
+        result = factory(**{key: self.convert(value) for key, value in config.items()})
+        for name, value in (properties or {}).items():
+            setattr(result, name, value)
+        return result
+
+    def _build_formatter(self, config: dict) -> logging.Formatter:
+        if '()' in config:
+            return self.construct(config, config.pop('()'))
+        formatter_class = resolve(config.pop('class', 'logging.Formatter'))
+        return formatter_class(
+            config.get('format'), config.get('datefmt'), config.get('style', '%'),
+            **({'validate': config['validate']} if 'validate' in config else {}),
+        )
+
+    def _build_filter(self, config: dict) -> logging.Filter:
+        if '()' in config:
+            return self.construct(config, config.pop('()'))
+        return logging.Filter(config.get('name', ''))
+
+    def _build_handler(self, config: dict) -> logging.Handler:
+        formatter = config.pop('formatter', None)
+        level = config.pop('level', None)
+        filters = config.pop('filters', ())
+        handler = self.construct(config, config.pop('()') if '()' in config else config.pop('class'))
+        if formatter is not None:
+            handler.setFormatter(self.get('formatters', formatter))
+        if level is not None:
+            handler.setLevel(logging._checkLevel(level))
+        for name in filters:
+            handler.addFilter(self.get('filters', name))
+        return handler
+
+    def configure_logger(self, logger: logging.Logger, config: dict) -> None:
+        if 'level' in config:
+            logger.setLevel(logging._checkLevel(config['level']))
+        for handler in logger.handlers[:]:
+            logger.removeHandler(handler)
+        for name in config.get('handlers', ()):
+            logger.addHandler(self.get('handlers', name))
+        # unlike dictConfig, the filters of a configured logger are replaced
+        logger.filters = [self.get('filters', name) for name in config.get('filters', ())]
+        if logger is not logging.root:
+            logger.propagate = config.get('propagate', True)
+            logger.disabled = False
+
+
+def build_handlers(config: dict, names: list[str]) -> list[logging.Handler]:
+    """
+    Builds the handlers ``names`` of ``config`` without attaching them to a logger.
+    """
+    configurator = _Configurator(config)
+    return [configurator.get('handlers', name) for name in names]
+
+
+def apply_config(config: dict) -> None:
+    """
+    Applies a config dict of the builders like `logging.config.dictConfig` would,
+    the handlers of the previous configuration are flushed and closed.
+    """
+    if config.get('version') != 1:
+        raise ValueError(f"unsupported config version {config.get('version')!r}")
+    if config.get('incremental'):
+        raise ValueError('incremental configs are not supported, use logging.config.dictConfig')
+
+    configurator = _Configurator(config)
+    loggers = config.get('loggers', {})
+    manager = logging.root.manager
+    with logging._lock:
+        previous_handlers = [ref() for ref in logging._handlerList[:]]
+        logging._handlers.clear()
+        logging.shutdown(logging._handlerList[:])
+        del logging._handlerList[:]
+
+        # sorted like dictConfig, wrapping handlers may rely on the handlers they wrap being created first
+        for name in sorted(config.get('handlers', {})):
+            configurator.get('handlers', name)
+
+        configurator.configure_logger(logging.root, config.get('root', {}))
+        for name, logger_config in loggers.items():
+            configurator.configure_logger(logging.getLogger(name), logger_config)
+
+        # existing loggers below a configured one are reset, the others are disabled if requested
+        disable_existing = config.get('disable_existing_loggers', True)
+        configured = sorted(loggers)
+        for name, logger in list(manager.loggerDict.items()):
+            if name in loggers or not isinstance(logger, logging.Logger):
+                continue
+            if any(name.startswith(f'{parent}.') for parent in configured):
+                logger.setLevel(logging.NOTSET)
+                logger.handlers = []
+                logger.propagate = True
+            else:
+                logger.disabled = disable_existing
+
+        for handler in previous_handlers:
+            if handler is not None and handler not in configurator.built['handlers'].values():
+                for logger in [logging.root, *manager.loggerDict.values()]:
+                    if isinstance(logger, logging.Logger) and handler in logger.handlers:
+                        logger.removeHandler(handler)
+
+
+def _serializable(value):
+    if isinstance(value, dict):
+        return {key: _serializable(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_serializable(item) for item in value]
+    if isinstance(value, type) or callable(value):
+        return f'{value.__module__}.{value.__qualname__}'
+    return value
+
+
+def save_snapshot(
+        file_name: str,
+        config: dict,
+        level_reload: dict = None,
+        metrics: bool = False,
+        routes: list[str] = None,
+) -> None:
+    """
+    Saves ``config`` together with the app name and the `L4PY_*` environment it was built with.
+    """
+    snapshot = {
+        'version': SNAPSHOT_VERSION,
+        'app_name': utils.get_app_name(),
+        'environment': utils.get_l4py_environ(),
+        'config': _serializable(config),
+        'level_reload': level_reload,
+        'metrics': metrics,
+        'routes': sorted(routes or ()),
+    }
+    with open(f'{file_name}.tmp', 'w') as file:
+        json.dump(snapshot, file, indent=2)
+    os.replace(f'{file_name}.tmp', file_name)
+
+
+def init_from_snapshot(file_name: str) -> bool:
+    """
+    Applies the snapshot and returns True, or returns False if there is no snapshot
+    or it was built with other `L4PY_*` environment variables.
+    """
+    try:
+        with open(file_name) as file:
+            snapshot = json.load(file)
+    except (FileNotFoundError, ValueError):
+        return False
+    if snapshot.get('version') != SNAPSHOT_VERSION or snapshot.get('environment') != utils.get_l4py_environ():
+        return False
+    utils.set_app_name(snapshot['app_name'])
+    apply_config(snapshot['config'])
+    routed_loggers.clear()
+    routed_loggers.update(snapshot.get('routes', ()))
+    if snapshot.get('level_reload') is not None:
+        from l4py import levels
+        levels.start_level_reload(**snapshot['level_reload'])
+    if snapshot.get('metrics'):
+        from l4py import metrics
+        metrics.instrument()
+    return True
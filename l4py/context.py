@@ -1,27 +1,69 @@
 import contextvars
 import logging
+from types import MappingProxyType
+from typing import Any, Mapping
 
-trace_id_var = contextvars.ContextVar("trace_id", default=None)
-user_id_var = contextvars.ContextVar("user_id", default=None)
+TRACE_ID = 'trace_id'
+USER_ID = 'user_id'
+
+# the keys of the formatted output, the context and the fields can not use them
+RESERVED_KEYS = frozenset((
+    'timestamp', 'app_name', 'logger_name', 'level', 'file_name', 'line_number', 'function_name', 'message',
+    'exception', 'exception_fingerprint',
+))
+
+_EMPTY_CONTEXT: Mapping[str, Any] = MappingProxyType({})
+
+# a single immutable mapping, every bind / unbind replaces it with a new one
+context_var = contextvars.ContextVar('l4py_context', default=_EMPTY_CONTEXT)
+
+
+def bind(**fields) -> contextvars.Token:
+    if reserved := RESERVED_KEYS.intersection(fields):
+        raise ValueError(f'{", ".join(sorted(reserved))} can not be bound, the names are used by the log output')
+    return context_var.set(MappingProxyType({**context_var.get(), **fields}))
+
+
+def unbind(*keys: str) -> contextvars.Token:
+    context = context_var.get()
+    return context_var.set(MappingProxyType({k: v for k, v in context.items() if k not in keys}))
+
+
+def clear_context() -> contextvars.Token:
+    return context_var.set(_EMPTY_CONTEXT)
+
+
+def reset_context(token: contextvars.Token) -> None:
+    context_var.reset(token)
+
+
+def get_context() -> Mapping[str, Any]:
+    return context_var.get()
 
 
 def set_trace_id(trace_id: str):
-    trace_id_var.set(trace_id)
+    bind(trace_id=trace_id)
 
 
 def get_trace_id():
-    return trace_id_var.get()
+    return context_var.get().get(TRACE_ID)
 
 
 def set_user_id(user_id: str):
-    user_id_var.set(user_id)
+    bind(user_id=user_id)
 
 
 def get_user_id():
-    return user_id_var.get()
+    return context_var.get().get(USER_ID)
+
 
 class ContextFilter(logging.Filter):
     def filter(self, record: logging.LogRecord) -> bool:
-        record.trace_id = get_trace_id()
-        record.user_id = get_user_id()
-        return True
\ No newline at end of file
+        # the same filter runs on the root logger and on every handler, attach the snapshot only once
+        if 'context' in record.__dict__:
+            return True
+        context = context_var.get()
+        record.context = context
+        record.trace_id = context.get(TRACE_ID)
+        record.user_id = context.get(USER_ID)
+        return True
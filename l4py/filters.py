@@ -0,0 +1,185 @@
+import atexit
+import logging
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from typing import Mapping
+
+
+class FilterChain(logging.Filter):
+    """
+    Runs ``filters`` once per record, the root logger and the handlers sharing the chain reuse the decision.
+    """
+
+    def __init__(self, filters: list[logging.Filter] or Mapping[str, logging.Filter], names: list[str] = None):
+        super().__init__()
+        if names is not None:
+            # the 'filters' section of a dictConfig, its entries are instances once configured
+            self.filters = [filters[name] for name in names]
+        else:
+            self.filters = list(filters)
+        self._decision_key = f'_l4py_chain_{id(self)}'
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        decision = record.__dict__.get(self._decision_key)
+        if decision is None:
+            decision = True
+            for record_filter in self.filters:
+                result = record_filter.filter(record) if hasattr(record_filter, 'filter') else record_filter(record)
+                if not result:
+                    decision = False
+                    break
+            record.__dict__[self._decision_key] = decision
+        return decision
+
+
+class LoggerScopedFilter(logging.Filter):
+    """
+    Applies to the records of ``logger_name`` and its children, all other records pass.
+
+    The same filter instance is attached to the root logger and to every handler,
+    the decision is made once per record and reused by the other handlers.
+    """
+
+    def __init__(self, logger_name: str = ''):
+        super().__init__(logger_name)
+        self._decision_key = f'_l4py_filter_{id(self)}'
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if getattr(record, 'l4py_summary', False) or not super().filter(record):
+            return True
+        decision = record.__dict__.get(self._decision_key)
+        if decision is None:
+            decision = record.__dict__[self._decision_key] = self.decide(record)
+        return decision
+
+    def decide(self, record: logging.LogRecord) -> bool:
+        return True
+
+
+class SamplingFilter(LoggerScopedFilter):
+    """
+    Keeps a random ``rate`` (0.0 - 1.0) of the records.
+    """
+
+    def __init__(self, logger_name: str = '', rate: float = 1.0):
+        super().__init__(logger_name)
+        self.rate = float(rate)
+        # imported here, only configurations with samplers pay for loading the random module
+        from random import random
+        self._random = random
+
+    def decide(self, record: logging.LogRecord) -> bool:
+        return self.rate >= 1.0 or self._random() < self.rate
+
+
+class RateLimitFilter(LoggerScopedFilter):
+    """
+    Token bucket per (logger, level, message template): ``per_second`` records are let through,
+    with bursts of up to ``burst`` records.
+    Suppressed records are counted and reported as a "N similar messages suppressed" record
+    when the next record of the same kind is let through, at most once per ``summary_interval`` seconds.
+    Counts no later record reports (the storm stopped) are reported by a timer every ``summary_interval``
+    seconds (at least every second), when their bucket is evicted and by `close`.
+    """
+
+    def __init__(
+            self,
+            logger_name: str = '',
+            per_second: float = 10.0,
+            burst: int = None,
+            summary_interval: float = 10.0,
+            max_keys: int = 10000,
+    ):
+        super().__init__(logger_name)
+        self.per_second = float(per_second)
+        self.burst = float(burst if burst is not None else max(per_second, 1))
+        self.summary_interval = summary_interval
+        self.max_keys = max_keys
+        # key -> [tokens, last update, suppressed, last summary, last suppressed record]
+        self._buckets: OrderedDict[tuple, list] = OrderedDict()
+        self._lock = threading.Lock()
+        self._timer = None
+        self._closed = False
+        close = weakref.WeakMethod(self.close)
+        atexit.register(lambda: (method := close()) and method())
+
+    def decide(self, record: logging.LogRecord) -> bool:
+        key = (record.name, record.levelno, record.msg if isinstance(record.msg, str) else type(record.msg))
+        now = record.created
+        summary = evicted = None
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = [self.burst, now, 0, now, None]
+                if len(self._buckets) > self.max_keys:
+                    evicted = self._buckets.popitem(last=False)[1]
+            else:
+                self._buckets.move_to_end(key)
+                bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.per_second)
+                bucket[1] = now
+            allowed = bucket[0] >= 1
+            if not allowed:
+                bucket[2] += 1
+                bucket[4] = record
+                if self._timer is None and not self._closed:
+                    self._start_timer()
+            else:
+                bucket[0] -= 1
+                if bucket[2] and now - bucket[3] >= self.summary_interval:
+                    summary = bucket[2]
+                    bucket[2] = 0
+                    bucket[3] = now
+                    bucket[4] = None
+        if evicted is not None and evicted[2]:
+            self._emit_summary(evicted[4], evicted[2])
+        if summary:
+            self._emit_summary(record, summary)
+        return allowed
+
+    def _start_timer(self) -> None:
+        # called with the lock held
+        self._timer = threading.Timer(max(self.summary_interval, 1.0), self._report_pending)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _report_pending(self, force: bool = False) -> None:
+        now = time.time()
+        summaries = []
+        with self._lock:
+            self._timer = None
+            pending = False
+            for bucket in self._buckets.values():
+                if not bucket[2]:
+                    continue
+                if force or now - bucket[3] >= self.summary_interval:
+                    summaries.append((bucket[4], bucket[2]))
+                    bucket[2] = 0
+                    bucket[3] = now
+                    bucket[4] = None
+                else:
+                    pending = True
+            if pending and not self._closed:
+                self._start_timer()
+        for record, suppressed in summaries:
+            self._emit_summary(record, suppressed)
+
+    def close(self) -> None:
+        """
+        Reports the pending counts and stops the timer.
+        """
+        with self._lock:
+            self._closed = True
+            if self._timer is not None:
+                self._timer.cancel()
+        self._report_pending(force=True)
+
+    def _emit_summary(self, record: logging.LogRecord, suppressed: int) -> None:
+        logger = logging.getLogger(record.name)
+        summary = logger.makeRecord(
+            record.name, record.levelno, record.pathname, record.lineno,
+            '%d similar messages suppressed: %s', (suppressed, record.msg), None,
+            func=record.funcName, extra={'l4py_summary': True},
+        )
+        logger.handle(summary)
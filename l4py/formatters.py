@@ -1,52 +1,377 @@
+import copy
+import functools
 import json
 import logging
-import sys
-from datetime import datetime
+import string
+import threading
+import traceback
+from collections import OrderedDict
+from datetime import datetime, timezone
+from json.encoder import encode_basestring_ascii
+from typing import Any, Callable
 
 from l4py import utils
+from l4py.context import RESERVED_KEYS, TRACE_ID, USER_ID
+
+
+# trace_id and user_id are rendered from the record attributes set by the ContextFilter
+_CORRELATION_KEYS = (TRACE_ID, USER_ID)
+# fields named like an output key are prefixed, a duplicate key would override it for most JSON parsers
+_RESERVED_FIELD_KEYS = RESERVED_KEYS.union(_CORRELATION_KEYS)
+_RESERVED_FIELD_PREFIX = 'field_'
+_NO_CONTEXT = {}
+
+
+# the default encoder of the non-string values, the output is byte-compatible with json.dumps
+json_encoder: Callable[[Any], str] = functools.partial(json.dumps, default=str)
+
+
+def _load_fast_json_encoder() -> Callable[[Any], str]:
+    try:
+        import orjson
+        dumps = lambda value: orjson.dumps(value, default=str).decode()
+    except ImportError:
+        try:
+            import ujson
+            dumps = lambda value: ujson.dumps(value, default=str)
+        except ImportError:
+            return json_encoder
+
+    def encode(value: Any) -> str:
+        try:
+            return dumps(value)
+        except Exception:
+            # e.g. orjson rejects dict keys that are not strings, json.dumps converts them
+            return json_encoder(value)
+
+    return encode
+
+
+def fast_json_encoder(value: Any) -> str:
+    """
+    orjson / ujson when installed, stdlib json otherwise and for the values they reject.
+    Nested values are rendered without the spaces after the separators and without escaping non-ASCII characters,
+    the output is not byte-compatible with `json_encoder`.
+    The encoder is loaded on the first call and replaces this function.
+    """
+    global fast_json_encoder
+    fast_json_encoder = _load_fast_json_encoder()
+    return fast_json_encoder(value)
+
+
+class TimestampCache:
+    """
+    Renders the part of a timestamp down to the second once per second,
+    each record only splices in its milliseconds.
+    """
+
+    def __init__(self, datefmt: str = None, utc: bool = False, rfc3339: bool = False):
+        self.datefmt = datefmt
+        self.tz = timezone.utc if utc else None
+        self.rfc3339 = rfc3339
+        # sub-second directives can not be cached per second
+        self.cacheable = datefmt is None or '%f' not in datefmt
+        self._cached = (None, '', '')
+
+    def format(self, created: float) -> str:
+        second = int(created)
+        micros = round((created - second) * 1_000_000)
+        if micros >= 1_000_000:
+            second += 1
+            micros -= 1_000_000
+
+        if not self.cacheable:
+            return datetime.fromtimestamp(second, self.tz).replace(microsecond=micros).strftime(self.datefmt)
+
+        cached_second, prefix, suffix = self._cached
+        if cached_second != second:
+            prefix, suffix = self._render(second)
+            self._cached = (second, prefix, suffix)
+        if self.datefmt:
+            return prefix
+        return f'{prefix}.{micros // 1000:03d}{suffix}'
+
+    def _render(self, second: int) -> tuple[str, str]:
+        ct = datetime.fromtimestamp(second, self.tz)
+        if self.datefmt:
+            return ct.strftime(self.datefmt), ''
+        if self.rfc3339 and self.tz is None:
+            ct = ct.astimezone()
+        # 'YYYY-MM-DDTHH:MM:SS' followed by the utc offset of an aware datetime, the milliseconds go in between
+        iso = ct.isoformat(timespec='seconds')
+        return iso[:19], iso[19:]
 
 
 class FormatTimeMixin:
+    _timestamp_cache: TimestampCache = None
 
     def format_time(self, record, datefmt=None):
-        ct = datetime.fromtimestamp(record.created)
-        if datefmt:
-            return ct.strftime(datefmt)
-        else:
-            return ct.isoformat(timespec='milliseconds')
+        cache = self._timestamp_cache
+        if cache is None:
+            cache = self._timestamp_cache = TimestampCache(
+                getattr(self, 'datefmt', None),
+                getattr(self, 'utc', False),
+                getattr(self, 'rfc3339', False),
+            )
+        if datefmt is not None and datefmt != cache.datefmt:
+            return TimestampCache(datefmt, cache.tz is not None).format(record.created)
+        return cache.format(record.created)
+
+
+def exception_signature(exc_info) -> tuple:
+    """
+    The exception types and code locations (file, line, function) of the exception and its causes,
+    the exception messages are not part of it.
+    """
+    exception = exc_info[1]
+    if exception is None:
+        return (exc_info[0].__qualname__,)
+    signature, seen = [], set()
+    while exception is not None and id(exception) not in seen:
+        seen.add(id(exception))
+        signature.append(type(exception).__qualname__)
+        signature.extend(
+            (frame.f_code.co_filename, line_number, frame.f_code.co_name)
+            for frame, line_number in traceback.walk_tb(exception.__traceback__)
+        )
+        exception = exception.__cause__ or (None if exception.__suppress_context__ else exception.__context__)
+    return tuple(signature)
+
+
+def exception_fingerprint(record: logging.LogRecord) -> str:
+    # computed once per record, shared by all handlers
+    fingerprint = record.__dict__.get('exc_fingerprint')
+    if fingerprint is None:
+        import hashlib  # loads openssl, only needed once an exception is fingerprinted
+        signature = repr(exception_signature(record.exc_info)).encode('utf-8', 'replace')
+        fingerprint = record.exc_fingerprint = hashlib.sha1(signature).hexdigest()[:12]
+    return fingerprint
+
+
+def exception_frames(exc_info) -> list[dict]:
+    return [
+        {'file_name': frame.f_code.co_filename, 'line_number': line_number, 'function_name': frame.f_code.co_name}
+        for frame, line_number in traceback.walk_tb(exc_info[2])
+    ]
+
+
+class ExceptionCache:
+    """
+    LRU of the last ``max_size`` exception fingerprints and how often they were seen.
+    """
+
+    def __init__(self, max_size: int = 1024):
+        self.max_size = max_size
+        self._seen: OrderedDict[str, int] = OrderedDict()
+        self._lock = threading.Lock()
+        self._record_key = f'_l4py_exception_seen_{id(self)}'
+
+    def seen(self, fingerprint: str) -> int:
+        """
+        Counts ``fingerprint`` and returns how often it was seen before.
+        """
+        with self._lock:
+            count = self._seen.get(fingerprint, 0)
+            self._seen[fingerprint] = count + 1
+            if count:
+                self._seen.move_to_end(fingerprint)
+            elif len(self._seen) > self.max_size:
+                self._seen.popitem(last=False)
+            return count
+
+    def seen_record(self, record: logging.LogRecord, fingerprint: str) -> int:
+        """
+        Like `seen`, but counts each record once: the formatters sharing the cache (e.g. the colored copy
+        of a TextFormatter) get the same result for the same record.
+        """
+        count = record.__dict__.get(self._record_key)
+        if count is None:
+            count = record.__dict__[self._record_key] = self.seen(fingerprint)
+        return count
 
 
 class AbstractFormatter(FormatTimeMixin, logging.Formatter):
-    def __init__(self, app_name=None):
-        super().__init__()
+    """
+    ``exception_cache_size`` > 0 keeps the fingerprints of the last tracebacks,
+    a traceback seen before is replaced by a one line reference to its fingerprint.
+
+    ``memoize`` keeps the output on the record, a formatter shared by several handlers renders each record once.
+    """
+
+    memoize: bool = False
+
+    def __init__(self, app_name=None, datefmt: str = None, utc: bool = False, rfc3339: bool = False,
+                 exception_cache_size: int = 0):
+        super().__init__(datefmt=datefmt)
         if app_name is None:
             app_name = utils.get_app_name()
         self.app_name = app_name
+        self.utc = utc
+        self.rfc3339 = rfc3339
+        self.exception_cache = ExceptionCache(exception_cache_size) if exception_cache_size else None
+        self._memo_key = f'_l4py_formatted_{id(self)}'
+
+    def format(self, record: logging.LogRecord) -> str:
+        if not self.memoize:
+            return self.render(record)
+        formatted = record.__dict__.get(self._memo_key)
+        if formatted is None:
+            formatted = record.__dict__[self._memo_key] = self.render(record)
+        return formatted
+
+    def render(self, record: logging.LogRecord) -> str:
+        raise NotImplementedError
+
+    def exception_text(self, record: logging.LogRecord) -> str:
+        # rendered once per record and shared by all handlers, like logging.Formatter does
+        if not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        return record.exc_text
+
+    def render_exception(self, record: logging.LogRecord) -> tuple[str, str or None]:
+        """
+        The traceback (or the reference to a traceback seen before) and its fingerprint if the cache is enabled.
+        """
+        if self.exception_cache is None or not record.exc_info:
+            return self.exception_text(record), None
+        fingerprint = exception_fingerprint(record)
+        count = self.exception_cache.seen_record(record, fingerprint)
+        if count == 0:
+            return self.exception_text(record), fingerprint
+        exc_type, exception = record.exc_info[:2]
+        return f'{exc_type.__name__}: {exception} (traceback {fingerprint} repeated, seen {count + 1} times)', fingerprint
 
 
 class JsonFormatter(AbstractFormatter):
+    """
+    ``exception_frames=True`` renders the exception as an object with its type, message and stack frames
+    (file_name, line_number, function_name) instead of the traceback text.
+    ``fast_encoder=True`` encodes the non-string values with `fast_json_encoder`.
+    """
 
-    def format(self, record: logging.LogRecord) -> str:
-        log_record = {
-            "timestamp": self.format_time(record),
-            "app_name": self.app_name,
-            "logger_name": record.name,
-            "level": record.levelname,
-            "file_name": record.filename,
-            "line_number": record.lineno,
-            "function_name": record.funcName,
-            "message": str(record.msg) % record.args,
-        }
-        if getattr(record, "trace_id", None):
-            log_record["trace_id"] = record.trace_id
-        if getattr(record, "user_id", None):
-            log_record["user_id"] = record.user_id
-        if record.exc_info:
-            log_record['exception'] = self.formatException(record.exc_info)
-        return json.dumps(log_record, default=str)
+    def __init__(
+            self,
+            app_name=None,
+            encoder: Callable[[Any], str] = None,
+            exception_frames: bool = False,
+            fast_encoder: bool = False,
+            **kwargs,
+    ):
+        super().__init__(app_name, **kwargs)
+        # None: the module level json_encoder / fast_json_encoder, the fast one is only loaded once it is used
+        self.encoder = encoder
+        self.fast_encoder = fast_encoder
+        self.exception_frames = exception_frames
+        # app_name never changes, encode it and the surrounding keys only once
+        self._app_name_segment = f', "app_name": {encode_basestring_ascii(self.app_name)}, "logger_name": '
+
+    def encode(self, value: Any) -> str:
+        # strings and ints are encoded exactly like json.dumps would
+        if type(value) is str:
+            return encode_basestring_ascii(value)
+        if type(value) is int:
+            return str(value)
+        return (self.encoder or (fast_json_encoder if self.fast_encoder else json_encoder))(value)
+
+    def render(self, record: logging.LogRecord) -> str:
+        encode = self.encode
+        parts = [
+            '{"timestamp": ', encode(self.format_time(record)),
+            self._app_name_segment, encode(record.name),
+            ', "level": ', encode(record.levelname),
+            ', "file_name": ', encode(record.filename),
+            ', "line_number": ', encode(record.lineno),
+            ', "function_name": ', encode(record.funcName),
+            ', "message": ', encode(record.getMessage()),
+        ]
+        if trace_id := getattr(record, "trace_id", None):
+            parts += (', "trace_id": ', encode(trace_id))
+        if user_id := getattr(record, "user_id", None):
+            parts += (', "user_id": ', encode(user_id))
+        fields = getattr(record, "fields", None) or _NO_CONTEXT
+        for key, value in getattr(record, "context", _NO_CONTEXT).items():
+            # a field overrides the context value of the same key
+            if value is not None and key not in _CORRELATION_KEYS and key not in fields:
+                parts += (', ', encode_basestring_ascii(key), ': ', encode(value))
+        for key, value in fields.items():
+            if key in _RESERVED_FIELD_KEYS:
+                key = _RESERVED_FIELD_PREFIX + key
+            parts += (', ', encode_basestring_ascii(key), ': ', encode(value))
+        if record.exc_info and self.exception_frames:
+            parts += (', "exception": ', encode(self.exception_object(record)))
+        elif record.exc_info or record.exc_text:
+            exception, fingerprint = self.render_exception(record)
+            parts += (', "exception": ', encode(exception))
+            if fingerprint is not None:
+                parts += (', "exception_fingerprint": ', encode(fingerprint))
+        parts.append('}')
+        return ''.join(parts)
+
+    def exception_object(self, record: logging.LogRecord) -> dict:
+        exc_type, exception = record.exc_info[:2]
+        exception_object = {'type': exc_type.__name__, 'message': str(exception)}
+        if self.exception_cache is None:
+            exception_object['frames'] = exception_frames(record.exc_info)
+        else:
+            # the frames of a stack seen before are left out
+            exception_object['fingerprint'] = fingerprint = exception_fingerprint(record)
+            if self.exception_cache.seen_record(record, fingerprint) == 0:
+                exception_object['frames'] = exception_frames(record.exc_info)
+        return exception_object
+
+
+DEFAULT_LAYOUT = '{timestamp} [{level:<8}] {app_name} {logger_name} {file_name}:{line_number} {function_name}: {message}'
+
+# layout field -> expression rendering it, `self` is the formatter
+_LAYOUT_FIELDS = {
+    'timestamp': 'self.format_time(record)',
+    'app_name': 'self.app_name',
+    'logger_name': 'record.name',
+    'level': 'record.levelname',
+    'file_name': 'record.filename',
+    'line_number': 'record.lineno',
+    'function_name': 'record.funcName',
+    'message': 'record.getMessage()',
+    'process': 'record.process',
+    'thread_name': 'record.threadName',
+}
+
+_LITERAL_ESCAPES = str.maketrans({'\\': '\\\\', "'": "\\'", '\n': '\\n', '\r': '\\r', '{': '{{', '}': '}}'})
+
+
+def compile_layout(layout: str) -> Callable[['TextFormatter', logging.LogRecord], str]:
+    """
+    Compiles a `str.format` style ``layout`` into a function rendering a record with a single f-string.
+    Besides the fields of `_LAYOUT_FIELDS` any record attribute can be used, missing attributes render as ''.
+    """
+    namespace = {'_MISSING': ''}
+    source = []
+    for literal, field, spec, conversion in string.Formatter().parse(layout):
+        source.append(literal.translate(_LITERAL_ESCAPES))
+        if field is None:
+            continue
+        if field in _LAYOUT_FIELDS:
+            expression = _LAYOUT_FIELDS[field]
+        elif field.isidentifier():
+            constant = f'_field_{len(namespace)}'
+            namespace[constant] = field
+            expression = f'getattr(record, {constant}, _MISSING)'
+        else:
+            raise ValueError(f'invalid field {field!r} in layout {layout!r}')
+        if spec and any(char in spec for char in '{}\'\\\n\r'):
+            raise ValueError(f'unsupported format spec {spec!r} in layout {layout!r}')
+        if conversion not in (None, 's', 'r', 'a'):
+            raise ValueError(f'unsupported conversion {conversion!r} in layout {layout!r}')
+        source.append(f'{{{expression}{"!" + conversion if conversion else ""}{":" + spec if spec else ""}}}')
+    return eval(f"lambda self, record: f'{''.join(source)}'", namespace)
 
 
 class TextFormatter(AbstractFormatter):
+    """
+    Renders ``layout`` (see `DEFAULT_LAYOUT`) followed by the fields, the context and the exception.
+    ``color=None`` leaves the decision to the handler: the ConsoleHandler enables it once if its stream is a terminal,
+    other handlers write without colours.
+    """
 
     color_mapping = {
         'DEBUG': '32',
@@ -57,26 +382,32 @@ class TextFormatter(AbstractFormatter):
         'CRITICAL': '31',
     }
 
-    def format(self, record: logging.LogRecord) -> str:
-        log_record = {
-            "timestamp": self.format_time(record),
-            "app_name": self.app_name,
-            "logger_name": record.name,
-            "level": record.levelname,
-            "file_name": record.filename,
-            "line_number": record.lineno,
-            "function_name": record.funcName,
-            "message": record.getMessage(),
-        }
-        formatted_log = '{timestamp} [{level:<8}] {app_name} {logger_name} {file_name}:{line_number} {function_name}: {message}'.format(
-            **log_record
-        )
-        if sys.stdout.isatty():
-            formatted_log = '\033[' + self.color_mapping.get(record.levelname, '34') + f'm{formatted_log}'
+    def __init__(self, app_name=None, layout: str = None, color: bool = None, **kwargs):
+        super().__init__(app_name, **kwargs)
+        self.layout = layout or DEFAULT_LAYOUT
+        self.color = color
+        self._render = compile_layout(self.layout)
+        self._color_codes = {level: f'\033[{code}m' for level, code in self.color_mapping.items()}
+
+    def with_color(self, color: bool) -> 'TextFormatter':
+        formatter = copy.copy(self)
+        formatter.color = color
+        formatter._memo_key = f'_l4py_formatted_{id(formatter)}'
+        return formatter
+
+    def render(self, record: logging.LogRecord) -> str:
+        formatted_log = self._render(self, record)
+        if fields := getattr(record, "fields", None):
+            formatted_log += ''.join(f' {key}={value}' for key, value in fields.items())
         if trace_id := getattr(record, "trace_id", None):
             formatted_log += f' trace_id: {trace_id}'
         if user_id := getattr(record, "user_id", None):
             formatted_log += f' user_id: {user_id}'
-        if exc_info := record.exc_info:
-            formatted_log += f'\n{self.formatException(exc_info)}'
-        return formatted_log + '\033[0m'
+        for key, value in getattr(record, "context", _NO_CONTEXT).items():
+            if value is not None and key not in _CORRELATION_KEYS:
+                formatted_log += f' {key}: {value}'
+        if record.exc_info or record.exc_text:
+            formatted_log += f'\n{self.render_exception(record)[0]}'
+        if self.color:
+            return self._color_codes.get(record.levelname, '\033[34m') + formatted_log + '\033[0m'
+        return formatted_log
@@ -0,0 +1,993 @@
+import errno
+import logging
+import logging.handlers
+import os
+import queue
+import socket
+import sys
+import threading
+import time
+import weakref
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+from l4py import utils
+from l4py.formatters import TextFormatter
+
+try:
+    import fcntl
+except ImportError:  # not available on windows
+    fcntl = None
+
+OVERFLOW_BLOCK = 'block'
+OVERFLOW_DROP_OLDEST = 'drop_oldest'
+OVERFLOW_DROP_NEW = 'drop_new'
+
+_OVERFLOW_POLICIES = (OVERFLOW_BLOCK, OVERFLOW_DROP_OLDEST, OVERFLOW_DROP_NEW)
+
+MULTIPROCESS_PID = 'pid'
+MULTIPROCESS_LOCK = 'lock'
+
+COMPRESSION_GZIP = 'gzip'
+COMPRESSION_ZSTD = 'zstd'
+
+_COMPRESSION_SUFFIXES = {COMPRESSION_GZIP: '.gz', COMPRESSION_ZSTD: '.zst'}
+_ROTATION_INTERVALS = {'S': 1, 'M': 60, 'H': 60 * 60, 'D': 24 * 60 * 60}
+
+PROTOCOL_TCP = 'tcp'
+PROTOCOL_UDP = 'udp'
+PROTOCOL_UNIX = 'unix'
+PROTOCOL_UNIX_DGRAM = 'unix_dgram'
+
+_PROTOCOLS = (PROTOCOL_TCP, PROTOCOL_UDP, PROTOCOL_UNIX, PROTOCOL_UNIX_DGRAM)
+
+FRAMING_NDJSON = 'ndjson'
+FRAMING_SYSLOG = 'syslog'
+
+_FRAMINGS = (FRAMING_NDJSON, FRAMING_SYSLOG)
+
+
+def stream_supports_color(stream) -> bool:
+    """
+    True if ``stream`` is a terminal, the `NO_COLOR` and `FORCE_COLOR` environment variables take precedence.
+    """
+    if os.environ.get('NO_COLOR'):
+        return False
+    if os.environ.get('FORCE_COLOR'):
+        return True
+    try:
+        return stream.isatty()
+    except (AttributeError, ValueError, OSError):
+        return False
+
+
+class ConsoleHandler(logging.StreamHandler):
+    """
+    StreamHandler deciding once, against its own stream, whether a TextFormatter with ``color=None`` colours its output.
+    """
+
+    _formatter: logging.Formatter = None
+
+    def setFormatter(self, fmt: logging.Formatter) -> None:
+        self._formatter = fmt
+        # without colours the formatter is used as it is and can still be shared with other handlers
+        if isinstance(fmt, TextFormatter) and fmt.color is None and stream_supports_color(self.stream):
+            fmt = fmt.with_color(True)
+        super().setFormatter(fmt)
+
+    def setStream(self, stream):
+        previous = super().setStream(stream)
+        if previous is not None and self._formatter is not None:
+            self.setFormatter(self._formatter)
+        return previous
+
+
+class _BlockingQueueListener(logging.handlers.QueueListener):
+
+    def enqueue_sentinel(self) -> None:
+        # the queue may be full at shutdown, wait for the listener to make room
+        self.queue.put(self._sentinel)
+
+
+class AsyncQueueHandler(logging.handlers.QueueHandler):
+    """
+    Puts a bounded queue in front of ``handlers`` and drains it on a background listener thread.
+    The caller only pays for the enqueue, formatting and I/O happen on the listener thread.
+    """
+
+    def __init__(
+            self,
+            handlers: list[logging.Handler],
+            queue_size: int = 10000,
+            overflow: str = OVERFLOW_BLOCK,
+    ):
+        if overflow not in _OVERFLOW_POLICIES:
+            raise ValueError(f'overflow must be one of {_OVERFLOW_POLICIES}, got {overflow!r}')
+        super().__init__(queue.Queue(queue_size))
+        self.overflow = overflow
+        self.dropped = 0
+        # enqueue runs on the producer threads
+        self._dropped_lock = threading.Lock()
+        # index access lets dictConfig resolve 'cfg://handlers.<name>' references
+        self.handlers = [handlers[i] for i in range(len(handlers))]
+        self.listener = _BlockingQueueListener(
+            self.queue, *self.handlers, respect_handler_level=True
+        )
+        self.listener.start()
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # the listener runs in-process, so the record does not have to be pickled:
+        # leave the message rendering to the formatters on the listener thread
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        if self.overflow == OVERFLOW_BLOCK:
+            self.queue.put(record)
+        elif self.overflow == OVERFLOW_DROP_NEW:
+            try:
+                self.queue.put_nowait(record)
+            except queue.Full:
+                self._count_dropped()
+        else:
+            while True:
+                try:
+                    self.queue.put_nowait(record)
+                    return
+                except queue.Full:
+                    try:
+                        self.queue.get_nowait()
+                        self.queue.task_done()
+                        self._count_dropped()
+                    except queue.Empty:
+                        pass
+
+    def _count_dropped(self) -> None:
+        with self._dropped_lock:
+            self.dropped += 1
+
+    def flush(self) -> None:
+        # wait until the listener has handled everything enqueued so far
+        if self.listener._thread is not None and self.listener._thread is not threading.current_thread():
+            self.queue.join()
+        for handler in self.handlers:
+            handler.flush()
+
+    def close(self) -> None:
+        if self.listener._thread is not None:
+            self.listener.stop()
+            if self.dropped:
+                self._report_dropped()
+            self.flush()
+        super().close()
+
+    def _report_dropped(self) -> None:
+        record = logging.LogRecord(
+            name='l4py', level=logging.WARNING, pathname=__file__, lineno=0,
+            msg='%d log records dropped by the async queue (overflow=%s)',
+            args=(self.dropped, self.overflow), exc_info=None,
+        )
+        for handler in self.handlers:
+            if record.levelno >= handler.level:
+                handler.handle(record)
+
+
+try:
+    _IOV_MAX = os.sysconf('SC_IOV_MAX')
+except (AttributeError, ValueError, OSError):
+    _IOV_MAX = 1024
+
+
+class BufferedRotatingFileHandler(logging.handlers.RotatingFileHandler):
+    """
+    RotatingFileHandler that collects the encoded records in memory and writes them in chunks.
+    The buffer is written when it reaches ``buffer_size`` bytes, every ``flush_interval_ms``,
+    on records of ``flush_level`` or above and when the handler is flushed or closed.
+    The file size is tracked while writing, records are not formatted a second time to check the rollover.
+    """
+
+    def __init__(
+            self,
+            filename,
+            maxBytes: int = 0,
+            backupCount: int = 0,
+            encoding: str = None,
+            delay: bool = False,
+            errors: str = None,
+            buffer_size: int = 64 * 1024,
+            flush_interval_ms: int = 1000,
+            flush_level: int = logging.ERROR,
+    ):
+        self.buffer_size = buffer_size
+        self.flush_interval = flush_interval_ms / 1000
+        self.flush_level = flush_level
+        self._buffer: list[bytes] = []
+        self._buffered = 0
+        self._size = 0
+        super().__init__(
+            filename, maxBytes=maxBytes, backupCount=backupCount,
+            encoding=encoding or 'utf-8', delay=delay, errors=errors,
+        )
+        self._stopped = threading.Event()
+        self._start_flusher()
+        if hasattr(os, 'register_at_fork'):
+            after_fork = weakref.WeakMethod(self._after_fork)
+            os.register_at_fork(after_in_child=lambda: (method := after_fork()) and method())
+
+    def _start_flusher(self) -> None:
+        if self.flush_interval > 0:
+            threading.Thread(target=self._flush_periodically, name='l4py-file-flusher', daemon=True).start()
+
+    def _after_fork(self) -> None:
+        # the parent writes what it has buffered and the flusher thread does not survive the fork
+        self._buffer, self._buffered = [], 0
+        if not self._stopped.is_set():
+            self._start_flusher()
+
+    def _open(self):
+        stream = open(self.baseFilename, 'ab', buffering=0)
+        self._size = stream.seek(0, os.SEEK_END)
+        return stream
+
+    def emit(self, record: logging.LogRecord) -> None:
+        try:
+            data = (self.format(record) + self.terminator).encode(self.encoding, self.errors or 'strict')
+            if self.maxBytes > 0 and self._size + self._buffered > 0 \
+                    and self._size + self._buffered + len(data) >= self.maxBytes:
+                self.doRollover()
+            self._buffer.append(data)
+            self._buffered += len(data)
+            if self._buffered >= self.buffer_size or record.levelno >= self.flush_level:
+                self._write_buffer()
+        except RecursionError:
+            raise
+        except Exception:
+            self.handleError(record)
+
+    def doRollover(self) -> None:
+        self._write_buffer()
+        super().doRollover()
+        self._size = 0
+
+    def flush(self) -> None:
+        with self.lock:
+            self._write_buffer()
+
+    def close(self) -> None:
+        self._stopped.set()
+        self.flush()
+        super().close()
+
+    def _flush_periodically(self) -> None:
+        while not self._stopped.wait(self.flush_interval):
+            self.flush()
+
+    def _write_buffer(self) -> None:
+        if not self._buffer:
+            return
+        if self.stream is None:
+            self.stream = self._open()
+        chunks, self._buffer, self._buffered = self._buffer, [], 0
+        fd = self.stream.fileno()
+        for i in range(0, len(chunks), _IOV_MAX):
+            batch = chunks[i:i + _IOV_MAX]
+            size = sum(map(len, batch))
+            written = os.writev(fd, batch) if hasattr(os, 'writev') else 0
+            if written < size:
+                # partial write (or no writev on this platform), write the rest
+                pending = memoryview(b''.join(batch))[written:]
+                while pending:
+                    pending = pending[os.write(fd, pending):]
+            self._size += size
+
+
+def shard_file_name(file_name: str, pid: int) -> str:
+    """
+    'app-host.log' -> 'app-host.<pid>.log'
+    """
+    root, ext = os.path.splitext(file_name)
+    return f'{root}.{pid}{ext}'
+
+
+class PidFileMixin:
+    """
+    Every process writes and rotates its own `<name>.<pid><ext>` file, no coordination between the processes is needed.
+    The file is reopened when the handler is used in a forked process.
+    """
+
+    def __init__(self, filename, *args, **kwargs):
+        self.file_name_template = os.path.abspath(os.fspath(filename))
+        self._pid = os.getpid()
+        super().__init__(shard_file_name(self.file_name_template, self._pid), *args, **kwargs)
+
+    def emit(self, record: logging.LogRecord) -> None:
+        if self._pid != os.getpid():
+            self._reopen_for_process()
+        super().emit(record)
+
+    def _reopen_for_process(self) -> None:
+        self._pid = os.getpid()
+        self.baseFilename = shard_file_name(self.file_name_template, self._pid)
+        if self.stream is not None:
+            self.stream.close()
+            self.stream = self._open()
+
+
+class PidRotatingFileHandler(PidFileMixin, logging.handlers.RotatingFileHandler):
+    pass
+
+
+class PidBufferedRotatingFileHandler(PidFileMixin, BufferedRotatingFileHandler):
+    pass
+
+
+class LockingRotatingFileHandler(logging.handlers.RotatingFileHandler):
+    """
+    All processes write to the same file, writes and rotations are serialized with an exclusive `flock` on `<file>.lock`.
+    Records are formatted before the lock is taken, so the lock is only held for the size check and the write.
+    """
+
+    def __init__(self, filename, maxBytes: int = 0, backupCount: int = 0, encoding: str = None, delay: bool = False,
+                 errors: str = None):
+        if fcntl is None:
+            raise NotImplementedError('LockingRotatingFileHandler requires fcntl')
+        super().__init__(filename, maxBytes=maxBytes, backupCount=backupCount, encoding=encoding, delay=delay,
+                         errors=errors)
+        self.lock_file_name = f'{self.baseFilename}.lock'
+        self._lock_fd = None
+        self._lock_pid = None
+
+    def emit(self, record: logging.LogRecord) -> None:
+        try:
+            msg = self.format(record) + self.terminator
+            with self._file_lock():
+                self._reopen_if_rotated()
+                size = os.fstat(self.stream.fileno()).st_size
+                if self.maxBytes > 0 and size > 0 and size + len(msg) >= self.maxBytes:
+                    self.doRollover()
+                self.stream.write(msg)
+                self.stream.flush()
+        except RecursionError:
+            raise
+        except Exception:
+            self.handleError(record)
+
+    def close(self) -> None:
+        with self.lock:
+            if self._lock_fd is not None and self._lock_pid == os.getpid():
+                os.close(self._lock_fd)
+            self._lock_fd = None
+            super().close()
+
+    @contextmanager
+    def _file_lock(self):
+        # flock locks belong to the open file description, which a forked child shares with its parent
+        if self._lock_pid != os.getpid():
+            self._lock_fd = os.open(self.lock_file_name, os.O_CREAT | os.O_RDWR, 0o644)
+            self._lock_pid = os.getpid()
+        fcntl.flock(self._lock_fd, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(self._lock_fd, fcntl.LOCK_UN)
+
+    def _reopen_if_rotated(self) -> None:
+        # another process may have rotated the file since the last write
+        try:
+            stat = os.stat(self.baseFilename)
+        except FileNotFoundError:
+            stat = None
+        if self.stream is not None and stat is not None:
+            own = os.fstat(self.stream.fileno())
+            if (own.st_dev, own.st_ino) == (stat.st_dev, stat.st_ino):
+                return
+        if self.stream is not None:
+            self.stream.close()
+        self.stream = self._open()
+
+
+class SegmentCompressor:
+    """
+    Compresses rotated segments on a background thread and removes the oldest segments
+    once there are more than ``backup_count`` of them or they take more than ``max_total_bytes``.
+    Segments waiting for the compression are neither counted nor removed.
+    """
+
+    def __init__(self, base_file_name: str, compression: str = None, backup_count: int = 0,
+                 max_total_bytes: int = 0):
+        if compression is not None and compression not in _COMPRESSION_SUFFIXES:
+            raise ValueError(f'compression must be one of {tuple(_COMPRESSION_SUFFIXES)}, got {compression!r}')
+        if compression == COMPRESSION_ZSTD:
+            import zstandard  # noqa: F401, fail early if the optional dependency is missing
+        self.base_file_name = base_file_name
+        self.compression = compression
+        self.backup_count = backup_count
+        self.max_total_bytes = max_total_bytes
+        self._queue = queue.Queue()
+        self._thread = None
+        # submitted segments, not compressed yet
+        self._pending: set[str] = set()
+        self._pending_lock = threading.Lock()
+
+    def submit(self, segment: str) -> None:
+        with self._pending_lock:
+            self._pending.add(segment)
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name='l4py-segment-compressor', daemon=True)
+            self._thread.start()
+        self._queue.put(segment)
+
+    def close(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
+        self._thread = None
+
+    def _run(self) -> None:
+        while (segment := self._queue.get()) is not None:
+            try:
+                try:
+                    self.compress(segment)
+                finally:
+                    with self._pending_lock:
+                        self._pending.discard(segment)
+                self.apply_retention()
+            except Exception:
+                logging.lastResort.handle(logging.LogRecord(
+                    'l4py', logging.ERROR, __file__, 0, 'could not process rotated segment %s', (segment,),
+                    exc_info=sys.exc_info(),
+                ))
+
+    def compress(self, segment: str) -> None:
+        if self.compression is None:
+            return
+        target = segment + _COMPRESSION_SUFFIXES[self.compression]
+        pending = target + '.tmp'
+        try:
+            source = open(segment, 'rb')
+        except FileNotFoundError:
+            # removed by someone else in the meantime
+            return
+        with source:
+            if self.compression == COMPRESSION_GZIP:
+                import gzip
+                import shutil
+                with gzip.open(pending, 'wb') as destination:
+                    shutil.copyfileobj(source, destination, 1024 * 1024)
+            else:
+                import zstandard
+                with open(pending, 'wb') as destination:
+                    zstandard.ZstdCompressor().copy_stream(source, destination)
+        os.replace(pending, target)
+        os.remove(segment)
+
+    def segment_key(self, name: str) -> tuple[int, str]:
+        """
+        (rotation sequence, timestamp) of a segment named `<file>.<YYYYmmdd-HHMMSS>.<sequence>[.gz|.zst]`,
+        segments of older versions without a sequence sort first.
+        """
+        stem = name[len(self.base_file_name) + 1:]
+        for suffix in _COMPRESSION_SUFFIXES.values():
+            stem = stem.removesuffix(suffix)
+        timestamp, _, sequence = stem.partition('.')
+        return (int(sequence) if sequence.isdigit() else -1), timestamp
+
+    def segments(self) -> list[str]:
+        """
+        The rotated segments of the base file, oldest first.
+        """
+        import glob
+        segments = [
+            name for name in glob.glob(glob.escape(self.base_file_name) + '.*')
+            if not name.endswith(('.tmp', '.lock'))
+        ]
+        return sorted(segments, key=self.segment_key)
+
+    def apply_retention(self) -> None:
+        with self._pending_lock:
+            pending = set(self._pending)
+        segments, sizes = [], []
+        for name in self.segments():
+            if name in pending:
+                continue
+            try:
+                sizes.append(os.path.getsize(name))
+            except FileNotFoundError:
+                continue
+            segments.append(name)
+        total = sum(sizes)
+        for i, name in enumerate(segments):
+            too_many = self.backup_count > 0 and len(segments) - i > self.backup_count
+            too_large = self.max_total_bytes > 0 and total > self.max_total_bytes
+            if not (too_many or too_large):
+                break
+            try:
+                os.remove(name)
+            except FileNotFoundError:
+                pass
+            total -= sizes[i]
+
+
+class TimedSizeRotatingFileHandler(logging.handlers.BaseRotatingHandler):
+    """
+    Rotates at fixed intervals (``when``: 'S', 'M', 'H' or 'D') and when the file would exceed ``maxBytes``.
+    Rotated segments are named `<file>.<YYYYmmdd-HHMMSS>.<sequence>` and compressed / pruned by a SegmentCompressor
+    on a background thread, the logging thread only renames the file.
+    The sequence continues after the highest one on disk and is never handed out twice.
+    """
+
+    def __init__(
+            self,
+            filename,
+            when: str = None,
+            maxBytes: int = 0,
+            backupCount: int = 0,
+            compression: str = None,
+            maxTotalBytes: int = 0,
+            encoding: str = None,
+            delay: bool = False,
+            errors: str = None,
+    ):
+        if when is not None and when.upper() not in _ROTATION_INTERVALS:
+            raise ValueError(f'when must be one of {tuple(_ROTATION_INTERVALS)}, got {when!r}')
+        super().__init__(filename, 'a', encoding=encoding, delay=delay, errors=errors)
+        self.when = when.upper() if when else None
+        self.maxBytes = maxBytes
+        self.compressor = SegmentCompressor(self.baseFilename, compression, backupCount, maxTotalBytes)
+        self._sequence = max((self.compressor.segment_key(name)[0] for name in self.compressor.segments()), default=-1) + 1
+        self.rolloverAt = self.compute_rollover(time.time())
+
+    def compute_rollover(self, now: float) -> float:
+        if self.when is None:
+            return float('inf')
+        ct = datetime.fromtimestamp(now)
+        if self.when == 'D':
+            start = ct.replace(hour=0, minute=0, second=0, microsecond=0)
+        elif self.when == 'H':
+            start = ct.replace(minute=0, second=0, microsecond=0)
+        elif self.when == 'M':
+            start = ct.replace(second=0, microsecond=0)
+        else:
+            start = ct.replace(microsecond=0)
+        return (start + timedelta(seconds=_ROTATION_INTERVALS[self.when])).timestamp()
+
+    def emit(self, record: logging.LogRecord) -> None:
+        try:
+            msg = self.format(record) + self.terminator
+            if self.stream is None:
+                self.stream = self._open()
+            if record.created >= self.rolloverAt:
+                self.doRollover()
+            elif self.maxBytes > 0:
+                size = self.stream.tell()
+                if size > 0 and size + len(msg) >= self.maxBytes:
+                    self.doRollover()
+            self.stream.write(msg)
+            self.flush()
+        except RecursionError:
+            raise
+        except Exception:
+            self.handleError(record)
+
+    def segment_name(self, now: float) -> str:
+        sequence = self._sequence
+        self._sequence += 1
+        return f'{self.baseFilename}.{time.strftime("%Y%m%d-%H%M%S", time.localtime(now))}.{sequence}'
+
+    def doRollover(self) -> None:
+        if self.stream is not None:
+            self.stream.close()
+            self.stream = None
+        now = time.time()
+        if os.path.exists(self.baseFilename) and os.path.getsize(self.baseFilename) > 0:
+            segment = self.segment_name(now)
+            os.rename(self.baseFilename, segment)
+            self.compressor.submit(segment)
+        self.rolloverAt = self.compute_rollover(now)
+        self.stream = self._open()
+
+    def close(self) -> None:
+        super().close()
+        self.compressor.close()
+
+
+_tail_sampling_handlers: 'weakref.WeakSet[TailSamplingHandler]' = weakref.WeakSet()
+
+
+def end_trace(trace_id: str) -> None:
+    """
+    Discards the records buffered for ``trace_id`` by all TailSamplingHandlers, call it when a request ends.
+    """
+    for handler in list(_tail_sampling_handlers):
+        handler.discard(trace_id)
+
+
+class TailSamplingHandler(logging.Handler):
+    """
+    Records of ``threshold`` and above are passed to ``handlers``, ``levels`` overrides ``threshold`` for the loggers
+    configured with their own level and their children.
+    Records below their threshold are kept in memory per `trace_id` and only passed to ``handlers``
+    if a record of ``flush_level`` or above is logged within the same trace, otherwise they are discarded
+    with `end_trace`, by the LRU / TTL eviction or when more than ``max_total_records`` are buffered.
+    """
+
+    def __init__(
+            self,
+            handlers: list[logging.Handler],
+            threshold: int = logging.INFO,
+            flush_level: int = logging.ERROR,
+            max_records_per_trace: int = 1000,
+            max_traces: int = 10000,
+            ttl_seconds: float = 300.0,
+            max_total_records: int = 100000,
+            levels: dict[str, int] = None,
+    ):
+        super().__init__()
+        # index access lets dictConfig resolve 'cfg://handlers.<name>' references
+        self.handlers = [handlers[i] for i in range(len(handlers))]
+        self.threshold = logging.getLevelName(threshold) if isinstance(threshold, str) else threshold
+        self.levels = {
+            name: logging.getLevelName(level) if isinstance(level, str) else level
+            for name, level in (levels or {}).items()
+        }
+        # logger name -> threshold, resolved once per logger
+        self._thresholds: dict[str, int] = {}
+        self.flush_level = logging.getLevelName(flush_level) if isinstance(flush_level, str) else flush_level
+        self.max_records_per_trace = max_records_per_trace
+        self.max_traces = max_traces
+        self.ttl_seconds = ttl_seconds
+        self.max_total_records = max_total_records
+        # trace_id -> [records, last record time], least recently used first
+        self._traces: OrderedDict[str, list] = OrderedDict()
+        self._buffered = 0
+        _tail_sampling_handlers.add(self)
+
+    @property
+    def buffered(self) -> int:
+        return self._buffered
+
+    def emit(self, record: logging.LogRecord) -> None:
+        trace_id = getattr(record, 'trace_id', None)
+        if trace_id is not None and record.levelno >= self.flush_level:
+            for buffered_record in self._pop(trace_id):
+                self._forward(buffered_record)
+            self._forward(record)
+        elif record.levelno >= self._threshold(record.name):
+            self._forward(record)
+        elif trace_id is not None:
+            self._buffer(trace_id, record)
+
+    def _threshold(self, logger_name: str) -> int:
+        threshold = self._thresholds.get(logger_name)
+        if threshold is None:
+            # the level of the logger or of its nearest configured parent, like Logger.getEffectiveLevel
+            name = logger_name
+            while name:
+                if self.levels.get(name):
+                    threshold = self.levels[name]
+                    break
+                name = name.rpartition('.')[0]
+            else:
+                threshold = self.threshold
+            self._thresholds[logger_name] = threshold
+        return threshold
+
+    def discard(self, trace_id: str) -> None:
+        with self.lock:
+            self._pop(trace_id)
+
+    def flush_trace(self, trace_id: str) -> None:
+        with self.lock:
+            for record in self._pop(trace_id):
+                self._forward(record)
+
+    def flush(self) -> None:
+        for handler in self.handlers:
+            handler.flush()
+
+    def close(self) -> None:
+        with self.lock:
+            self._traces.clear()
+            self._buffered = 0
+        _tail_sampling_handlers.discard(self)
+        super().close()
+
+    def _forward(self, record: logging.LogRecord) -> None:
+        for handler in self.handlers:
+            if record.levelno >= handler.level:
+                handler.handle(record)
+
+    def _pop(self, trace_id: str) -> deque:
+        entry = self._traces.pop(trace_id, None)
+        if entry is None:
+            return deque()
+        self._buffered -= len(entry[0])
+        return entry[0]
+
+    def _buffer(self, trace_id: str, record: logging.LogRecord) -> None:
+        entry = self._traces.get(trace_id)
+        if entry is None:
+            entry = self._traces[trace_id] = [deque(maxlen=self.max_records_per_trace), record.created]
+        else:
+            self._traces.move_to_end(trace_id)
+            entry[1] = record.created
+        records = entry[0]
+        if len(records) == records.maxlen:
+            self._buffered -= 1
+        records.append(record)
+        self._buffered += 1
+        self._evict(record.created)
+
+    def _evict(self, now: float) -> None:
+        expired = now - self.ttl_seconds
+        while self._traces:
+            records, last_seen = next(iter(self._traces.values()))
+            if len(self._traces) <= self.max_traces and self._buffered <= self.max_total_records \
+                    and last_seen >= expired:
+                return
+            self._traces.popitem(last=False)
+            self._buffered -= len(records)
+
+
+def _syslog_severity(levelno: int) -> int:
+    if levelno >= logging.CRITICAL:
+        return 2
+    if levelno >= logging.ERROR:
+        return 3
+    if levelno >= logging.WARNING:
+        return 4
+    if levelno >= logging.INFO:
+        return 6
+    return 7
+
+
+class NetworkHandler(logging.Handler):
+    """
+    Sends the formatted records to a collector over ``protocol`` ('tcp', 'udp', 'unix' or 'unix_dgram'),
+    as newline delimited lines (``framing='ndjson'``) or as RFC 5424 syslog messages (``framing='syslog'``,
+    octet counted on stream sockets, one message per datagram otherwise).
+
+    The caller only formats the record and appends it to a backlog of at most ``backlog`` records,
+    the oldest records are dropped when the backlog is full.
+    Records larger than a datagram (``max_datagram`` or what the socket accepts) are dropped as well.
+    A sender thread writes the backlog in batches of up to ``batch_size`` bytes, at least every ``flush_interval_ms``,
+    and reconnects with an exponential backoff (up to ``max_backoff`` seconds) when the collector is not reachable.
+    """
+
+    def __init__(
+            self,
+            address,
+            protocol: str = PROTOCOL_TCP,
+            framing: str = FRAMING_NDJSON,
+            facility: int = logging.handlers.SysLogHandler.LOG_USER,
+            batch_size: int = 64 * 1024,
+            flush_interval_ms: int = 200,
+            backlog: int = 10000,
+            max_datagram: int = 8192,
+            timeout: float = 5.0,
+            max_backoff: float = 30.0,
+    ):
+        if protocol not in _PROTOCOLS:
+            raise ValueError(f'protocol must be one of {_PROTOCOLS}, got {protocol!r}')
+        if framing not in _FRAMINGS:
+            raise ValueError(f'framing must be one of {_FRAMINGS}, got {framing!r}')
+        super().__init__()
+        if isinstance(address, str) and protocol in (PROTOCOL_TCP, PROTOCOL_UDP):
+            host, _, port = address.rpartition(':')
+            address = (host, int(port))
+        self.address = tuple(address) if isinstance(address, (list, tuple)) else address
+        self.protocol = protocol
+        self.framing = framing
+        self.facility = facility
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval_ms / 1000
+        self.backlog = backlog
+        self.max_datagram = max_datagram
+        self.timeout = timeout
+        self.max_backoff = max_backoff
+        self.dropped = 0
+        self.sent = 0
+        self._stream = protocol in (PROTOCOL_TCP, PROTOCOL_UNIX)
+        self._hostname = socket.gethostname() or '-'
+        self._socket: socket.socket = None
+        self._pending: deque[bytes] = deque()
+        self._pending_bytes = 0
+        # a batch taken by the sender, flush waits for it as well
+        self._sending = 0
+        self._condition = threading.Condition(threading.Lock())
+        self._stopped = threading.Event()
+        self._start_sender()
+        if hasattr(os, 'register_at_fork'):
+            after_fork = weakref.WeakMethod(self._after_fork)
+            os.register_at_fork(after_in_child=lambda: (method := after_fork()) and method())
+
+    def _start_sender(self) -> None:
+        self._sender = threading.Thread(target=self._send_periodically, name='l4py-network-sender', daemon=True)
+        self._sender.start()
+
+    def _after_fork(self) -> None:
+        # the parent sends what it has queued, the child opens its own connection
+        self._condition = threading.Condition(threading.Lock())
+        self._pending.clear()
+        self._pending_bytes = self._sending = 0
+        if self._socket is not None:
+            self._socket.close()
+            self._socket = None
+        if not self._stopped.is_set():
+            self._start_sender()
+
+    def encode(self, record: logging.LogRecord) -> bytes:
+        message = self.format(record).encode('utf-8', 'replace')
+        if self.framing == FRAMING_NDJSON:
+            return message + b'\n'
+        header = '<%d>1 %s %s %s %d - - ' % (
+            self.facility * 8 + _syslog_severity(record.levelno),
+            datetime.fromtimestamp(record.created).astimezone().isoformat(timespec='milliseconds'),
+            self._hostname,
+            # APP-NAME is limited to 48 printable characters
+            (utils.get_app_name().replace(' ', '_') or '-')[:48],
+            record.process or 0,
+        )
+        message = header.encode('ascii', 'replace') + message
+        return b'%d %s' % (len(message), message) if self._stream else message
+
+    def emit(self, record: logging.LogRecord) -> None:
+        try:
+            data = self.encode(record)
+            with self._condition:
+                if len(self._pending) >= self.backlog:
+                    self._pending_bytes -= len(self._pending.popleft())
+                    self.dropped += 1
+                self._pending.append(data)
+                self._pending_bytes += len(data)
+                if self._pending_bytes >= self.batch_size:
+                    self._condition.notify_all()
+        except RecursionError:
+            raise
+        except Exception:
+            self.handleError(record)
+
+    def flush(self) -> None:
+        """
+        Waits up to ``timeout`` seconds until the backlog is sent.
+        """
+        deadline = time.monotonic() + self.timeout
+        with self._condition:
+            self._condition.notify_all()
+            while (self._pending or self._sending) and self._sender.is_alive():
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return
+                self._condition.wait(remaining)
+
+    def close(self) -> None:
+        if not self._stopped.is_set():
+            self.flush()
+            self._stopped.set()
+            with self._condition:
+                self._condition.notify_all()
+            self._sender.join(self.timeout)
+            if self._pending:
+                self.dropped += len(self._pending)
+            if self.dropped:
+                self._report_dropped()
+            if self._socket is not None:
+                self._socket.close()
+                self._socket = None
+        super().close()
+
+    def _report_dropped(self) -> None:
+        logging.lastResort.handle(logging.LogRecord(
+            'l4py', logging.WARNING, __file__, 0, '%d log records dropped by the network handler (%s %s)',
+            (self.dropped, self.protocol, self.address), None,
+        ))
+
+    def _connect(self) -> socket.socket:
+        if self.protocol == PROTOCOL_TCP:
+            sock = socket.create_connection(self.address, self.timeout)
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            return sock
+        if self.protocol == PROTOCOL_UDP:
+            family, kind, proto, _, address = socket.getaddrinfo(*self.address, type=socket.SOCK_DGRAM)[0]
+            sock = socket.socket(family, kind, proto)
+        else:
+            kind = socket.SOCK_STREAM if self.protocol == PROTOCOL_UNIX else socket.SOCK_DGRAM
+            sock = socket.socket(socket.AF_UNIX, kind)
+            address = self.address
+        try:
+            sock.settimeout(self.timeout)
+            sock.connect(address)
+        except OSError:
+            sock.close()
+            raise
+        return sock
+
+    def _take_batch(self) -> list[bytes]:
+        batch, size = [], 0
+        while self._pending and (not batch or size + len(self._pending[0]) <= self.batch_size):
+            data = self._pending.popleft()
+            batch.append(data)
+            size += len(data)
+        self._pending_bytes -= size
+        self._sending = len(batch)
+        return batch
+
+    def _send(self, batch: list[bytes]) -> None:
+        """
+        Sends and removes the records of ``batch``, the ones not sent yet are left in it when the connection fails.
+        """
+        if self._socket is None:
+            self._socket = self._connect()
+        if self._stream:
+            self._socket.sendall(b''.join(batch))
+            with self._condition:
+                self.sent += len(batch)
+            batch.clear()
+            return
+        i = sent = dropped = 0
+        # after an EMSGSIZE of packed lines, the rest of the batch is sent one record per datagram
+        packed = self.framing == FRAMING_NDJSON
+        try:
+            while i < len(batch):
+                # ndjson lines are packed into datagrams of up to max_datagram bytes, syslog messages are sent one by one
+                count, size = 1, len(batch[i])
+                if packed:
+                    while i + count < len(batch) and size + len(batch[i + count]) <= self.max_datagram:
+                        size += len(batch[i + count])
+                        count += 1
+                if size > self.max_datagram:
+                    # a single record, it would never fit
+                    dropped += 1
+                else:
+                    try:
+                        self._socket.send(b''.join(batch[i:i + count]))
+                        sent += count
+                    except OSError as error:
+                        if error.errno != errno.EMSGSIZE:
+                            raise
+                        if count > 1:
+                            packed = False
+                            continue
+                        dropped += 1
+                i += count
+        finally:
+            del batch[:i]
+            with self._condition:
+                self.sent += sent
+                self.dropped += dropped
+
+    def _send_periodically(self) -> None:
+        backoff = 0.0
+        while True:
+            with self._condition:
+                if not self._stopped.is_set() and self._pending_bytes < self.batch_size:
+                    self._condition.wait(self.flush_interval)
+                if not self._pending:
+                    self._condition.notify_all()
+                    if self._stopped.is_set():
+                        return
+                    continue
+                batch = self._take_batch()
+            try:
+                self._send(batch)
+            except OSError:
+                if self._socket is not None:
+                    self._socket.close()
+                    self._socket = None
+                with self._condition:
+                    # put the rest of the batch back in front of the newer records, the backlog limit still applies
+                    self._sending = 0
+                    self._pending.extendleft(reversed(batch))
+                    self._pending_bytes += sum(map(len, batch))
+                    while len(self._pending) > self.backlog:
+                        self._pending_bytes -= len(self._pending.popleft())
+                        self.dropped += 1
+                if self._stopped.is_set():
+                    return
+                backoff = min(self.max_backoff, backoff * 2 or 0.1)
+                self._stopped.wait(backoff)
+            else:
+                backoff = 0.0
+                with self._condition:
+                    self._sending = 0
+                    self._condition.notify_all()
@@ -0,0 +1,278 @@
+"""
+Sidecar indexes for JSON log files (the output of the JsonFormatter).
+
+A segment is split into blocks of about ``block_size`` bytes, the index keeps per block the byte range,
+the first / last timestamp and the levels, and maps every trace_id and logger name to its blocks.
+Queries only scan the matching blocks of the memory mapped segment.
+
+The indexes are stored in `<directory>/.l4py-index/<device>-<inode>.json`, so they stay valid when
+the segments are renamed by the rotation, and are extended when the file has grown since it was indexed.
+The indexes of files that no longer exist are removed by `prune_indexes`.
+"""
+import hashlib
+import json
+import logging
+import logging.handlers
+import mmap
+import os
+import queue
+import sys
+import threading
+from typing import Iterable, Iterator
+
+from l4py.handlers import BufferedRotatingFileHandler
+
+VERSION = 1
+INDEX_DIRECTORY = '.l4py-index'
+DEFAULT_BLOCK_SIZE = 64 * 1024
+
+_HEAD_SIZE = 256
+
+
+def index_file_name(file_name: str, stat: os.stat_result = None) -> str:
+    stat = stat if stat is not None else os.stat(file_name)
+    return os.path.join(os.path.dirname(os.path.abspath(file_name)), INDEX_DIRECTORY, f'{stat.st_dev}-{stat.st_ino}.json')
+
+
+def prune_indexes(directory: str) -> int:
+    """
+    Removes the indexes in ``directory`` whose file is gone, e.g. deleted by the rotation. Returns their number.
+    """
+    index_directory = os.path.join(directory, INDEX_DIRECTORY)
+    try:
+        index_names = os.listdir(index_directory)
+    except FileNotFoundError:
+        return 0
+    existing = set()
+    for entry in os.scandir(directory):
+        try:
+            stat = entry.stat(follow_symlinks=False)
+        except FileNotFoundError:
+            continue
+        existing.add(f'{stat.st_dev}-{stat.st_ino}')
+    removed = 0
+    for name in index_names:
+        if name.partition('.')[0] not in existing:
+            try:
+                os.remove(os.path.join(index_directory, name))
+                removed += 1
+            except FileNotFoundError:
+                pass
+    return removed
+
+
+def _head_digest(mm) -> str:
+    return hashlib.sha1(mm[:_HEAD_SIZE]).hexdigest()
+
+
+def _empty_index(head: str, block_size: int) -> dict:
+    return {'version': VERSION, 'head': head, 'block_size': block_size, 'size': 0,
+            'blocks': [], 'trace_ids': {}, 'loggers': {}}
+
+
+def load_index(file_name: str, stat: os.stat_result = None) -> dict or None:
+    try:
+        with open(index_file_name(file_name, stat)) as file:
+            index = json.load(file)
+    except (FileNotFoundError, ValueError):
+        return None
+    return index if index.get('version') == VERSION else None
+
+
+def _index_blocks(index: dict, mm, start: int, end: int) -> None:
+    block_size = index['block_size']
+    blocks, trace_ids, loggers = index['blocks'], index['trace_ids'], index['loggers']
+    position = start
+    while position < end:
+        block_end = mm.find(b'\n', min(position + block_size, end) - 1, end)
+        block_end = end if block_end < 0 else block_end + 1
+        block_id = len(blocks)
+        first, last, levels = None, None, set()
+        for line in mm[position:block_end].splitlines():
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue
+            if not isinstance(entry, dict):
+                continue
+            timestamp = entry.get('timestamp')
+            if timestamp is not None:
+                first = timestamp if first is None or timestamp < first else first
+                last = timestamp if last is None or timestamp > last else last
+            if level := entry.get('level'):
+                levels.add(level)
+            if (trace_id := entry.get('trace_id')) is not None:
+                block_ids = trace_ids.setdefault(str(trace_id), [])
+                if not block_ids or block_ids[-1] != block_id:
+                    block_ids.append(block_id)
+            if (logger := entry.get('logger_name')) is not None:
+                block_ids = loggers.setdefault(logger, [])
+                if not block_ids or block_ids[-1] != block_id:
+                    block_ids.append(block_id)
+        blocks.append([position, block_end, first, last, sorted(levels)])
+        position = block_end
+
+
+def build_index(file_name: str, block_size: int = DEFAULT_BLOCK_SIZE, file=None) -> dict:
+    """
+    Builds or extends the index of ``file_name``, only complete lines are indexed.
+    ``file`` is the segment opened in binary mode, e.g. before a later rollover renamed it again.
+    """
+    if file is None:
+        with open(file_name, 'rb') as file:
+            return build_index(file_name, block_size, file)
+
+    stat = os.fstat(file.fileno())
+    if stat.st_size == 0:
+        return _empty_index('', block_size)
+    with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        head = _head_digest(mm)
+        index = load_index(file_name, stat)
+        if index is None or index['head'] != head or index['size'] > stat.st_size:
+            index = _empty_index(head, block_size)
+        end = mm.rfind(b'\n', index['size']) + 1
+        if end <= index['size']:
+            return index
+        _index_blocks(index, mm, index['size'], end)
+        index['size'] = end
+
+    path = index_file_name(file_name, stat)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path + '.tmp', 'w') as index_file:
+        json.dump(index, index_file, separators=(',', ':'))
+    os.replace(path + '.tmp', path)
+    return index
+
+
+def _candidate_blocks(index: dict, trace_id=None, since=None, until=None, levels=None, logger=None) -> list[int]:
+    candidates = None
+    if trace_id is not None:
+        candidates = set(index['trace_ids'].get(str(trace_id), ()))
+    if logger is not None:
+        by_logger = set(index['loggers'].get(logger, ()))
+        candidates = by_logger if candidates is None else candidates & by_logger
+    blocks = index['blocks']
+    block_ids = range(len(blocks)) if candidates is None else sorted(candidates)
+    result = []
+    for block_id in block_ids:
+        _, _, first, last, block_levels = blocks[block_id]
+        if since is not None and last is not None and last < since:
+            continue
+        if until is not None and first is not None and first[:len(until)] > until:
+            continue
+        if levels and not levels.intersection(block_levels):
+            continue
+        result.append(block_id)
+    return result
+
+
+def query(
+        file_names: Iterable[str],
+        trace_id: str = None,
+        since: str = None,
+        until: str = None,
+        levels: Iterable[str] = None,
+        logger: str = None,
+        block_size: int = DEFAULT_BLOCK_SIZE,
+) -> Iterator[bytes]:
+    """
+    Yields the matching lines of the segments in the given order.
+    ``since`` / ``until`` are compared with the `timestamp` strings, prefixes like '2024-05-01T10' work as well.
+    """
+    levels = set(levels) if levels else None
+    needle = json.dumps(str(trace_id)).encode() if trace_id is not None else None
+    for file_name in file_names:
+        index = build_index(file_name, block_size)
+        block_ids = _candidate_blocks(index, trace_id, since, until, levels, logger)
+        if not block_ids:
+            continue
+        with open(file_name, 'rb') as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            for block_id in block_ids:
+                start, end = index['blocks'][block_id][:2]
+                for line in mm[start:end].splitlines():
+                    # cheap byte check before parsing the line
+                    if needle is not None and needle not in line:
+                        continue
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue
+                    if trace_id is not None and str(entry.get('trace_id')) != str(trace_id):
+                        continue
+                    if logger is not None and entry.get('logger_name') != logger:
+                        continue
+                    if levels and entry.get('level') not in levels:
+                        continue
+                    timestamp = entry.get('timestamp')
+                    if since is not None and timestamp is not None and timestamp < since:
+                        continue
+                    if until is not None and timestamp is not None and timestamp[:len(until)] > until:
+                        continue
+                    yield line
+
+
+class SegmentIndexer:
+    """
+    Indexes rotated segments on a background thread.
+    """
+
+    def __init__(self, block_size: int = DEFAULT_BLOCK_SIZE):
+        self.block_size = block_size
+        self._queue = queue.Queue()
+        self._thread = None
+
+    def submit(self, file_name: str, file=None) -> None:
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name='l4py-segment-indexer', daemon=True)
+            self._thread.start()
+        self._queue.put((file_name, file))
+
+    def close(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
+        self._thread = None
+
+    def _run(self) -> None:
+        while (item := self._queue.get()) is not None:
+            file_name, file = item
+            try:
+                build_index(file_name, self.block_size, file)
+                # the rollover that deleted the oldest segment left its index behind
+                prune_indexes(os.path.dirname(os.path.abspath(file_name)))
+            except Exception:
+                logging.lastResort.handle(logging.LogRecord(
+                    'l4py', logging.ERROR, __file__, 0, 'could not index %s', (file_name,), sys.exc_info(),
+                ))
+            finally:
+                if file is not None:
+                    file.close()
+
+
+class IndexingMixin:
+    """
+    Indexes the segment `<file>.1` in the background after every rollover.
+    """
+
+    def __init__(self, *args, index_block_size: int = DEFAULT_BLOCK_SIZE, **kwargs):
+        self.indexer = SegmentIndexer(index_block_size)
+        super().__init__(*args, **kwargs)
+
+    def doRollover(self) -> None:
+        super().doRollover()
+        segment = self.rotation_filename(f'{self.baseFilename}.1')
+        if self.backupCount > 0 and os.path.exists(segment):
+            # the next rollovers rename the segment, the indexer reads it through this descriptor
+            self.indexer.submit(segment, open(segment, 'rb'))
+
+    def close(self) -> None:
+        super().close()
+        self.indexer.close()
+
+
+class IndexedRotatingFileHandler(IndexingMixin, logging.handlers.RotatingFileHandler):
+    pass
+
+
+class IndexedBufferedRotatingFileHandler(IndexingMixin, BufferedRotatingFileHandler):
+    pass
@@ -0,0 +1,146 @@
+import logging
+import os
+import signal
+import sys
+import threading
+from typing import Mapping
+
+from l4py import utils
+
+
+def read_levels_file(file_name: str) -> dict[str, str]:
+    """
+    Reads `L4PY_LOG_LEVEL_{logger_name}=LEVEL` lines, the same format as the environment variables.
+    """
+    environ = {}
+    with open(file_name) as file:
+        for line in file:
+            line = line.strip()
+            if not line or line.startswith('#') or '=' not in line:
+                continue
+            key, _, value = line.partition('=')
+            environ[key.strip()] = value.strip().strip('\'"')
+    return environ
+
+
+class LevelReloader:
+    """
+    Applies the `L4PY_LOG_LEVEL_*` levels of ``file_name`` (or of the environment if no file is given)
+    to the loggers without touching the handlers.
+    Loggers that are no longer listed get the level back they had before the first reload.
+    """
+
+    def __init__(self, file_name: str = None):
+        self.file_name = file_name
+        self._original_levels: dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._watcher: threading.Thread = None
+        # (signum, previous handler, installed handler)
+        self._signal: tuple = None
+
+    def read_levels(self) -> dict[str, str or int]:
+        environ: Mapping[str, str] = os.environ if self.file_name is None else read_levels_file(self.file_name)
+        levels = {
+            logger_level['logger']: logger_level['level']
+            for logger_level in utils.get_log_levels_env(environ)
+        }
+        if f'{utils.LOG_LEVEL_PREFIX}ROOT' in environ:
+            levels[''] = utils.get_log_level_root_from_env(environ)
+        return levels
+
+    def reload(self) -> dict[str, str or int]:
+        levels = self.read_levels()
+        with self._lock:
+            for name, level in levels.items():
+                logger = logging.getLogger(name)
+                self._original_levels.setdefault(name, logger.level)
+                # setLevel also clears the cached isEnabledFor results of all loggers
+                logger.setLevel(level)
+            for name in [name for name in self._original_levels if name not in levels]:
+                logging.getLogger(name).setLevel(self._original_levels.pop(name))
+        return levels
+
+    def watch(self, interval: float = 1.0) -> None:
+        """
+        Reloads the levels in a background thread whenever the file changes.
+        """
+        if self.file_name is None:
+            raise ValueError('watching requires a file_name')
+        self._watcher = threading.Thread(
+            target=self._watch, args=(interval, self._file_state()), name='l4py-level-reloader', daemon=True
+        )
+        self._watcher.start()
+
+    def install_signal_handler(self, signum: int = getattr(signal, 'SIGHUP', None)) -> None:
+        """
+        Reloads the levels when the process receives ``signum`` (SIGHUP by default), must be called from the main thread.
+        The handler installed before is called after the reload, `stop` installs it again.
+        """
+        previous = signal.getsignal(signum)
+
+        def handler(signum, frame):
+            self._safe_reload()
+            # SIG_DFL / SIG_IGN are not callable, the default action of SIGHUP would terminate the process
+            if callable(previous):
+                previous(signum, frame)
+
+        signal.signal(signum, handler)
+        self._signal = (signum, previous, handler)
+
+    def stop(self) -> None:
+        self._stopped.set()
+        if self._signal is not None and threading.current_thread() is threading.main_thread():
+            signum, previous, handler = self._signal
+            self._signal = None
+            # unless the application replaced it in the meantime
+            if signal.getsignal(signum) is handler:
+                signal.signal(signum, signal.SIG_DFL if previous is None else previous)
+        if self._watcher is not None:
+            self._watcher.join()
+            self._watcher = None
+
+    def _file_state(self):
+        try:
+            stat = os.stat(self.file_name)
+            return stat.st_mtime_ns, stat.st_size
+        except FileNotFoundError:
+            return None
+
+    def _watch(self, interval: float, state) -> None:
+        while not self._stopped.wait(interval):
+            current = self._file_state()
+            if current != state:
+                state = current
+                self._safe_reload()
+
+    def _safe_reload(self) -> None:
+        try:
+            self.reload()
+        except Exception:
+            logging.lastResort.handle(logging.LogRecord(
+                'l4py', logging.ERROR, __file__, 0, 'could not reload the log levels from %s',
+                (self.file_name or 'the environment',), sys.exc_info(),
+            ))
+
+
+_reloader: LevelReloader = None
+
+
+def start_level_reload(file_name: str = None, interval: float = 1.0, sighup: bool = False) -> LevelReloader:
+    """
+    Replaces the running reloader, applies the levels once and starts watching ``file_name``
+    and, with ``sighup``, SIGHUP. Without a ``file_name`` there is nothing a signal could reload.
+    """
+    global _reloader
+    if _reloader is not None:
+        _reloader.stop()
+    _reloader = LevelReloader(file_name)
+    if file_name is not None and os.path.exists(file_name):
+        _reloader.reload()
+    if file_name is not None:
+        _reloader.watch(interval)
+    if sighup and file_name is not None and hasattr(signal, 'SIGHUP') \
+            and threading.current_thread() is threading.main_thread():
+        _reloader.install_signal_handler(signal.SIGHUP)
+    return _reloader
@@ -0,0 +1,78 @@
+import logging
+
+# set by logging.LoggerAdapter.__init__, everything else is set on the wrapped logger
+_ADAPTER_ATTRIBUTES = frozenset(('logger', 'extra', 'merge_extra'))
+
+
+class StructuredLogger(logging.LoggerAdapter):
+    """
+    Logger returned by `l4py.get_logger`, keyword arguments are attached to the record as `fields`:
+
+        logger.info('order placed', order_id=order.id, amount=order.amount)
+
+    The level is checked before any work is done and the fields are only rendered by the formatters.
+    """
+
+    def __init__(self, logger: logging.Logger):
+        super().__init__(logger, None)
+
+    def __getattr__(self, name):
+        # everything else (handlers, addHandler, filters, ...) is served by the wrapped logger
+        if name == 'logger':
+            raise AttributeError(name)
+        return getattr(self.logger, name)
+
+    def __setattr__(self, name, value):
+        # logger.propagate = False, logger.disabled = True, ... configure the wrapped logger
+        if name in _ADAPTER_ATTRIBUTES or hasattr(type(self), name):
+            super().__setattr__(name, value)
+        else:
+            setattr(self.logger, name, value)
+
+    def __repr__(self):
+        return f'<{self.__class__.__name__} {self.logger.name} ({logging.getLevelName(self.getEffectiveLevel())})>'
+
+    def _log_fields(self, level: int, msg, args, kwargs: dict) -> None:
+        # two frames (this method and the level method) have to be skipped to find the caller
+        stacklevel = kwargs.pop('stacklevel', 1) + 2
+        exc_info = kwargs.pop('exc_info', None)
+        extra = kwargs.pop('extra', None)
+        stack_info = kwargs.pop('stack_info', False)
+        if kwargs:
+            extra = {**extra, 'fields': kwargs} if extra else {'fields': kwargs}
+        self.logger._log(
+            level, msg, args, exc_info=exc_info, extra=extra, stack_info=stack_info, stacklevel=stacklevel
+        )
+
+    def debug(self, msg, *args, **kwargs) -> None:
+        if self.logger.isEnabledFor(logging.DEBUG):
+            self._log_fields(logging.DEBUG, msg, args, kwargs)
+
+    def info(self, msg, *args, **kwargs) -> None:
+        if self.logger.isEnabledFor(logging.INFO):
+            self._log_fields(logging.INFO, msg, args, kwargs)
+
+    def warning(self, msg, *args, **kwargs) -> None:
+        if self.logger.isEnabledFor(logging.WARNING):
+            self._log_fields(logging.WARNING, msg, args, kwargs)
+
+    warn = warning
+
+    def error(self, msg, *args, **kwargs) -> None:
+        if self.logger.isEnabledFor(logging.ERROR):
+            self._log_fields(logging.ERROR, msg, args, kwargs)
+
+    def exception(self, msg, *args, exc_info=True, **kwargs) -> None:
+        if self.logger.isEnabledFor(logging.ERROR):
+            kwargs['exc_info'] = exc_info
+            self._log_fields(logging.ERROR, msg, args, kwargs)
+
+    def critical(self, msg, *args, **kwargs) -> None:
+        if self.logger.isEnabledFor(logging.CRITICAL):
+            self._log_fields(logging.CRITICAL, msg, args, kwargs)
+
+    fatal = critical
+
+    def log(self, level: int, msg, *args, **kwargs) -> None:
+        if self.logger.isEnabledFor(level):
+            self._log_fields(level, msg, args, kwargs)
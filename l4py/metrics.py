@@ -0,0 +1,247 @@
+"""
+Counters and latency histograms of the logging pipeline itself.
+
+Nothing is measured until `instrument` is called (e.g. by `LogConfigBuilder().metrics(True).init()`):
+it wraps the methods of the configured handler and formatter instances, the classes are left alone,
+so the logging calls of an uninstrumented configuration do not pay anything.
+
+Records below the level of their logger are never created and are not counted.
+"""
+import bisect
+import json
+import logging
+import threading
+import time
+import weakref
+
+# seconds
+DEFAULT_BUCKETS = (0.00001, 0.00005, 0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0)
+
+_DESCRIPTIONS = {
+    'l4py_records_total': ('counter', 'Records handled, per logger and level.'),
+    'l4py_records_filtered_total': ('counter', 'Records rejected by the filters, per logger and level.'),
+    'l4py_records_dropped_total': ('counter', 'Records dropped by a full queue or backlog, per handler.'),
+    'l4py_handler_bytes_total': ('counter', 'Bytes of the rendered records, per handler.'),
+    'l4py_rotations_total': ('counter', 'File rotations, per handler.'),
+    'l4py_format_seconds': ('histogram', 'Time spent formatting a record, per formatter.'),
+    'l4py_emit_seconds': ('histogram', 'Time spent writing / enqueueing a record, per handler.'),
+    'l4py_flush_seconds': ('histogram', 'Time spent flushing, per handler.'),
+}
+
+
+class Histogram:
+
+    def __init__(self, buckets: tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def to_dict(self) -> dict:
+        return {
+            'buckets': dict(zip([*map(str, self.buckets), '+Inf'], self.counts)),
+            'sum': self.sum,
+            'count': self.count,
+        }
+
+
+class Metrics:
+    """
+    Counters and histograms keyed by name and labels, e.g. `('l4py_records_total', (('logger', 'app'), ('level', 'INFO')))`.
+    """
+
+    def __init__(self, buckets: tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counters: dict[tuple, int] = {}
+        self.histograms: dict[tuple, Histogram] = {}
+        self._handlers = weakref.WeakSet()
+        self._lock = threading.Lock()
+        self._record_key = f'_l4py_metrics_{id(self)}'
+
+    def inc(self, name: str, labels: tuple, value: int = 1) -> None:
+        key = (name, labels)
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name: str, labels: tuple, seconds: float) -> None:
+        key = (name, labels)
+        with self._lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram(self.buckets)
+            histogram.observe(seconds)
+
+    def reset(self) -> None:
+        with self._lock:
+            self.counters.clear()
+            self.histograms.clear()
+
+    def _collect_dropped(self) -> dict[tuple, int]:
+        # the queue and network handlers count their drops themselves
+        return {
+            ('l4py_records_dropped_total', (('handler', _handler_name(handler)),)): handler.dropped
+            for handler in list(self._handlers) if getattr(handler, 'dropped', 0)
+        }
+
+    def snapshot(self) -> dict:
+        """
+        `{'counters': [{'name', 'labels', 'value'}], 'histograms': [{'name', 'labels', 'buckets', 'sum', 'count'}]}`
+        """
+        with self._lock:
+            counters = {**self.counters, **self._collect_dropped()}
+            histograms = {key: histogram.to_dict() for key, histogram in self.histograms.items()}
+        return {
+            'counters': [
+                {'name': name, 'labels': dict(labels), 'value': value}
+                for (name, labels), value in sorted(counters.items())
+            ],
+            'histograms': [
+                {'name': name, 'labels': dict(labels), **histogram}
+                for (name, labels), histogram in sorted(histograms.items())
+            ],
+        }
+
+    def to_json(self) -> str:
+        return json.dumps(self.snapshot())
+
+    def to_prometheus(self) -> str:
+        """
+        The Prometheus text exposition format.
+        """
+        snapshot = self.snapshot()
+        lines = []
+        described = set()
+
+        def describe(name):
+            if name not in described:
+                described.add(name)
+                metric_type, description = _DESCRIPTIONS.get(name, ('untyped', name))
+                lines.append(f'# HELP {name} {description}')
+                lines.append(f'# TYPE {name} {metric_type}')
+
+        for counter in snapshot['counters']:
+            describe(counter['name'])
+            lines.append(f"{counter['name']}{_labels(counter['labels'])} {counter['value']}")
+        for histogram in snapshot['histograms']:
+            name, labels = histogram['name'], histogram['labels']
+            describe(name)
+            cumulative = 0
+            for bound, count in histogram['buckets'].items():
+                cumulative += count
+                lines.append(f"{name}_bucket{_labels({**labels, 'le': bound})} {cumulative}")
+            lines.append(f"{name}_sum{_labels(labels)} {histogram['sum']}")
+            lines.append(f"{name}_count{_labels(labels)} {histogram['count']}")
+        return '\n'.join(lines) + '\n'
+
+
+def _labels(labels: dict) -> str:
+    if not labels:
+        return ''
+    escaped = (
+        f'{key}="' + str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') + '"'
+        for key, value in labels.items()
+    )
+    return '{' + ','.join(escaped) + '}'
+
+
+def _handler_name(handler: logging.Handler) -> str:
+    return handler.name or type(handler).__name__
+
+
+# the default registry, filled by `instrument`
+registry = Metrics()
+
+
+def _timed(metrics: Metrics, name: str, labels: tuple, method):
+    perf_counter = time.perf_counter
+
+    def timed(*args):
+        start = perf_counter()
+        try:
+            return method(*args)
+        finally:
+            metrics.observe(name, labels, perf_counter() - start)
+
+    return timed
+
+
+def _instrument_formatter(metrics: Metrics, formatter: logging.Formatter) -> None:
+    if formatter is None or '_l4py_metrics' in formatter.__dict__:
+        return
+    formatter._l4py_metrics = metrics
+    formatter.format = _timed(metrics, 'l4py_format_seconds', (('formatter', type(formatter).__name__),), formatter.format)
+
+
+def _instrument_handler(metrics: Metrics, handler: logging.Handler) -> None:
+    if '_l4py_metrics' in handler.__dict__:
+        return
+    handler._l4py_metrics = metrics
+    metrics._handlers.add(handler)
+    labels = (('handler', _handler_name(handler)),)
+    record_key = metrics._record_key
+
+    handle = handler.handle
+
+    def counting_handle(record: logging.LogRecord):
+        result = handle(record)
+        # counted once per record, not once per handler
+        if record_key not in record.__dict__:
+            record.__dict__[record_key] = True
+            record_labels = (('logger', record.name), ('level', record.levelname))
+            metrics.inc('l4py_records_total', record_labels)
+            if not result:
+                metrics.inc('l4py_records_filtered_total', record_labels)
+        return result
+
+    handler.handle = counting_handle
+    handler.emit = _timed(metrics, 'l4py_emit_seconds', labels, handler.emit)
+    handler.flush = _timed(metrics, 'l4py_flush_seconds', labels, handler.flush)
+
+    if hasattr(handler, 'doRollover'):
+        do_rollover = handler.doRollover
+
+        def counting_rollover():
+            do_rollover()
+            metrics.inc('l4py_rotations_total', labels)
+
+        handler.doRollover = counting_rollover
+
+    wrapped_handlers = getattr(handler, 'handlers', None)
+    if wrapped_handlers is not None:
+        # queue / tail sampling handlers pass the records on, the wrapped handlers format and write them
+        for wrapped in wrapped_handlers:
+            _instrument_handler(metrics, wrapped)
+        return
+
+    format_record = handler.format
+    terminator_size = len(getattr(handler, 'terminator', ''))
+    bytes_key = f'{record_key}_{id(handler)}'
+
+    def counting_format(record: logging.LogRecord) -> str:
+        message = format_record(record)
+        # RotatingFileHandler formats the record a second time to check the rollover
+        if bytes_key not in record.__dict__:
+            record.__dict__[bytes_key] = True
+            size = len(message) if message.isascii() else len(message.encode('utf-8', 'replace'))
+            metrics.inc('l4py_handler_bytes_total', labels, size + terminator_size)
+        return message
+
+    handler.format = counting_format
+    _instrument_formatter(metrics, handler.formatter)
+
+
+def instrument(metrics: Metrics = None) -> Metrics:
+    """
+    Instruments the handlers of the root logger and of all configured loggers, call it after the configuration.
+    """
+    metrics = registry if metrics is None else metrics
+    loggers = [logging.getLogger(), *logging.root.manager.loggerDict.values()]
+    for logger in loggers:
+        for handler in getattr(logger, 'handlers', ()):
+            _instrument_handler(metrics, handler)
+    return metrics
@@ -0,0 +1,353 @@
+"""
+Formatting and writing on a worker process.
+
+The caller only copies the record into a picklable snapshot (the interpolated message, the context fields
+and the unrendered traceback), a sender thread pickles the snapshots in batches and writes them to a pipe.
+The worker process rebuilds the records and passes them to handlers it constructs itself from their config,
+so the formatting, the traceback rendering and the file writes run on another core.
+"""
+import atexit
+import logging
+import multiprocessing
+import os
+import pickle
+import signal
+import sys
+import threading
+import time
+import traceback
+import weakref
+from collections import deque
+
+from l4py import utils
+from l4py.handlers import OVERFLOW_BLOCK, OVERFLOW_DROP_NEW, _OVERFLOW_POLICIES
+
+_RECORDS = 'records'
+_FLUSH = 'flush'
+_CLOSE = 'close'
+
+# only the other attributes can be per-record caches
+_RECORD_ATTRIBUTES = frozenset(logging.makeLogRecord({}).__dict__)
+
+
+def snapshot_record(record: logging.LogRecord) -> dict:
+    """
+    The attributes of ``record`` without the per-record caches, the message is interpolated
+    and the traceback is kept as a `traceback.TracebackException` whose source lines are read by the worker.
+    """
+    snapshot = record.__dict__.copy()
+    for key in snapshot.keys() - _RECORD_ATTRIBUTES:
+        if key.startswith('_l4py_'):
+            del snapshot[key]
+    snapshot['msg'] = record.getMessage()
+    snapshot['args'] = None
+    if 'context' in snapshot:
+        # an immutable mapping proxy, it can not be pickled
+        snapshot['context'] = dict(snapshot['context'])
+    if record.exc_info:
+        if not record.exc_text:
+            snapshot['exc_traceback'] = traceback.TracebackException(*record.exc_info, lookup_lines=False)
+        snapshot['exc_info'] = None
+    return snapshot
+
+
+def restore_record(snapshot: dict) -> logging.LogRecord:
+    exc_traceback = snapshot.pop('exc_traceback', None)
+    record = logging.makeLogRecord(snapshot)
+    if isinstance(exc_traceback, str):
+        record.exc_text = exc_traceback
+    elif exc_traceback is not None:
+        # like logging.Formatter.formatException
+        record.exc_text = ''.join(exc_traceback.format()).removesuffix('\n')
+    return record
+
+
+def _picklable(value):
+    # the slow path for batches with values that can not be pickled, they are replaced by their str()
+    try:
+        pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        return value
+    except Exception:
+        pass
+    if isinstance(value, traceback.TracebackException):
+        # e.g. local exception classes, the traceback is rendered on the sender thread instead
+        return ''.join(value.format()).removesuffix('\n')
+    if isinstance(value, dict):
+        return {key: _picklable(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_picklable(item) for item in value]
+    return str(value)
+
+
+def _serve(connection, config: dict, handler_names: list[str], app_name: str) -> None:
+    # Ctrl+C reaches the whole process group, the worker stops when the handler closes the pipe
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    from l4py import config as l4py_config
+    utils.set_app_name(app_name)
+    try:
+        handlers = l4py_config.build_handlers(config, handler_names)
+    except Exception:
+        # raised by the handler in the parent
+        connection.send_bytes(pickle.dumps(traceback.format_exc()))
+        connection.close()
+        return
+    connection.send_bytes(pickle.dumps(None))
+    try:
+        while True:
+            try:
+                command, records = pickle.loads(connection.recv_bytes())
+            except EOFError:
+                return
+            except Exception:
+                logging.lastResort.handle(logging.LogRecord(
+                    'l4py', logging.ERROR, __file__, 0, 'could not read a batch of log records', None, sys.exc_info(),
+                ))
+                continue
+            if command == _RECORDS:
+                for snapshot in records:
+                    record = restore_record(snapshot)
+                    for handler in handlers:
+                        if record.levelno >= handler.level:
+                            handler.handle(record)
+            elif command == _FLUSH:
+                for handler in handlers:
+                    handler.flush()
+                connection.send_bytes(b'')
+            elif command == _CLOSE:
+                return
+    finally:
+        for handler in handlers:
+            handler.close()
+        connection.close()
+
+
+class ProcessHandler(logging.Handler):
+    """
+    Passes the records to ``handlers`` running on a worker process.
+    ``handlers`` and ``formatters`` are config sections like the ones of `logging.config.dictConfig`,
+    the worker builds all ``handlers`` from them.
+
+    The caller appends a snapshot of the record to a backlog of at most ``backlog`` records,
+    ``overflow`` decides what happens when it is full: 'block' (default), 'drop_oldest' or 'drop_new'.
+    A sender thread writes the backlog to the worker in batches of up to ``batch_size`` records,
+    at least every ``flush_interval_ms``.
+
+    The constructor waits up to ``start_timeout`` seconds for the worker to build its handlers
+    and raises a RuntimeError if it could not. A forked child starts its own worker with its first record,
+    if it can not start the record is passed to `handleError` and the following ones are dropped.
+    """
+
+    def __init__(
+            self,
+            handlers: dict,
+            formatters: dict = None,
+            batch_size: int = 256,
+            flush_interval_ms: int = 100,
+            backlog: int = 10000,
+            overflow: str = OVERFLOW_BLOCK,
+            timeout: float = 5.0,
+            start_method: str = 'spawn',
+            start_timeout: float = 30.0,
+    ):
+        if overflow not in _OVERFLOW_POLICIES:
+            raise ValueError(f'overflow must be one of {_OVERFLOW_POLICIES}, got {overflow!r}')
+        super().__init__()
+        # plain dicts, the sections may be dictConfig's converting dicts which can not be pickled
+        self.config = {
+            'formatters': _plain(formatters or {}),
+            'handlers': _plain(handlers),
+        }
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval_ms / 1000
+        self.backlog = backlog
+        self.overflow = overflow
+        self.timeout = timeout
+        self.start_method = start_method
+        self.start_timeout = start_timeout
+        self.dropped = 0
+        self._pending: deque[dict] = deque()
+        # flushes requested / completed by the sender thread
+        self._flush_requests = 0
+        self._flushed = 0
+        self._condition = threading.Condition(threading.Lock())
+        self._stopped = threading.Event()
+        # the handler is registered for logging.shutdown already, close has to work if the worker did not start
+        self._connection = self._process = self._sender = None
+        # set in a forked child until its first record starts the worker
+        self._start_pending = False
+        self._start()
+        # runs before multiprocessing terminates its daemon processes at exit
+        close = weakref.WeakMethod(self.close)
+        atexit.register(lambda: (method := close()) and method())
+        if hasattr(os, 'register_at_fork'):
+            after_fork = weakref.WeakMethod(self._after_fork)
+            os.register_at_fork(after_in_child=lambda: (method := after_fork()) and method())
+
+    def _start(self) -> None:
+        context = multiprocessing.get_context(self.start_method)
+        self._connection, worker_connection = context.Pipe()
+        try:
+            self._process = context.Process(
+                target=_serve,
+                args=(worker_connection, self.config, list(self.config['handlers']), utils.get_app_name()),
+                name='l4py-formatter',
+                daemon=True,
+            )
+            self._process.start()
+        finally:
+            worker_connection.close()
+        self._wait_until_ready()
+        self._sender = threading.Thread(target=self._send_periodically, name='l4py-process-sender', daemon=True)
+        self._sender.start()
+
+    def _wait_until_ready(self) -> None:
+        try:
+            if self._connection.poll(self.start_timeout):
+                error = pickle.loads(self._connection.recv_bytes())
+            else:
+                error = f'did not start within {self.start_timeout} seconds'
+        except (EOFError, OSError):
+            self._process.join(self.timeout)
+            error = (
+                f'exited with code {self._process.exitcode} while starting, '
+                "the main module has to be importable without side effects (`if __name__ == '__main__':` guard)"
+            )
+        if error is not None:
+            if self._process.is_alive():
+                self._process.terminate()
+            self._connection.close()
+            raise RuntimeError(f'the l4py worker process {error}')
+
+    def _after_fork(self) -> None:
+        # the worker belongs to the parent, a child which logs starts its own in emit,
+        # most forked children (e.g. multiprocessing pool workers) never log and leave with os._exit
+        self._condition = threading.Condition(threading.Lock())
+        self._pending.clear()
+        self._flush_requests = self._flushed = 0
+        self._connection = self._process = self._sender = None
+        self._start_pending = not self._stopped.is_set()
+
+    def emit(self, record: logging.LogRecord) -> None:
+        try:
+            if self._sender is None:
+                if not self._start_pending:
+                    # closed, or the worker of the forked child could not start
+                    self.dropped += 1
+                    return
+                self._start_pending = False
+                self._start()
+            snapshot = snapshot_record(record)
+            with self._condition:
+                while len(self._pending) >= self.backlog:
+                    if self.overflow == OVERFLOW_DROP_NEW:
+                        self.dropped += 1
+                        return
+                    if self.overflow == OVERFLOW_BLOCK and self._sender.is_alive():
+                        self._condition.wait()
+                    else:
+                        self._pending.popleft()
+                        self.dropped += 1
+                self._pending.append(snapshot)
+                if len(self._pending) >= self.batch_size:
+                    self._condition.notify_all()
+        except RecursionError:
+            raise
+        except Exception:
+            self.handleError(record)
+
+    def flush(self) -> None:
+        """
+        Waits up to ``timeout`` seconds until the worker has handled and flushed the backlog.
+        """
+        if self._sender is None:
+            return
+        deadline = time.monotonic() + self.timeout
+        with self._condition:
+            self._flush_requests += 1
+            request = self._flush_requests
+            self._condition.notify_all()
+            while self._flushed < request and self._sender.is_alive():
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return
+                self._condition.wait(remaining)
+
+    def close(self) -> None:
+        if self._sender is None:
+            # the worker did not start
+            if not self._stopped.is_set():
+                self._stopped.set()
+                self._start_pending = False
+                if self._connection is not None:
+                    self._connection.close()
+                if self.dropped:
+                    self._report_dropped()
+        elif not self._stopped.is_set():
+            self.flush()
+            self._stopped.set()
+            with self._condition:
+                self._condition.notify_all()
+            self._sender.join(self.timeout)
+            if self._pending:
+                self.dropped += len(self._pending)
+            try:
+                self._connection.send_bytes(pickle.dumps((_CLOSE, None)))
+            except OSError:
+                pass
+            self._process.join(self.timeout)
+            if self._process.is_alive():
+                self._process.terminate()
+            self._connection.close()
+            if self.dropped:
+                self._report_dropped()
+        super().close()
+
+    def _report_dropped(self) -> None:
+        logging.lastResort.handle(logging.LogRecord(
+            'l4py', logging.WARNING, __file__, 0, '%d log records dropped by the process handler (overflow=%s)',
+            (self.dropped, self.overflow), None,
+        ))
+
+    def _dumps(self, batch: list[dict]) -> bytes:
+        try:
+            return pickle.dumps((_RECORDS, batch), pickle.HIGHEST_PROTOCOL)
+        except Exception:
+            return pickle.dumps((_RECORDS, [_picklable(snapshot) for snapshot in batch]), pickle.HIGHEST_PROTOCOL)
+
+    def _send_periodically(self) -> None:
+        while True:
+            with self._condition:
+                if not self._stopped.is_set() and len(self._pending) < self.batch_size \
+                        and self._flush_requests == self._flushed:
+                    self._condition.wait(self.flush_interval)
+                batch = [self._pending.popleft() for _ in range(min(self.batch_size, len(self._pending)))]
+                flush_request = self._flush_requests if not self._pending else self._flushed
+                # room for the blocked callers
+                self._condition.notify_all()
+            try:
+                if batch:
+                    self._connection.send_bytes(self._dumps(batch))
+                if flush_request != self._flushed:
+                    self._connection.send_bytes(pickle.dumps((_FLUSH, None)))
+                    self._connection.recv_bytes()
+            except (OSError, EOFError):
+                # the worker is gone, the records can not be written anymore
+                with self._condition:
+                    self.dropped += len(batch) + len(self._pending)
+                    self._pending.clear()
+                    self._flushed = self._flush_requests
+                    self._condition.notify_all()
+                return
+            with self._condition:
+                self._flushed = flush_request
+                self._condition.notify_all()
+                if self._stopped.is_set() and not self._pending:
+                    return
+
+
+def _plain(value):
+    if isinstance(value, dict):
+        return {key: _plain(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_plain(item) for item in value]
+    return value
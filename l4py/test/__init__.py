@@ -1 +1,2 @@
-from . test_util import l4py_test, l4py_entries_from_stream
\ No newline at end of file
+from . test_util import l4py_test, l4py_entries_from_stream
+from . capture import CaptureHandler
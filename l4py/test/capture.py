@@ -0,0 +1,118 @@
+import heapq
+import logging
+from collections import deque
+
+
+class CaptureHandler(logging.Handler):
+    """
+    Keeps the last ``capacity`` records in memory, indexed by level, logger name and trace_id.
+    The records are stored as they are and only rendered (with the formatter of the handler) when asked for.
+
+    ``logger`` matches the records of the logger and of its children.
+    """
+
+    def __init__(self, capacity: int = 100000, level: int = logging.NOTSET):
+        super().__init__(level)
+        self.capacity = capacity
+        self._records: list[logging.LogRecord] = []
+        # sequence numbers of the records in the ring, oldest first
+        self._by_level: dict[int, deque[int]] = {}
+        self._by_logger: dict[str, deque[int]] = {}
+        self._by_trace_id: dict[str, deque[int]] = {}
+        self._count = 0
+
+    @property
+    def evicted(self) -> int:
+        """
+        The number of records pushed out of the ring by newer ones.
+        """
+        return max(0, self._count - self.capacity)
+
+    def __len__(self) -> int:
+        return min(self._count, self.capacity)
+
+    def emit(self, record: logging.LogRecord) -> None:
+        # called by handle() with the handler lock held
+        sequence = self._count
+        if sequence < self.capacity:
+            self._records.append(record)
+        else:
+            slot = sequence % self.capacity
+            self._unindex(sequence - self.capacity, self._records[slot])
+            self._records[slot] = record
+        self._index(self._by_level, record.levelno, sequence)
+        self._index(self._by_logger, record.name, sequence)
+        trace_id = getattr(record, 'trace_id', None)
+        if trace_id is not None:
+            self._index(self._by_trace_id, str(trace_id), sequence)
+        self._count += 1
+
+    @staticmethod
+    def _index(index: dict, key, sequence: int) -> None:
+        sequences = index.get(key)
+        if sequences is None:
+            sequences = index[key] = deque()
+        sequences.append(sequence)
+
+    def _unindex(self, sequence: int, record: logging.LogRecord) -> None:
+        # the evicted record is the oldest one, its sequence number is first in all of its indexes
+        trace_id = getattr(record, 'trace_id', None)
+        keys = [(self._by_level, record.levelno), (self._by_logger, record.name)]
+        if trace_id is not None:
+            keys.append((self._by_trace_id, str(trace_id)))
+        for index, key in keys:
+            sequences = index[key]
+            if sequences and sequences[0] == sequence:
+                sequences.popleft()
+            if not sequences:
+                del index[key]
+
+    def clear(self) -> None:
+        with self.lock:
+            self._records.clear()
+            self._by_level.clear()
+            self._by_logger.clear()
+            self._by_trace_id.clear()
+            self._count = 0
+
+    def _sequences(self, level=None, logger: str = None, trace_id=None) -> list[int]:
+        candidates = []
+        if level is not None:
+            level = logging._checkLevel(level)
+            candidates.append(list(self._by_level.get(level, ())))
+        if logger is not None:
+            prefix = f'{logger}.'
+            candidates.append(list(heapq.merge(*(
+                sequences for name, sequences in self._by_logger.items()
+                if name == logger or name.startswith(prefix)
+            ))))
+        if trace_id is not None:
+            candidates.append(list(self._by_trace_id.get(str(trace_id), ())))
+        if not candidates:
+            return list(range(self._count - len(self), self._count))
+        if len(candidates) == 1:
+            return candidates[0]
+        candidates.sort(key=len)
+        others = [set(sequences) for sequences in candidates[1:]]
+        return [sequence for sequence in candidates[0] if all(sequence in other for other in others)]
+
+    def records(self, level=None, logger: str = None, trace_id=None) -> list[logging.LogRecord]:
+        """
+        The matching records, oldest first.
+        """
+        with self.lock:
+            records, capacity = self._records, self.capacity
+            return [records[sequence % capacity] for sequence in self._sequences(level, logger, trace_id)]
+
+    def count(self, level=None, logger: str = None, trace_id=None) -> int:
+        with self.lock:
+            return len(self._sequences(level, logger, trace_id))
+
+    def messages(self, level=None, logger: str = None, trace_id=None) -> list[str]:
+        return [record.getMessage() for record in self.records(level, logger, trace_id)]
+
+    def rendered(self, level=None, logger: str = None, trace_id=None) -> list[str]:
+        """
+        The matching records formatted by the formatter of the handler.
+        """
+        return [self.format(record) for record in self.records(level, logger, trace_id)]
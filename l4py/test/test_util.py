@@ -7,6 +7,10 @@ from typing import Optional
 
 from l4py import LogConfigBuilder, get_logger, utils
 from l4py.builder import AbstractLoggingBuilder
+from l4py.config import apply_config
+from l4py.formatters import TextFormatter
+from l4py.logger import StructuredLogger
+from l4py.test.capture import CaptureHandler
 
 
 def get_formatter_instance(logging_dict_config: dict, formatter_name: str) -> Optional[logging.Formatter]:
@@ -26,7 +30,7 @@ def init_test_logger(
         builder: AbstractLoggingBuilder,
         logger_name: str = 'l4py.test.logger',
         handler_names: list[str] = None,
-) -> tuple[logging.Logger, dict[str, StringIO]]:
+) -> tuple[StructuredLogger, dict[str, StringIO]]:
     if handler_names is None:
         handler_names = ['console', 'file']
 
@@ -36,21 +40,45 @@ def init_test_logger(
 
     streams: dict[str: StringIO] = {}
     for handler in logging.getLogger().handlers:
-        print(handler.name, handler_names)
         if handler.name in handler_names:
             stream = StringIO()
             streams[handler.name] = stream
             new_handler = logging.StreamHandler(stream)
             new_handler.setLevel(handler.level)
-            new_handler.setFormatter(handler.formatter)
+            # the captured output does not depend on whether the console is a terminal
+            formatter = handler.formatter
+            if isinstance(formatter, TextFormatter):
+                formatter = formatter.with_color(False)
+            new_handler.setFormatter(formatter)
             new_handler.filters = handler.filters
             logger.addHandler(new_handler)
 
     return logger, streams
 
 
+def init_capture_logger(
+        builder: AbstractLoggingBuilder,
+        logger_name: str = 'l4py.test.logger',
+        capacity: int = 100000,
+) -> tuple[StructuredLogger, CaptureHandler]:
+    """
+    Applies the levels and filters of ``builder`` with a single CaptureHandler instead of its handlers,
+    no console output and no files.
+    """
+    config = builder.build_config()
+    handlers = config['handlers']
+    # the filters of the outermost handler, it runs the filter chain for the wrapped handlers
+    filter_names = next((handler['filters'] for handler in handlers.values() if handler.get('filters')), [])
+    config['handlers'] = {'capture': {'()': CaptureHandler, 'capacity': capacity, 'filters': list(filter_names)}}
+    config['root']['handlers'] = ['capture']
+    for logger_config in config['loggers'].values():
+        if logger_config.get('handlers'):
+            logger_config['handlers'] = ['capture']
+    apply_config(config)
+    return get_logger(logger_name), logging.getLogger().handlers[0]
+
+
 def l4py_entries_from_stream(stream: StringIO) -> list[str]:
-    stream.seek(0)
     return stream.getvalue().split('\n')[:-1]
 
 
@@ -58,8 +86,13 @@ def l4py_test(
         *,
         builder: AbstractLoggingBuilder = LogConfigBuilder(),
         logger_name: str = 'l4py.test.logger',
-        env_vars: dict[str, int] = None
+        env_vars: dict[str, int] = None,
+        capture: int = 0,
 ):
+    """
+    Passes the logger and the output streams of the 'console' and 'file' handlers to the test,
+    or the logger and a CaptureHandler keeping the last ``capture`` records if ``capture`` is set.
+    """
 
     def decorator(function: callable):
         def wrapper(self):
@@ -74,24 +107,22 @@ def l4py_test(
                 for key, value in env_vars.items():
                     os.environ.setdefault(key, str(value))
 
-            handlers = []
-            if builder.build_config()['handlers'].get('console'):
-                handlers.append('console')
-            if builder.build_config()['handlers'].get('file'):
-                handlers.append('file')
-
-            logger, streams = init_test_logger(
-                builder=builder,
-                logger_name=logger_name,
-                handler_names=handlers,
-            )
             try:
-                function(self, logger, streams)
-            except Exception as e:
-                raise e
+                if capture:
+                    logger, output = init_capture_logger(builder, logger_name, capture)
+                else:
+                    configured_handlers = builder.build_config()['handlers']
+                    logger, output = init_test_logger(
+                        builder=builder,
+                        logger_name=logger_name,
+                        handler_names=[name for name in ('console', 'file') if configured_handlers.get(name)],
+                    )
+                function(self, logger, output)
             finally:
-                for key, value in initial_vars.items():
-                    os.environ.setdefault(key, value)
+                # the variables of env_vars are removed again
+                for key in [key for key in os.environ if key.startswith(utils.LOG_LEVEL_PREFIX)]:
+                    del os.environ[key]
+                os.environ.update(initial_vars)
 
         return wrapper
 
@@ -1,10 +1,16 @@
 import logging
 import os
+from typing import Mapping
 
+ENV_PREFIX = 'L4PY_'
 LOG_LEVEL_PREFIX = 'L4PY_LOG_LEVEL_'
 _LOG_LEVEL_ROOT_KEY = f'{LOG_LEVEL_PREFIX}ROOT'
 _LOG_LEVEL_LOGGER_KEY_FORMAT = f'{LOG_LEVEL_PREFIX}{{}}'
 
+SAMPLE_RATE_PREFIX = 'L4PY_SAMPLE_RATE_'
+RATE_LIMIT_PREFIX = 'L4PY_RATE_LIMIT_'
+_ROOT_SUFFIX = 'ROOT'
+
 _APP_NAME = 'python-app'
 
 
@@ -17,15 +23,61 @@ def get_app_name() -> str:
     return os.environ.get('L4PY_APP_NAME', _APP_NAME)
 
 
-def get_log_level_root_from_env() -> str or int:
-    level = os.environ.get(_LOG_LEVEL_ROOT_KEY, f'{logging.INFO}')
+def get_host_name() -> str:
+    # a single uname syscall, platform.uname() also collects processor and version details
+    if hasattr(os, 'uname'):
+        return os.uname().nodename
+    import platform
+    return platform.node()
+
+
+def get_l4py_environ(environ: Mapping[str, str] = None) -> dict[str, str]:
+    """
+    The `L4PY_*` variables, scan the environment once and pass them to the getters below.
+    """
+    environ = os.environ if environ is None else environ
+    return {key: value for key, value in environ.items() if key.startswith(ENV_PREFIX)}
+
+
+def get_log_level_root_from_env(environ: Mapping[str, str] = None) -> str or int:
+    environ = os.environ if environ is None else environ
+    level = environ.get(_LOG_LEVEL_ROOT_KEY, f'{logging.INFO}')
     return int(level) if level.isdigit() else level
 
 
-def get_log_levels_env() -> list[dict]:
+def get_log_levels_env(environ: Mapping[str, str] = None) -> list[dict]:
+    environ = os.environ if environ is None else environ
     return [
         {'logger': key.replace(LOG_LEVEL_PREFIX, ''), 'level': int(
             value) if value.isdigit() else value}
-        for key, value in os.environ.items()
+        for key, value in environ.items()
         if key.startswith(LOG_LEVEL_PREFIX) and key != _LOG_LEVEL_ROOT_KEY
     ]
+
+
+def _logger_name_from_key(key: str, prefix: str) -> str:
+    name = key.replace(prefix, '', 1)
+    return '' if name == _ROOT_SUFFIX else name
+
+
+def get_sample_rates_env(environ: Mapping[str, str] = None) -> list[dict]:
+    environ = os.environ if environ is None else environ
+    return [
+        {'logger': _logger_name_from_key(key, SAMPLE_RATE_PREFIX), 'rate': float(value)}
+        for key, value in environ.items()
+        if key.startswith(SAMPLE_RATE_PREFIX)
+    ]
+
+
+def get_rate_limits_env(environ: Mapping[str, str] = None) -> list[dict]:
+    environ = os.environ if environ is None else environ
+    rate_limits = []
+    for key, value in environ.items():
+        if key.startswith(RATE_LIMIT_PREFIX):
+            per_second, _, burst = value.partition(':')
+            rate_limits.append({
+                'logger': _logger_name_from_key(key, RATE_LIMIT_PREFIX),
+                'per_second': float(per_second),
+                'burst': int(burst) if burst else None,
+            })
+    return rate_limits
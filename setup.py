@@ -14,6 +14,13 @@ setup(
     license='MIT',
     packages=['l4py'],
     install_requires=[],
+    extras_require={
+        'fast': ['orjson'],
+        'zstd': ['zstandard'],
+    },
+    entry_points={
+        'console_scripts': ['l4py=l4py.cli:main'],
+    },
 
     classifiers=[
         'Development Status :: 5 - Production/Stable',
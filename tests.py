@@ -1,13 +1,103 @@
+import asyncio
+import contextlib
+import copy
+import glob
+import gzip
 import json
 import logging
+import logging.config
+import multiprocessing
+import os
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
 import unittest
+import unittest.mock
 import uuid
+from datetime import datetime
 from io import StringIO
 
-from l4py import LogConfigBuilder
+from l4py import LogConfigBuilder, LoggerMixin, get_logger
+from l4py import aio
+from l4py import bench
+from l4py import binary
+from l4py import cli
+from l4py import config
+from l4py import formatters
+from l4py import index
+from l4py import metrics
 from l4py import utils
-from l4py.context import set_trace_id, set_user_id
-from l4py.test import l4py_test, l4py_entries_from_stream
+from l4py.context import (
+    ContextFilter,
+    bind,
+    clear_context,
+    get_context,
+    get_trace_id,
+    get_user_id,
+    reset_context,
+    set_trace_id,
+    set_user_id,
+    unbind,
+)
+from l4py.filters import RateLimitFilter, SamplingFilter
+from l4py.levels import LevelReloader, start_level_reload
+from l4py.process import ProcessHandler
+from l4py.formatters import JsonFormatter, TextFormatter, TimestampCache
+from l4py.binary import BinaryFileHandler
+from l4py.index import IndexedRotatingFileHandler
+from l4py.handlers import (
+    AsyncQueueHandler,
+    ConsoleHandler,
+    BufferedRotatingFileHandler,
+    LockingRotatingFileHandler,
+    NetworkHandler,
+    PidRotatingFileHandler,
+    SegmentCompressor,
+    TailSamplingHandler,
+    TimedSizeRotatingFileHandler,
+    end_trace,
+)
+from l4py.test import CaptureHandler, l4py_test, l4py_entries_from_stream
+
+EMPTY_LOGGING_CONFIG = {'version': 1, 'disable_existing_loggers': False, 'root': {'handlers': []}}
+
+
+def make_record(name, level=logging.INFO, msg='message', args=(), exc_info=None, pathname=__file__, lineno=1, **attributes):
+    """
+    A `logging.LogRecord` with ``attributes`` (created, trace_id, fields, ...) set on it.
+    """
+    record = logging.LogRecord(name, level, pathname, lineno, msg, args, exc_info)
+    record.__dict__.update(attributes)
+    return record
+
+
+class TemporaryDirectoryTestCase(unittest.TestCase):
+    """
+    Runs each test in its own temporary directory, ``file_name`` is the path of ``file_base_name`` in it.
+    """
+    file_base_name = 'app.log'
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        self.file_name = self.path(self.file_base_name)
+
+    def path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+
+class LoggingConfigTestCase(TemporaryDirectoryTestCase):
+    """
+    Removes the handlers the test configured, before the temporary directory is removed.
+    """
+
+    def tearDown(self):
+        logging.config.dictConfig(EMPTY_LOGGING_CONFIG)
 
 
 class LoggerTest(unittest.TestCase):
@@ -98,7 +188,7 @@ class LoggerTest(unittest.TestCase):
 
         exception_message = ' '.join(l4py_entries_from_stream(streams['console']))
 
-        self.assertRegex(exception_message, '^.+Traceback.+1/0.+ZeroDivisionError: division by zero.+')
+        self.assertRegex(exception_message, '^.+Traceback.+1/0.+ZeroDivisionError: division by zero')
 
     @l4py_test(
         builder=LogConfigBuilder()
@@ -121,6 +211,1628 @@ class LoggerTest(unittest.TestCase):
         self.assertEqual(file_message_dict.get('user_id'), user_id, f'user_id: {user_id} should be in the log file message')
         self.assertEqual(file_message_dict.get('trace_id'), trace_id, f'trace_id: {trace_id} should be in the log file message')
 
+    @l4py_test(
+        builder=LogConfigBuilder()
+    )
+    def test_structured_fields_logging(self, logger, streams: list[StringIO]):
+        logger.info('order placed', order_id=17, amount=12.5)
+
+        console_message = ' '.join(l4py_entries_from_stream(streams['console']))
+        file_message_dict = json.loads(' '.join(l4py_entries_from_stream(streams['file'])))
+
+        self.assertIn('order placed order_id=17 amount=12.5', console_message)
+        self.assertEqual(file_message_dict['order_id'], 17)
+        self.assertEqual(file_message_dict['amount'], 12.5)
+        self.assertEqual(file_message_dict['function_name'], 'test_structured_fields_logging')
+        self.assertEqual(file_message_dict['file_name'], 'tests.py')
+
+    @l4py_test(
+        env_vars={f'{utils.LOG_LEVEL_PREFIX}ROOT': logging.INFO},
+    )
+    def test_disabled_level__should_not_build_the_record(self, logger, streams: list[StringIO]):
+        class Expensive:
+            def __str__(self):
+                raise AssertionError('should not be rendered')
+
+        logger.debug('not logged %s', Expensive(), payload=Expensive())
+
+        self.assertEqual(l4py_entries_from_stream(streams['file']), [])
+
+    @l4py_test(
+        builder=LogConfigBuilder()
+    )
+    def test_bound_context_logging(self, logger, streams: list[StringIO]):
+        token = bind(tenant='acme', span_id='span-1')
+        try:
+            logger.info('Hello')
+        finally:
+            reset_context(token)
+
+        console_message = ' '.join(l4py_entries_from_stream(streams['console']))
+        file_message_dict = json.loads(' '.join(l4py_entries_from_stream(streams['file'])))
+
+        self.assertIn('tenant: acme', console_message)
+        self.assertIn('span_id: span-1', console_message)
+        self.assertEqual(file_message_dict['tenant'], 'acme')
+        self.assertEqual(file_message_dict['span_id'], 'span-1')
+
+
+class CaptureTest(unittest.TestCase):
+
+    @l4py_test(capture=1000, builder=LogConfigBuilder().root_logger(logging.INFO), logger_name='l4py.capture')
+    def test_capture__should_index_the_records(self, logger, capture):
+        token = bind(trace_id='trace-1')
+        try:
+            logger.info('order %d placed', 1)
+            logging.getLogger('l4py.capture.child').warning('order %d delayed', 1)
+        finally:
+            reset_context(token)
+        logger.error('order %d failed', 2)
+        logger.debug('not captured')
+
+        self.assertEqual(len(capture), 3)
+        self.assertEqual(capture.messages(trace_id='trace-1'), ['order 1 placed', 'order 1 delayed'])
+        self.assertEqual(capture.messages(logger='l4py.capture', level='ERROR'), ['order 2 failed'])
+        self.assertEqual(capture.count(logger='l4py.capture.child'), 1)
+        self.assertEqual(capture.records(level=logging.WARNING)[0].trace_id, 'trace-1')
+        self.assertEqual(json.loads(JsonFormatter().format(capture.records()[2]))['message'], 'order 2 failed')
+        self.assertEqual(capture.rendered(level='INFO'), [logging.Formatter().format(capture.records()[0])])
+
+    def test_capture__should_keep_the_last_records(self):
+        capture = CaptureHandler(capacity=100)
+        for i in range(250):
+            record = make_record(f'l4py.capture.{i % 2}', logging.INFO, 'message %d', (i,))
+            record.trace_id = f'trace-{i}'
+            capture.handle(record)
+
+        self.assertEqual((len(capture), capture.evicted), (100, 150))
+        self.assertEqual(capture.messages(), [f'message {i}' for i in range(150, 250)])
+        self.assertEqual(capture.messages(logger='l4py.capture.1')[:2], ['message 151', 'message 153'])
+        self.assertEqual(capture.count(trace_id='trace-149'), 0)
+        self.assertEqual(len(capture._by_trace_id), 100)
+
+    def test_l4py_test__should_restore_the_environment(self):
+        key = f'{utils.LOG_LEVEL_PREFIX}l4py.capture.env'
+
+        @l4py_test(capture=10, env_vars={key: logging.DEBUG})
+        def test(self, logger, capture):
+            self.assertEqual(os.environ[key], str(logging.DEBUG))
+
+        test(self)
+        self.assertNotIn(key, os.environ)
+
+
+class ContextTest(unittest.TestCase):
+
+    def test_bind_and_unbind__should_not_mutate_previous_snapshots(self):
+        token = bind(tenant='acme', request_path='/orders')
+        try:
+            snapshot = get_context()
+            unbind('tenant')
+
+            self.assertEqual(snapshot['tenant'], 'acme')
+            self.assertNotIn('tenant', get_context())
+            self.assertEqual(get_context()['request_path'], '/orders')
+        finally:
+            reset_context(token)
+
+    def test_bind__should_reject_the_names_of_the_output_keys(self):
+        context = get_context()
+        for key in ('level', 'logger_name', 'message'):
+            with self.assertRaisesRegex(ValueError, key):
+                bind(**{key: 'bound'}, tenant='acme')
+        self.assertIs(get_context(), context)
+
+    def test_filter__should_attach_the_snapshot_only_once_per_record(self):
+        record = make_record('l4py.context', logging.INFO, 'Hello')
+        token = bind(trace_id='first')
+        try:
+            ContextFilter().filter(record)
+            bind(trace_id='second')
+            ContextFilter().filter(record)
+        finally:
+            reset_context(token)
+
+        self.assertEqual(record.trace_id, 'first')
+        self.assertEqual(record.context['trace_id'], 'first')
+
+
+class AsyncQueueHandlerTest(unittest.TestCase):
+
+    def test_records_are_written_by_the_listener_and_flushed_on_close(self):
+        stream = StringIO()
+        target = logging.StreamHandler(stream)
+        handler = AsyncQueueHandler([target], queue_size=100)
+        logger = logging.getLogger('l4py.test.async')
+        logger.addHandler(handler)
+        try:
+            for i in range(50):
+                logger.warning('message %d', i)
+        finally:
+            logger.removeHandler(handler)
+            handler.close()
+
+        entries = l4py_entries_from_stream(stream)
+        self.assertEqual(len(entries), 50)
+        self.assertEqual(entries[-1], 'message 49')
+
+    def test_drop_new__should_count_dropped_records(self):
+        release = threading.Event()
+
+        class BlockingHandler(logging.Handler):
+            def __init__(self):
+                super().__init__()
+                self.records = []
+
+            def emit(self, record):
+                release.wait()
+                self.records.append(record)
+
+        target = BlockingHandler()
+        handler = AsyncQueueHandler([target], queue_size=2, overflow='drop_new')
+        logger = logging.getLogger('l4py.test.async.drop')
+        logger.addHandler(handler)
+        try:
+            for i in range(10):
+                logger.warning('message %d', i)
+        finally:
+            logger.removeHandler(handler)
+            release.set()
+            handler.close()
+
+        self.assertGreater(handler.dropped, 0)
+        self.assertEqual(len(target.records), 10 - handler.dropped + 1)
+        self.assertEqual(target.records[-1].name, 'l4py')
+
+    def test_drop_new__should_count_the_drops_of_concurrent_producers(self):
+        release = threading.Event()
+        records = []
+        target = logging.Handler()
+        target.emit = lambda record: release.wait() and records.append(record)
+        handler = AsyncQueueHandler([target], queue_size=1, overflow='drop_new')
+        record = make_record('l4py.test.async.drop', logging.WARNING)
+
+        def produce():
+            for _ in range(2000):
+                handler.enqueue(record)
+
+        producers = [threading.Thread(target=produce) for _ in range(8)]
+        for producer in producers:
+            producer.start()
+        for producer in producers:
+            producer.join()
+        release.set()
+        with unittest.mock.patch.object(handler, '_report_dropped'):
+            handler.close()
+
+        self.assertEqual(handler.dropped + len(records), 8 * 2000)
+
+    def test_builder__should_route_root_through_the_queue_handler(self):
+        config = LogConfigBuilder().async_handlers(True, queue_size=10).build_config()
+
+        self.assertEqual(config['root']['handlers'], ['queue'])
+        self.assertEqual(config['handlers']['queue']['handlers'], ['cfg://handlers.console', 'cfg://handlers.file'])
+        self.assertEqual(config['handlers']['console']['filters'], [])
+
+
+class TextFormatterTest(unittest.TestCase):
+
+    class TtyStream(StringIO):
+        isatty_calls = 0
+
+        def isatty(self):
+            self.isatty_calls += 1
+            return True
+
+    def _record(self):
+        return make_record(
+            'l4py.text', logging.WARNING, 'hello %s', ('world',), pathname='/src/app.py', lineno=7,
+            funcName='handle', created=1700000000.5, fields={'order_id': 3},
+        )
+
+    def test_format__should_render_the_default_layout(self):
+        formatter = TextFormatter(app_name='text-app', datefmt='%H:%M')
+
+        self.assertEqual(
+            formatter.format(self._record()),
+            f'{datetime.fromtimestamp(1700000000).strftime("%H:%M")} [WARNING ] text-app l4py.text app.py:7 '
+            'handle: hello world order_id=3'
+        )
+
+    def test_format__should_render_a_custom_layout(self):
+        record = self._record()
+        record.request_path = '/orders'
+        formatter = TextFormatter(app_name='text-app', layout="{level:.1}|{logger_name!r}|{request_path}|{missing}|'{{x}}'\\")
+
+        self.assertEqual(formatter.format(record), "W|'l4py.text'|/orders||'{x}'\\ order_id=3")
+
+    def test_layout__should_reject_invalid_fields(self):
+        with self.assertRaises(ValueError):
+            TextFormatter(layout='{record.__class__}')
+        with self.assertRaises(ValueError):
+            TextFormatter(layout='{message')
+        for layout in ('{message!x}', "{message!'}"):
+            with self.assertRaisesRegex(ValueError, 'unsupported conversion'):
+                TextFormatter(layout=layout)
+
+    def test_console_handler__should_detect_colors_once_against_its_stream(self):
+        tty = self.TtyStream()
+        formatter = TextFormatter(app_name='text-app')
+        handler = ConsoleHandler(tty)
+        handler.setFormatter(formatter)
+        for _ in range(3):
+            handler.handle(self._record())
+
+        self.assertEqual(tty.isatty_calls, 1)
+        self.assertTrue(tty.getvalue().startswith('\033[33m'))
+        # the formatter passed in is not changed, it may be shared with other handlers
+        self.assertIsNone(formatter.color)
+
+        plain = StringIO()
+        handler.setStream(plain)
+        handler.handle(self._record())
+        self.assertNotIn('\033', plain.getvalue())
+
+    def test_console_handler__should_respect_no_color(self):
+        tty = self.TtyStream()
+        handler = ConsoleHandler(tty)
+        with unittest.mock.patch.dict(os.environ, {'NO_COLOR': '1'}):
+            handler.setFormatter(TextFormatter())
+        handler.handle(self._record())
+
+        self.assertNotIn('\033', tty.getvalue())
+
+
+class JsonFormatterTest(unittest.TestCase):
+
+    def test_format__should_match_json_dumps_of_the_schema(self):
+        formatter = JsonFormatter(app_name='app-\u00e9')
+        try:
+            1/0
+        except ZeroDivisionError:
+            record = make_record(
+                'l4py.json', logging.ERROR, 'caf\u00e9 "%s" %d', ('quoted', 7), exc_info=sys.exc_info(), lineno=42
+            )
+        record.trace_id = uuid.uuid4().hex
+        record.user_id = 17
+
+        expected = json.dumps({
+            "timestamp": formatter.format_time(record),
+            "app_name": 'app-\u00e9',
+            "logger_name": record.name,
+            "level": record.levelname,
+            "file_name": record.filename,
+            "line_number": record.lineno,
+            "function_name": record.funcName,
+            "message": 'caf\u00e9 "quoted" 7',
+            "trace_id": record.trace_id,
+            "user_id": 17,
+            "exception": formatter.formatException(record.exc_info),
+        }, default=str)
+
+        self.assertEqual(formatter.format(record), expected)
+
+    def test_format__should_encode_nested_values_like_json_dumps(self):
+        record = make_record('l4py.json', logging.INFO, 'counts')
+        record.fields = {'counts': {1: 2, 'caf\u00e9': [1.5, None]}}
+
+        rendered = JsonFormatter().format(record)
+
+        self.assertIn(', "counts": ' + json.dumps(record.fields['counts']) + '}', rendered)
+
+    def test_fast_encoder__should_fall_back_to_json_dumps(self):
+        class RejectingEncoder:
+            @staticmethod
+            def dumps(value, default=None):
+                raise TypeError('Dict key must be str')
+
+        with unittest.mock.patch.dict(sys.modules, {'orjson': RejectingEncoder}):
+            encoder = formatters._load_fast_json_encoder()
+
+        self.assertEqual(encoder({1: 2}), '{"1": 2}')
+
+        record = make_record('l4py.json', logging.INFO, 'counts')
+        record.fields = {'counts': {1: 2}}
+        self.assertEqual(json.loads(JsonFormatter(fast_encoder=True).format(record))['counts'], {'1': 2})
+
+    def test_format__should_prefix_the_fields_named_like_the_schema_keys(self):
+        logger = get_logger('l4py.json.reserved')
+        handler = logging.Handler()
+        records = []
+        handler.emit = records.append
+        logger.addHandler(handler)
+        try:
+            logger.warning('real', level='low', message='fake', trace_id='field', tenant='field')
+        finally:
+            logger.removeHandler(handler)
+        record, = records
+        record.context = {'tenant': 'context', 'region': 'eu'}
+
+        rendered = JsonFormatter().format(record)
+        pairs = json.loads(rendered, object_pairs_hook=lambda pairs: pairs)
+
+        self.assertEqual(len(pairs), len(dict(pairs)))
+        self.assertEqual(dict(pairs)['level'], 'WARNING')
+        self.assertEqual(dict(pairs)['message'], 'real')
+        self.assertEqual(
+            pairs[-5:],
+            [('region', 'eu'), ('field_level', 'low'), ('field_message', 'fake'), ('field_trace_id', 'field'),
+             ('tenant', 'field')],
+        )
+
+    def test_format__should_keep_percent_signs_without_args(self):
+        record = make_record('l4py.json', logging.INFO, '100% done')
+
+        self.assertEqual(json.loads(JsonFormatter().format(record))['message'], '100% done')
+
+    def test_encoder__should_be_used_for_non_string_values(self):
+        formatter = JsonFormatter(encoder=lambda value: '"encoded"')
+        record = make_record('l4py.json', logging.INFO, 'Hello')
+        record.trace_id = uuid.UUID(int=1)
+
+        self.assertEqual(json.loads(formatter.format(record))['trace_id'], 'encoded')
+
+
+class ExceptionFormattingTest(unittest.TestCase):
+
+    def _records(self, count):
+        records = []
+        for i in range(count):
+            try:
+                {}[f'key-{i}']
+            except KeyError:
+                records.append(make_record('l4py.exc', logging.ERROR, 'failed', exc_info=sys.exc_info()))
+        return records
+
+    def test_traceback__should_be_rendered_once_per_record(self):
+        record = self._records(1)[0]
+        text, json_formatter = TextFormatter(app_name='exc-app'), JsonFormatter(app_name='exc-app')
+        with unittest.mock.patch.object(
+                logging.Formatter, 'formatException', autospec=True, side_effect=logging.Formatter.formatException
+        ) as format_exception:
+            text.format(record)
+            json_formatter.format(record)
+
+        self.assertEqual(format_exception.call_count, 1)
+        self.assertIn("KeyError: 'key-0'", json.loads(json_formatter.format(record))['exception'])
+
+    def test_exception_cache__should_reference_repeated_tracebacks(self):
+        formatter = JsonFormatter(app_name='exc-app', exception_cache_size=10)
+        entries = [json.loads(formatter.format(record)) for record in self._records(3)]
+
+        self.assertIn('Traceback', entries[0]['exception'])
+        fingerprint = entries[0]['exception_fingerprint']
+        self.assertEqual({entry['exception_fingerprint'] for entry in entries}, {fingerprint})
+        self.assertEqual(entries[2]['exception'], f"KeyError: 'key-2' (traceback {fingerprint} repeated, seen 3 times)")
+
+        try:
+            1/0
+        except ZeroDivisionError:
+            other = make_record('l4py.exc', logging.ERROR, 'failed', exc_info=sys.exc_info())
+        self.assertIn('Traceback', json.loads(formatter.format(other))['exception'])
+
+    def test_exception_cache__should_count_each_record_once_per_cache(self):
+        text = TextFormatter(app_name='exc-app', exception_cache_size=10)
+        json_formatter = JsonFormatter(app_name='exc-app', exception_frames=True, exception_cache_size=10)
+        # the colored copy shares the cache of the formatter
+        formatters = [text, text.with_color(True)]
+        json_formatters = [json_formatter, copy.copy(json_formatter)]
+        first, second = self._records(2)
+
+        for formatter in formatters:
+            self.assertIn('Traceback', formatter.format(first))
+            self.assertIn('seen 2 times', formatter.format(second))
+        for formatter in json_formatters:
+            self.assertIn('frames', json.loads(formatter.format(first))['exception'])
+            self.assertNotIn('frames', json.loads(formatter.format(second))['exception'])
+
+    def test_exception_frames__should_render_the_stack_as_json(self):
+        formatter = JsonFormatter(app_name='exc-app', exception_frames=True, exception_cache_size=10)
+        first, second = [json.loads(formatter.format(record))['exception'] for record in self._records(2)]
+
+        self.assertEqual(first['type'], 'KeyError')
+        self.assertEqual(first['message'], "'key-0'")
+        self.assertEqual(first['frames'][-1]['function_name'], '_records')
+        self.assertEqual(first['frames'][-1]['file_name'], __file__)
+        self.assertEqual(second['fingerprint'], first['fingerprint'])
+        self.assertNotIn('frames', second)
+
+    def test_builder__should_configure_the_formatters(self):
+        config = LogConfigBuilder().exception_cache(100).json_exception_frames(True).build_config()
+
+        self.assertEqual(config['formatters']['console']['exception_cache_size'], 100)
+        self.assertNotIn('exception_frames', config['formatters']['console'])
+        self.assertTrue(config['formatters']['file']['exception_frames'])
+
+
+class SharedRenderingTest(LoggingConfigTestCase):
+
+    class CountingFilter(logging.Filter):
+        calls = 0
+
+        def filter(self, record):
+            SharedRenderingTest.CountingFilter.calls += 1
+            return True
+
+    def setUp(self):
+        super().setUp()
+        self.CountingFilter.calls = 0
+
+    def _builder(self):
+        return LogConfigBuilder()\
+            .root_logger(logging.INFO)\
+            .console_json(True)\
+            .file(self.path('app.log'))\
+            .add_filter('counting', self.CountingFilter)
+
+    def test_builder__should_share_identical_formatters(self):
+        config = self._builder().build_config()
+
+        self.assertEqual(config['handlers']['console']['formatter'], 'console')
+        self.assertEqual(config['handlers']['file']['formatter'], 'console')
+        self.assertNotIn('file', config['formatters'])
+        self.assertEqual(config['formatters']['console']['.'], {'memoize': True})
+
+        config = self._builder().console_json(False).build_config()
+        self.assertEqual(config['handlers']['file']['formatter'], 'file')
+        self.assertNotIn('.', config['formatters']['console'])
+
+    def test_init__should_render_and_filter_once_per_record(self):
+        self._builder().add_sampler('l4py.shared', 1.0).init()
+        console = StringIO()
+        logging.getLogger().handlers[0].setStream(console)
+
+        with unittest.mock.patch.object(JsonFormatter, 'render', autospec=True, side_effect=JsonFormatter.render) as render:
+            logging.getLogger('l4py.shared').warning('shared %d', 1)
+            logging.getLogger().warning('shared %d', 2)
+        logging.getLogger().handlers[1].flush()
+
+        self.assertEqual(render.call_count, 2)
+        self.assertEqual(self.CountingFilter.calls, 2)
+        with open(self.path('app.log')) as file:
+            self.assertEqual(file.read(), console.getvalue())
+
+
+class StartupTest(LoggingConfigTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.snapshot = self.path('logging.json')
+
+    def _builder(self):
+        return LogConfigBuilder()\
+            .root_logger(logging.INFO)\
+            .console_json(True)\
+            .file(self.path('app.log'))\
+            .add_sampler('l4py.startup', 1.0)\
+            .add_filter('counting', SharedRenderingTest.CountingFilter)
+
+    def _log(self):
+        console = StringIO()
+        logging.getLogger().handlers[0].setStream(console)
+        logging.getLogger('l4py.startup').warning('started %d', 1)
+        return json.loads(console.getvalue())
+
+    def _loaded_modules(self, code):
+        modules = ('logging.config', 'l4py.builder', 'hashlib', 'orjson', 'random')
+        code = f'import sys\n{code}\nprint(",".join(m for m in {modules!r} if m in sys.modules))'
+        result = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True)
+        return result.stdout.strip().split(',')
+
+    def test_import__should_not_load_the_config_machinery(self):
+        self.assertEqual(self._loaded_modules('import l4py'), [''])
+        self.assertEqual(
+            self._loaded_modules('from l4py import get_logger\nget_logger("l4py.startup").info("ready")'),
+            ['l4py.builder'],
+        )
+
+    def test_init__direct_should_match_dict_config(self):
+        self._builder().init()
+        expected = [(type(h), type(h.formatter), [type(f) for f in h.filters]) for h in logging.getLogger().handlers]
+        entry = self._log()
+
+        self._builder().init(direct=True)
+        handlers = logging.getLogger().handlers
+        self.assertEqual([(type(h), type(h.formatter), [type(f) for f in h.filters]) for h in handlers], expected)
+        self.assertEqual(len(logging.getLogger().filters), 1)
+        self.assertIs(handlers[0].formatter, handlers[1].formatter)
+        self.assertEqual(self._log()['message'], entry['message'])
+
+    def test_snapshot__should_be_applied_until_the_environment_changes(self):
+        self._builder().save_snapshot(self.snapshot)
+        logging.config.dictConfig(EMPTY_LOGGING_CONFIG)
+
+        self.assertTrue(config.init_from_snapshot(self.snapshot))
+        self.assertEqual(len(logging.getLogger().handlers), 2)
+        self.assertEqual(self._log()['logger_name'], 'l4py.startup')
+
+        with unittest.mock.patch.dict(os.environ, {'L4PY_LOG_LEVEL_ROOT': 'ERROR'}):
+            self.assertFalse(config.init_from_snapshot(self.snapshot))
+        self.assertFalse(config.init_from_snapshot(self.path('missing.json')))
+
+
+class TimestampCacheTest(unittest.TestCase):
+
+    def test_format__should_match_isoformat_with_milliseconds(self):
+        cache = TimestampCache()
+        for created in [1700000000.0, 1700000000.0004, 1700000000.123456, 1700000000.9995, 1700000001.5]:
+            self.assertEqual(
+                cache.format(created),
+                datetime.fromtimestamp(created).isoformat(timespec='milliseconds')
+            )
+
+    def test_format__should_render_utc_rfc3339_and_custom_datefmt(self):
+        self.assertEqual(TimestampCache(utc=True, rfc3339=True).format(1700000000.25), '2023-11-14T22:13:20.250+00:00')
+        self.assertEqual(TimestampCache(utc=True).format(1700000000.25), '2023-11-14T22:13:20.250+00:00')
+        self.assertEqual(TimestampCache('%Y-%m-%d %H:%M:%S', utc=True).format(1700000000.25), '2023-11-14 22:13:20')
+        self.assertEqual(TimestampCache('%S.%f', utc=True).format(1700000000.25), '20.250000')
+
+
+class GetLoggerTest(unittest.TestCase):
+
+    def test_get_logger__should_resolve_module_and_class_of_the_caller(self):
+        class Child(GetLoggerTest):
+            pass
+
+        self.assertEqual(get_logger().name, f'{__name__}.GetLoggerTest')
+        self.assertEqual(self._logger_from_method().name, f'{__name__}.GetLoggerTest')
+        self.assertEqual(Child._logger_from_method(Child()).name, f'{__name__}.Child')
+        self.assertEqual(get_logger('explicit').name, 'explicit')
+
+    def test_get_logger__should_configure_the_wrapped_logger(self):
+        logger = get_logger('l4py.test.wrapped')
+        try:
+            logger.propagate = False
+            logger.disabled = True
+
+            self.assertFalse(logging.getLogger('l4py.test.wrapped').propagate)
+            self.assertTrue(logging.getLogger('l4py.test.wrapped').disabled)
+            self.assertNotIn('propagate', vars(logger))
+        finally:
+            logger.propagate = True
+            logger.disabled = False
+
+    def _logger_from_method(self):
+        return get_logger()
+
+    def test_logger_mixin__should_resolve_the_logger_per_class(self):
+        class Service(LoggerMixin):
+            pass
+
+        class SubService(Service):
+            pass
+
+        self.assertEqual(Service.logger.name, f'{__name__}.Service')
+        self.assertIs(Service().logger, Service.logger)
+        self.assertEqual(SubService().logger.name, f'{__name__}.SubService')
+
+
+class BufferedRotatingFileHandlerTest(TemporaryDirectoryTestCase):
+    file_base_name = 'buffered.log'
+
+    def _read(self, file_name=None):
+        with open(file_name or self.file_name) as file:
+            return file.read().splitlines()
+
+    def _record(self, level, message):
+        return make_record('l4py.buffered', level, message)
+
+    def test_records_are_buffered_until_error_or_flush(self):
+        handler = BufferedRotatingFileHandler(self.file_name, buffer_size=1024 * 1024, flush_interval_ms=0)
+        try:
+            handler.handle(self._record(logging.INFO, 'first'))
+            self.assertEqual(self._read(), [])
+
+            handler.handle(self._record(logging.ERROR, 'second'))
+            self.assertEqual(self._read(), ['first', 'second'])
+
+            handler.handle(self._record(logging.INFO, 'third'))
+            handler.flush()
+            self.assertEqual(self._read(), ['first', 'second', 'third'])
+        finally:
+            handler.close()
+
+    def test_rollover_uses_the_tracked_size(self):
+        handler = BufferedRotatingFileHandler(
+            self.file_name, maxBytes=20, backupCount=2, buffer_size=1024 * 1024, flush_interval_ms=0
+        )
+        try:
+            for message in ['message-1', 'message-2', 'message-3']:
+                handler.handle(self._record(logging.INFO, message))
+        finally:
+            handler.close()
+
+        self.assertEqual(self._read(f'{self.file_name}.2'), ['message-1'])
+        self.assertEqual(self._read(f'{self.file_name}.1'), ['message-2'])
+        self.assertEqual(self._read(), ['message-3'])
+
+    def test_builder__should_configure_the_buffered_handler(self):
+        config = LogConfigBuilder().file_buffering(4096, interval_ms=200).build_config()
+
+        self.assertEqual(config['handlers']['file']['class'], 'l4py.handlers.BufferedRotatingFileHandler')
+        self.assertEqual(config['handlers']['file']['buffer_size'], 4096)
+        self.assertEqual(config['handlers']['file']['flush_interval_ms'], 200)
+
+
+def _write_records(handler: logging.Handler, worker: int, count: int):
+    for i in range(count):
+        handler.handle(make_record('l4py.mp', logging.INFO, f'worker-{worker} {i:04d}'))
+    handler.close()
+
+
+class MultiProcessFileHandlerTest(TemporaryDirectoryTestCase):
+
+    def _run_workers(self, handler: logging.Handler, workers: int, count: int):
+        context = multiprocessing.get_context('fork')
+        processes = [context.Process(target=_write_records, args=(handler, w, count)) for w in range(workers)]
+        [p.start() for p in processes]
+        [p.join() for p in processes]
+        handler.close()
+
+    def _read_all_lines(self, pattern: str) -> list[str]:
+        lines = []
+        for file_name in glob.glob(self.path(pattern)):
+            if file_name.endswith('.lock'):
+                continue
+            with open(file_name) as file:
+                lines += file.read().splitlines()
+        return lines
+
+    def test_lock__should_not_lose_records_while_rotating(self):
+        handler = LockingRotatingFileHandler(self.file_name, maxBytes=2000, backupCount=100)
+        self._run_workers(handler, workers=4, count=200)
+
+        lines = self._read_all_lines('app.log*')
+        self.assertEqual(len(lines), 800)
+        self.assertEqual(len(set(lines)), 800)
+
+    def test_pid__should_write_one_file_per_process(self):
+        handler = PidRotatingFileHandler(self.file_name, delay=True)
+        self._run_workers(handler, workers=3, count=10)
+
+        files = glob.glob(self.path('app.*.log'))
+        self.assertEqual(len(files), 3)
+        self.assertEqual(len(self._read_all_lines('app.*.log')), 30)
+
+    def test_builder__should_select_the_multiprocess_handler(self):
+        self.assertEqual(
+            LogConfigBuilder().file_multiprocess('pid').build_config()['handlers']['file']['class'],
+            'l4py.handlers.PidRotatingFileHandler'
+        )
+        self.assertEqual(
+            LogConfigBuilder().file_multiprocess('lock').build_config()['handlers']['file']['class'],
+            'l4py.handlers.LockingRotatingFileHandler'
+        )
+        with self.assertRaises(ValueError):
+            LogConfigBuilder().file_multiprocess('lock').file_buffering().build_config()
+
+
+class TimedSizeRotatingFileHandlerTest(TemporaryDirectoryTestCase):
+
+    def _record(self, message, **attributes):
+        return make_record('l4py.timed', msg=message, **attributes)
+
+    def test_size_rotation__should_compress_segments_and_keep_backup_count(self):
+        handler = TimedSizeRotatingFileHandler(self.file_name, maxBytes=20, backupCount=2, compression='gzip')
+        try:
+            for i in range(5):
+                handler.handle(self._record(f'message-{i}'))
+        finally:
+            handler.close()
+
+        segments = handler.compressor.segments()
+        self.assertEqual(len(segments), 2)
+        self.assertTrue(all(name.endswith('.gz') for name in segments))
+        with gzip.open(segments[-1], 'rt') as file:
+            self.assertEqual(file.read(), 'message-3\n')
+        with open(self.file_name) as file:
+            self.assertEqual(file.read(), 'message-4\n')
+
+    def test_retention__should_keep_the_newest_segments_when_rotating_faster_than_compressing(self):
+        compress = SegmentCompressor.compress
+
+        def slow_compress(compressor, segment):
+            time.sleep(0.005)
+            compress(compressor, segment)
+
+        handler = TimedSizeRotatingFileHandler(self.file_name, maxBytes=20, backupCount=3, compression='gzip')
+        with unittest.mock.patch.object(SegmentCompressor, 'compress', slow_compress), \
+                unittest.mock.patch.object(logging.lastResort, 'handle') as errors:
+            try:
+                for i in range(40):
+                    handler.handle(self._record(f'message-{i:02d}'))
+            finally:
+                handler.close()
+
+        errors.assert_not_called()
+        contents = []
+        for name in handler.compressor.segments():
+            with gzip.open(name, 'rt') as file:
+                contents.append(file.read())
+        self.assertEqual(contents, ['message-36\n', 'message-37\n', 'message-38\n'])
+        self.assertEqual(
+            [handler.compressor.segment_key(name)[0] for name in handler.compressor.segments()], [36, 37, 38]
+        )
+
+    def test_time_rotation__should_rotate_when_the_interval_is_over(self):
+        handler = TimedSizeRotatingFileHandler(self.file_name, when='H')
+        try:
+            handler.handle(self._record('first'))
+            handler.handle(self._record('second', created=handler.rolloverAt))
+        finally:
+            handler.close()
+
+        segments = handler.compressor.segments()
+        self.assertEqual(len(segments), 1)
+        with open(segments[0]) as file:
+            self.assertEqual(file.read(), 'first\n')
+
+    def test_retention_by_total_bytes(self):
+        handler = TimedSizeRotatingFileHandler(self.file_name, maxBytes=20, maxTotalBytes=25)
+        try:
+            for i in range(5):
+                handler.handle(self._record(f'message-{i}'))
+        finally:
+            handler.close()
+
+        self.assertEqual(len(handler.compressor.segments()), 2)
+
+
+class BenchTest(unittest.TestCase):
+
+    def test_run__should_report_throughput_and_latency_percentiles(self):
+        report = json.loads(json.dumps(bench.run(iterations=20)))
+        results = report['results']
+
+        self.assertTrue(report['l4py'])
+
+        names = {result['name'] for result in results}
+        self.assertIn('formatter.JsonFormatter', names)
+        self.assertIn('handler.file', names)
+        self.assertIn('get_logger.class', names)
+        for result in results:
+            self.assertGreater(result['records_per_second'], 0)
+            self.assertLessEqual(result['latency_ns']['p50'], result['latency_ns']['p99'])
+
+
+class SamplingAndRateLimitTest(unittest.TestCase):
+
+    def _record(self, name='l4py.noisy', msg='connection to %s failed', created=1000.0):
+        return make_record(name, logging.WARNING, msg, ('db',), created=created)
+
+    def test_sampler__should_only_apply_to_the_logger_and_its_children(self):
+        sampler = SamplingFilter('l4py.noisy', rate=0)
+
+        self.assertFalse(sampler.filter(self._record('l4py.noisy')))
+        self.assertFalse(sampler.filter(self._record('l4py.noisy.child')))
+        self.assertTrue(sampler.filter(self._record('l4py.other')))
+
+    def test_rate_limit__should_let_the_burst_through_and_decide_once_per_record(self):
+        rate_limit = RateLimitFilter('l4py.noisy', per_second=1, burst=3)
+        records = [self._record() for _ in range(5)]
+
+        self.assertEqual([rate_limit.filter(r) for r in records], [True, True, True, False, False])
+        # a second handler running the same filter gets the same decision
+        self.assertEqual([rate_limit.filter(r) for r in records], [True, True, True, False, False])
+        # other templates have their own bucket
+        self.assertTrue(rate_limit.filter(self._record(msg='other')))
+        # tokens are refilled over time
+        self.assertTrue(rate_limit.filter(self._record(created=1001.0)))
+        # the two suppressed records are reported on close
+        with unittest.mock.patch.object(rate_limit, '_emit_summary') as emit_summary:
+            rate_limit.close()
+        self.assertEqual(emit_summary.call_args.args[1], 2)
+
+    def test_rate_limit__should_report_the_suppressed_records(self):
+        stream = StringIO()
+        handler = logging.StreamHandler(stream)
+        logger = logging.getLogger('l4py.noisy.summary')
+        logger.propagate = False
+        logger.addHandler(handler)
+        handler.addFilter(RateLimitFilter('l4py.noisy', per_second=1, burst=1, summary_interval=0))
+        try:
+            for _ in range(4):
+                logger.handle(self._record('l4py.noisy.summary'))
+            logger.handle(self._record('l4py.noisy.summary', created=1002.0))
+        finally:
+            logger.removeHandler(handler)
+
+        self.assertEqual(l4py_entries_from_stream(stream), [
+            'connection to db failed',
+            '3 similar messages suppressed: connection to %s failed',
+            'connection to db failed',
+        ])
+
+    def test_rate_limit__should_report_the_suppressed_records_when_the_storm_stops(self):
+        capture = CaptureHandler()
+        logger = logging.getLogger('l4py.noisy.storm')
+        logger.propagate = False
+        logger.addHandler(capture)
+        try:
+            with unittest.mock.patch('threading.Timer') as timer:
+                rate_limit = RateLimitFilter('l4py.noisy', per_second=1, burst=1, summary_interval=0, max_keys=1)
+                for _ in range(3):
+                    rate_limit.filter(self._record('l4py.noisy.storm'))
+                # evicts the bucket of the first template
+                rate_limit.filter(self._record('l4py.noisy.storm', msg='other'))
+                self.assertEqual(capture.messages(), ['2 similar messages suppressed: connection to %s failed'])
+
+                rate_limit.filter(self._record('l4py.noisy.storm', msg='other'))
+                report_pending = timer.call_args.args[1]
+                report_pending()
+                self.assertEqual(capture.messages()[-1], '1 similar messages suppressed: other')
+
+                rate_limit.filter(self._record('l4py.noisy.storm', msg='other'))
+                rate_limit.close()
+                self.assertEqual(capture.messages()[-1], '1 similar messages suppressed: other')
+                self.assertEqual(capture.count(), 3)
+        finally:
+            logger.removeHandler(capture)
+
+    def test_builder__should_configure_the_filters_from_the_builder_and_the_environment(self):
+        os.environ[f'{utils.SAMPLE_RATE_PREFIX}ROOT'] = '0.5'
+        os.environ[f'{utils.RATE_LIMIT_PREFIX}urllib3'] = '100:500'
+        try:
+            config = LogConfigBuilder()\
+                .add_sampler('l4py.noisy', 0.1)\
+                .add_rate_limit('l4py.noisy', per_second=10)\
+                .build_config()
+        finally:
+            del os.environ[f'{utils.SAMPLE_RATE_PREFIX}ROOT']
+            del os.environ[f'{utils.RATE_LIMIT_PREFIX}urllib3']
+
+        self.assertEqual(config['filters']['sampler.l4py.noisy']['rate'], 0.1)
+        self.assertEqual(config['filters']['sampler.root']['logger_name'], '')
+        self.assertEqual(config['filters']['rate_limit.urllib3']['burst'], 500)
+        self.assertEqual(config['filters']['rate_limit.l4py.noisy']['per_second'], 10)
+        self.assertEqual(config['handlers']['console']['filters'], ['chain'])
+        self.assertEqual(config['filters']['chain']['names'][0], 'sampler.l4py.noisy')
+        self.assertEqual(config['filters']['chain']['names'][-1], 'context')
+
+
+class TailSamplingHandlerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.stream = StringIO()
+        self.handler = TailSamplingHandler([logging.StreamHandler(self.stream)], max_records_per_trace=3)
+
+    def tearDown(self):
+        self.handler.close()
+
+    def _log(self, level, msg, trace_id=None, **attributes):
+        self.handler.handle(make_record('l4py.tail', level, msg, trace_id=trace_id, **attributes))
+
+    def test_debug_records_are_written_when_the_trace_fails(self):
+        self._log(logging.DEBUG, 'debug-1', 'failing')
+        self._log(logging.DEBUG, 'debug-2', 'succeeding')
+        self._log(logging.INFO, 'info-1', 'failing')
+        self._log(logging.DEBUG, 'no trace')
+        self.assertEqual(self.stream.getvalue().splitlines(), ['info-1'])
+
+        self._log(logging.ERROR, 'error-1', 'failing')
+        end_trace('succeeding')
+
+        self.assertEqual(self.stream.getvalue().splitlines(), ['info-1', 'debug-1', 'error-1'])
+        self.assertEqual(self.handler.buffered, 0)
+
+    def test_buffers_are_bounded(self):
+        for i in range(5):
+            self._log(logging.DEBUG, f'debug-{i}', 'trace')
+        self.assertEqual(self.handler.buffered, 3)
+
+        self._log(logging.DEBUG, 'expired', 'old', created=0)
+        self._log(logging.DEBUG, 'debug-5', 'trace')
+        self.assertEqual(self.handler.buffered, 3)
+
+        self._log(logging.ERROR, 'error', 'trace')
+        self.assertEqual(self.stream.getvalue().splitlines(), ['debug-3', 'debug-4', 'debug-5', 'error'])
+
+    def test_loggers_with_their_own_level_are_written_against_it(self):
+        self.handler.close()
+        self.handler = TailSamplingHandler(
+            [logging.StreamHandler(self.stream)], levels={'l4py.verbose': 'DEBUG', 'l4py.quiet': logging.ERROR}
+        )
+        self.handler.handle(make_record('l4py.verbose.child', logging.DEBUG, 'verbose debug'))
+        self.handler.handle(make_record('l4py.verbose', logging.DEBUG, 'verbose traced', trace_id='trace'))
+        self.handler.handle(make_record('l4py.quiet', logging.WARNING, 'quiet warning', trace_id='trace'))
+        self.handler.handle(make_record('l4py.other', logging.DEBUG, 'other debug'))
+
+        self.assertEqual(self.stream.getvalue().splitlines(), ['verbose debug', 'verbose traced'])
+        self.assertEqual(self.handler.buffered, 1)
+
+    def test_builder__should_wrap_the_handlers_and_capture_debug(self):
+        config = LogConfigBuilder().root_logger(logging.INFO).tail_sampling(True).build_config()
+
+        self.assertEqual(config['root']['level'], logging.DEBUG)
+        self.assertEqual(config['root']['handlers'], ['tail_sampling'])
+        self.assertEqual(config['handlers']['tail_sampling']['threshold'], logging.INFO)
+        self.assertEqual(config['handlers']['tail_sampling']['filters'], ['chain'])
+        self.assertEqual(config['handlers']['file']['filters'], [])
+
+    def test_builder__should_keep_the_levels_of_the_configured_loggers(self):
+        with unittest.mock.patch.dict(os.environ, {f'{utils.LOG_LEVEL_PREFIX}l4py.env': 'DEBUG'}):
+            config = LogConfigBuilder().root_logger(logging.INFO).add_logger('l4py.added', logging.DEBUG)\
+                .tail_sampling(True).build_config()
+
+        self.assertEqual(config['loggers']['l4py.added']['level'], logging.DEBUG)
+        self.assertEqual(
+            config['handlers']['tail_sampling']['levels'], {'l4py.added': logging.DEBUG, 'l4py.env': 'DEBUG'}
+        )
+
+
+class LevelReloaderTest(TemporaryDirectoryTestCase):
+    file_base_name = 'levels.env'
+
+    def setUp(self):
+        super().setUp()
+        self.logger = logging.getLogger('l4py.reload.module')
+        self.logger.setLevel(logging.WARNING)
+
+    def tearDown(self):
+        self.logger.setLevel(logging.NOTSET)
+
+    def _write(self, content: str):
+        with open(self.file_name, 'w') as file:
+            file.write(content)
+
+    def test_reload__should_only_change_the_levels(self):
+        handlers = logging.getLogger().handlers[:]
+        reloader = LevelReloader(self.file_name)
+        self.assertFalse(self.logger.isEnabledFor(logging.DEBUG))
+
+        self._write(f'# incident 42\n{utils.LOG_LEVEL_PREFIX}l4py.reload=DEBUG\n')
+        reloader.reload()
+
+        self.assertEqual(logging.getLogger('l4py.reload').level, logging.DEBUG)
+        self.logger.setLevel(logging.NOTSET)
+        self.assertTrue(self.logger.isEnabledFor(logging.DEBUG))
+        self.assertEqual(logging.getLogger().handlers, handlers)
+
+        self._write('')
+        reloader.reload()
+
+        self.assertEqual(logging.getLogger('l4py.reload').level, logging.NOTSET)
+
+    def test_watch__should_reload_when_the_file_changes(self):
+        self._write('')
+        reloader = LevelReloader(self.file_name)
+        reloader.watch(interval=0.01)
+        try:
+            self._write(f'{utils.LOG_LEVEL_PREFIX}l4py.reload.module=ERROR\n')
+            for _ in range(200):
+                if self.logger.level == logging.ERROR:
+                    break
+                threading.Event().wait(0.01)
+        finally:
+            reloader.stop()
+
+        self.assertEqual(self.logger.level, logging.ERROR)
+
+    @unittest.skipUnless(hasattr(signal, 'SIGHUP'), 'SIGHUP')
+    def test_sighup__should_chain_to_the_handler_of_the_application(self):
+        received = []
+        application_handler = lambda signum, frame: received.append(signum)
+        self.addCleanup(signal.signal, signal.SIGHUP, signal.signal(signal.SIGHUP, application_handler))
+        self._write(f'{utils.LOG_LEVEL_PREFIX}l4py.reload.module=ERROR\n')
+
+        # nothing to reload without a file, nothing is installed by default
+        start_level_reload(sighup=True).stop()
+        start_level_reload(self.file_name, interval=60).stop()
+        self.assertIs(signal.getsignal(signal.SIGHUP), application_handler)
+
+        reloader = start_level_reload(self.file_name, interval=60, sighup=True)
+        try:
+            self.logger.setLevel(logging.WARNING)
+            os.kill(os.getpid(), signal.SIGHUP)
+
+            self.assertEqual(self.logger.level, logging.ERROR)
+            self.assertEqual(received, [signal.SIGHUP])
+        finally:
+            reloader.stop()
+        self.assertIs(signal.getsignal(signal.SIGHUP), application_handler)
+
+
+class AsgiMiddlewareTest(unittest.TestCase):
+
+    def setUp(self):
+        # other tests leave their trace_id / user_id bound
+        self.addCleanup(reset_context, clear_context())
+
+    def test_middleware__should_bind_the_context_per_request(self):
+        seen = {}
+        before = dict(get_context())
+
+        async def app(scope, receive, send):
+            await asyncio.sleep(0)
+            seen[scope['path']] = (get_trace_id(), get_user_id())
+            await send({'type': 'http.response.start', 'status': 200, 'headers': []})
+            await send({'type': 'http.response.body', 'body': b''})
+
+        middleware = aio.LoggingContextMiddleware(app, user_id_getter=lambda scope: scope.get('user'))
+
+        async def request(path, headers, user=None):
+            sent = []
+
+            async def send(message):
+                sent.append(message)
+
+            scope = {'type': 'http', 'path': path, 'headers': headers, 'user': user}
+            await middleware(scope, None, send)
+            return dict(sent[0]['headers'])[b'x-trace-id'].decode()
+
+        async def main():
+            return await asyncio.gather(
+                request('/a', [(b'x-trace-id', b'trace-a')], user='royman'),
+                request('/b', []),
+            )
+
+        trace_a, trace_b = asyncio.run(main())
+
+        self.assertEqual(trace_a, 'trace-a')
+        self.assertEqual(seen['/a'], ('trace-a', 'royman'))
+        self.assertEqual(seen['/b'], (trace_b, None))
+        self.assertEqual(len(trace_b), 32)
+        self.assertEqual(dict(get_context()), before)
+
+    def test_flush__should_wait_for_the_async_queue_without_blocking_the_loop(self):
+        stream = StringIO()
+        handler = AsyncQueueHandler([logging.StreamHandler(stream)])
+        root = logging.getLogger()
+        root.addHandler(handler)
+
+        async def main():
+            for i in range(100):
+                logging.getLogger('l4py.test.aio').warning('message %d', i)
+            ticks = 0
+
+            async def tick():
+                nonlocal ticks
+                ticks += 1
+
+            await asyncio.gather(aio.flush(), tick())
+            return ticks
+
+        try:
+            ticks = asyncio.run(main())
+        finally:
+            root.removeHandler(handler)
+            handler.close()
+
+        self.assertEqual(ticks, 1)
+        self.assertEqual(len([line for line in stream.getvalue().splitlines() if 'message' in line]), 100)
+
+
+class BinaryFileHandlerTest(TemporaryDirectoryTestCase):
+    file_base_name = 'app.bin'
+
+    def _records(self, count):
+        records = []
+        for i in range(count):
+            records.append(make_record(
+                'l4py.binary', logging.INFO, 'message %d', (i,), lineno=10, trace_id=f'trace-{i}', fields={'order_id': i},
+            ))
+        try:
+            1/0
+        except ZeroDivisionError:
+            records.append(make_record('l4py.binary', logging.ERROR, 'failed', exc_info=sys.exc_info(), lineno=11))
+        for record in records:
+            record.funcName = 'handle_order'
+        return records
+
+    def test_read__should_render_the_same_json_as_the_json_formatter(self):
+        records = self._records(20)
+        handler = BinaryFileHandler(self.file_name, app_name='binary-app', maxBytes=1024, backupCount=10)
+        try:
+            for record in records:
+                handler.handle(record)
+        finally:
+            handler.close()
+
+        segments = sorted(glob.glob(self.file_name + '.*'), reverse=True) + [self.file_name]
+        self.assertGreater(len(segments), 1)
+        lines = [line for segment in segments for line in binary.render(binary.read_records(segment))]
+
+        formatter = JsonFormatter(app_name='binary-app')
+        self.assertEqual(lines, [formatter.format(record) for record in records])
+
+    def test_segment_is_smaller_than_json_lines(self):
+        records = self._records(200)
+        handler = BinaryFileHandler(self.file_name)
+        try:
+            for record in records[:-1]:
+                handler.handle(record)
+        finally:
+            handler.close()
+
+        formatter = JsonFormatter()
+        json_size = sum(len(formatter.format(record)) + 1 for record in records[:-1])
+        self.assertLess(os.path.getsize(self.file_name), json_size / 2)
+
+    def test_cli_read__should_print_text(self):
+        handler = BinaryFileHandler(self.file_name, app_name='binary-app')
+        try:
+            for record in self._records(2):
+                handler.handle(record)
+        finally:
+            handler.close()
+
+        output = StringIO()
+        with contextlib.redirect_stdout(output):
+            cli.main(['read', '--format', 'text', self.file_name])
+
+        lines = output.getvalue().splitlines()
+        self.assertIn('binary-app l4py.binary tests.py:10', lines[0])
+        self.assertIn('message 0 order_id=0 trace_id: trace-0', lines[0])
+        self.assertIn('ZeroDivisionError: division by zero', output.getvalue())
+
+
+class IndexTest(TemporaryDirectoryTestCase):
+
+    def _write(self, count, start=0):
+        handler = IndexedRotatingFileHandler(self.file_name, maxBytes=16 * 1024, backupCount=50)
+        handler.setFormatter(JsonFormatter(app_name='index-app'))
+        try:
+            for i in range(start, start + count):
+                handler.handle(make_record(
+                    f'l4py.index.{i % 3}', logging.ERROR if i % 50 == 0 else logging.INFO, 'message %d', (i,), lineno=10,
+                    created=1700000000 + i, trace_id=f'trace-{i % 7}',
+                ))
+        finally:
+            handler.close()
+
+    def _segments(self):
+        rotated = sorted(glob.glob(self.file_name + '.*'), key=lambda name: int(name.rsplit('.', 1)[1]), reverse=True)
+        return rotated + [self.file_name]
+
+    def test_query__should_return_the_lines_of_a_trace_across_segments(self):
+        self._write(1000)
+        segments = self._segments()
+        self.assertGreater(len(segments), 2)
+        # the rotated segments were indexed in the background
+        self.assertIsNotNone(index.load_index(segments[0]))
+
+        lines = [json.loads(line) for line in index.query(segments, trace_id='trace-3', block_size=1024)]
+
+        self.assertEqual([entry['message'] for entry in lines], [f'message {i}' for i in range(1000) if i % 7 == 3])
+
+    def test_query__should_filter_by_time_level_and_logger(self):
+        self._write(300)
+        segments = self._segments()
+        since = datetime.fromtimestamp(1700000100).strftime('%Y-%m-%dT%H:%M:%S')
+        until = datetime.fromtimestamp(1700000200).strftime('%Y-%m-%dT%H:%M:%S')
+
+        lines = [json.loads(line) for line in index.query(segments, since=since, until=until, levels=['ERROR'])]
+        self.assertEqual([entry['message'] for entry in lines], ['message 100', 'message 150', 'message 200'])
+
+        lines = [json.loads(line) for line in index.query(segments, since=since, until=until, logger='l4py.index.1')]
+        self.assertEqual(len(lines), len([i for i in range(100, 201) if i % 3 == 1]))
+
+    def test_build_index__should_extend_the_index_of_a_growing_file(self):
+        self._write(10)
+        first = index.build_index(self.file_name, block_size=256)
+        self._write(10, start=10)
+        second = index.build_index(self.file_name, block_size=256)
+
+        self.assertEqual(second['blocks'][:len(first['blocks'])], first['blocks'])
+        self.assertEqual(second['size'], os.path.getsize(self.file_name))
+        self.assertEqual(len(list(index.query([self.file_name], trace_id='trace-1'))), 3)
+
+    def test_indexer__should_remove_the_indexes_of_deleted_segments(self):
+        handler = IndexedRotatingFileHandler(self.file_name, maxBytes=1024, backupCount=2)
+        try:
+            for i in range(200):
+                handler.handle(make_record('l4py.index', logging.INFO, 'message %d', (i,)))
+        finally:
+            handler.close()
+
+        index_files = os.listdir(self.path(index.INDEX_DIRECTORY))
+        segments = [name for name in self._segments() if name != self.file_name]
+        self.assertEqual(len(segments), 2)
+        self.assertEqual(
+            sorted(index_files), sorted(os.path.basename(index.index_file_name(name)) for name in segments)
+        )
+
+    def test_cli_query__should_print_the_matching_lines(self):
+        self._write(20)
+        with tempfile.TemporaryFile() as output:
+            with contextlib.redirect_stdout(open(output.fileno(), 'w', closefd=False)) as stdout:
+                cli.main(['query', '--trace-id', 'trace-2', '--level', 'INFO', self.file_name])
+                stdout.flush()
+            output.seek(0)
+            lines = [json.loads(line) for line in output.read().splitlines()]
+
+        self.assertEqual([entry['message'] for entry in lines], ['message 2', 'message 9', 'message 16'])
+
+
+class NetworkHandlerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.server = socket.create_server(('127.0.0.1', 0))
+        self.address = self.server.getsockname()
+        self.received = b''
+        self.receiver = threading.Thread(target=self._receive, daemon=True)
+        self.receiver.start()
+
+    def tearDown(self):
+        self.server.close()
+
+    def _receive(self):
+        try:
+            connection, _ = self.server.accept()
+        except OSError:
+            # closed by the test before anything connected
+            return
+        with connection:
+            while data := connection.recv(65536):
+                self.received += data
+
+    def _handler(self, address, **kwargs):
+        handler = NetworkHandler(address, flush_interval_ms=50, timeout=2, **kwargs)
+        handler.setFormatter(JsonFormatter(app_name='network-app'))
+        return handler
+
+    def _record(self, i, level=logging.INFO):
+        return make_record('l4py.network', level, 'message %d', (i,), lineno=10)
+
+    def test_ndjson__should_send_the_records_as_json_lines(self):
+        handler = self._handler(self.address, batch_size=1024)
+        for i in range(100):
+            handler.handle(self._record(i))
+        handler.close()
+        self.receiver.join(2)
+
+        lines = [json.loads(line) for line in self.received.splitlines()]
+        self.assertEqual([line['message'] for line in lines], [f'message {i}' for i in range(100)])
+        self.assertEqual(handler.sent, 100)
+
+    def test_syslog__should_use_octet_counting_on_tcp(self):
+        handler = self._handler(f'127.0.0.1:{self.address[1]}', framing='syslog')
+        handler.handle(self._record(1, logging.ERROR))
+        handler.handle(self._record(2))
+        handler.close()
+        self.receiver.join(2)
+
+        messages = []
+        data = self.received
+        while data:
+            length, _, data = data.partition(b' ')
+            messages.append(data[:int(length)].decode())
+            data = data[int(length):]
+        self.assertEqual(len(messages), 2)
+        self.assertRegex(messages[0], r'^<11>1 \S+ \S+ \S+ \d+ - - \{')
+        self.assertTrue(messages[1].startswith('<14>1 '))
+        self.assertEqual(json.loads(messages[1].split(' - - ', 1)[1])['message'], 'message 2')
+
+    def test_udp__should_pack_lines_into_datagrams(self):
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as server:
+            server.bind(('127.0.0.1', 0))
+            server.settimeout(2)
+            handler = self._handler(server.getsockname(), protocol='udp', max_datagram=2048)
+            for i in range(20):
+                handler.handle(self._record(i))
+            handler.close()
+
+            lines = []
+            while len(lines) < 20:
+                datagram = server.recv(65536)
+                self.assertLessEqual(len(datagram), 2048)
+                lines += datagram.splitlines()
+        self.assertEqual([json.loads(line)['message'] for line in lines], [f'message {i}' for i in range(20)])
+
+    def test_udp__should_drop_records_larger_than_a_datagram(self):
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as server:
+            server.bind(('127.0.0.1', 0))
+            server.settimeout(2)
+            # larger than max_datagram / larger than the socket accepts (EMSGSIZE)
+            for max_datagram in (8192, 1024 * 1024):
+                handler = self._handler(
+                    server.getsockname(), protocol='udp', max_datagram=max_datagram, batch_size=1024 * 1024
+                )
+                handler.handle(make_record('l4py.network', logging.INFO, 'x' * 70 * 1024))
+                for i in range(5):
+                    handler.handle(self._record(i))
+                with unittest.mock.patch.object(handler, '_report_dropped'):
+                    handler.close()
+
+                lines = []
+                while len(lines) < 5:
+                    lines += server.recv(65536).splitlines()
+                self.assertEqual([json.loads(line)['message'] for line in lines], [f'message {i}' for i in range(5)])
+                self.assertEqual((handler.sent, handler.dropped), (5, 1))
+
+    def test_reconnect__should_keep_the_backlog_until_the_collector_is_back(self):
+        with socket.socket() as placeholder:
+            placeholder.bind(('127.0.0.1', 0))
+            address = placeholder.getsockname()
+        handler = self._handler(address, backlog=50, max_backoff=0.2)
+        for i in range(60):
+            handler.handle(self._record(i))
+        # nothing listens yet, the caller is not blocked and the oldest records are dropped
+        self.assertEqual(handler.dropped, 10)
+
+        self.server.close()
+        self.server = socket.create_server(address)
+        self.receiver.join(2)
+        self.receiver = threading.Thread(target=self._receive, daemon=True)
+        self.receiver.start()
+        handler.flush()
+        handler.close()
+        self.receiver.join(2)
+
+        lines = [json.loads(line) for line in self.received.splitlines()]
+        self.assertEqual([line['message'] for line in lines], [f'message {i}' for i in range(10, 60)])
+
+    def test_builder__should_add_the_network_handler(self):
+        config = LogConfigBuilder().file_enabled(False).network(
+            f'127.0.0.1:{self.address[1]}', framing='syslog'
+        ).build_config()
+
+        self.assertEqual(config['handlers']['network']['()'], 'l4py.handlers.NetworkHandler')
+        self.assertIn('network', config['root']['handlers'])
+        self.assertEqual(config['formatters']['network']['()'], 'l4py.formatters.JsonFormatter')
+
+
+
+def _log_from_forked_child(handler: logging.Handler, broken: bool):
+    # exits with 1 if the worker of the parent was kept or the record was not handled as expected
+    if handler._process is not None:
+        sys.exit(1)
+    if broken:
+        handler.config['handlers']['file']['class'] = 'l4py.missing.Handler'
+        handler.handleError = unittest.mock.Mock()
+    for i in range(2):
+        handler.handle(make_record('l4py.process', logging.INFO, f'child {i}'))
+    if broken:
+        sys.exit(0 if handler.handleError.call_count == 1 and handler.dropped == 1 else 1)
+    handler.close()
+
+
+class ProcessHandlerTest(LoggingConfigTestCase):
+
+    def _handler(self, **kwargs):
+        return ProcessHandler(
+            handlers={'file': {'class': 'logging.FileHandler', 'filename': self.file_name, 'formatter': 'json'}},
+            formatters={'json': {'()': 'l4py.formatters.JsonFormatter', 'app_name': 'process-app'}},
+            **kwargs,
+        )
+
+    def _read(self):
+        with open(self.file_name) as file:
+            return [json.loads(line) for line in file]
+
+    def test_emit__should_format_and_write_on_the_worker(self):
+        handler = self._handler(batch_size=8)
+        handler.addFilter(ContextFilter())
+        token = bind(trace_id='trace-1', tenant='acme')
+        try:
+            for i in range(20):
+                handler.handle(make_record('l4py.process', logging.INFO, 'message %d', (i,), lineno=10))
+            try:
+                1 / 0
+            except ZeroDivisionError:
+                handler.handle(make_record('l4py.process', logging.ERROR, 'failed', exc_info=sys.exc_info(), lineno=11))
+        finally:
+            reset_context(token)
+        handler.flush()
+
+        lines = self._read()
+        self.assertEqual([line['message'] for line in lines[:20]], [f'message {i}' for i in range(20)])
+        self.assertEqual({(line['app_name'], line['trace_id'], line['tenant']) for line in lines}, {('process-app', 'trace-1', 'acme')})
+        self.assertRegex(lines[20]['exception'], r'(?s)^Traceback.*1 / 0.*ZeroDivisionError: division by zero$')
+        handler.close()
+        self.assertFalse(handler._process.is_alive())
+
+    def test_emit__should_fall_back_for_values_that_can_not_be_pickled(self):
+        class LocalError(Exception):
+            pass
+
+        handler = self._handler()
+        try:
+            raise LocalError('local')
+        except LocalError:
+            record = make_record('l4py.process', logging.ERROR, 'failed', exc_info=sys.exc_info(), lineno=10)
+        record.fields = {'lock': threading.Lock()}
+        handler.handle(record)
+        handler.close()
+
+        line, = self._read()
+        self.assertTrue(line['exception'].endswith('LocalError: local'))
+        self.assertIn('lock', line['lock'])
+
+    def test_start__should_raise_when_the_worker_can_not_build_the_handlers(self):
+        handler = ProcessHandler.__new__(ProcessHandler)
+        with self.assertRaisesRegex(RuntimeError, 'FileNotFoundError'):
+            handler.__init__(handlers={'file': {'class': 'logging.FileHandler', 'filename': self.path('missing/app.log')}})
+
+        # logging.shutdown flushes and closes the handlers, also the one that did not start
+        with unittest.mock.patch.object(logging, 'raiseExceptions', True):
+            logging.shutdown([ref for ref in logging._handlerList if ref() is handler])
+        self.assertTrue(handler._connection.closed)
+
+    def test_start__should_raise_when_the_main_module_starts_the_worker_again(self):
+        script = self.path('unguarded.py')
+        with open(script, 'w') as file:
+            file.write(
+                'from l4py import LogConfigBuilder\n'
+                f'LogConfigBuilder().console_enabled(False).file({self.file_name!r}).file_process(True).init()\n'
+            )
+
+        environ = {**os.environ, 'PYTHONPATH': os.path.dirname(os.path.abspath(__file__))}
+        result = subprocess.run([sys.executable, script], capture_output=True, text=True, timeout=60, env=environ)
+
+        self.assertNotEqual(result.returncode, 0)
+        self.assertIn('RuntimeError: the l4py worker process exited with code 1 while starting', result.stderr)
+        self.assertNotIn('AttributeError', result.stderr)
+
+    @unittest.skipUnless(hasattr(os, 'register_at_fork'), 'fork')
+    def test_fork__should_start_the_worker_of_the_child_with_its_first_record(self):
+        handler = self._handler()
+        context = multiprocessing.get_context('fork')
+        for broken in (False, True):
+            child = context.Process(target=_log_from_forked_child, args=(handler, broken))
+            child.start()
+            child.join(60)
+            self.assertEqual(child.exitcode, 0)
+        handler.handle(make_record('l4py.process', logging.INFO, 'parent'))
+        handler.close()
+
+        self.assertEqual(sorted(line['message'] for line in self._read()), ['child 0', 'child 1', 'parent'])
+
+    def test_builder__should_move_the_file_handler_to_the_worker(self):
+        builder = LogConfigBuilder()\
+            .root_logger(logging.INFO)\
+            .file(self.file_name)\
+            .file_process(True, batch_size=16)\
+            .add_sampler('l4py.process', 1.0)
+        config = builder.build_config()
+
+        file_handler = config['handlers']['file']
+        self.assertEqual(file_handler['()'], 'l4py.process.ProcessHandler')
+        self.assertEqual(file_handler['filters'], ['chain'])
+        self.assertEqual(file_handler['handlers']['file']['filters'], [])
+        self.assertNotIn('file', config['formatters'])
+
+        builder.init()
+        logging.getLogger().handlers[0].setStream(StringIO())
+        logging.getLogger('l4py.process').warning('from the %s', 'builder')
+        logging.getLogger().handlers[1].flush()
+        self.assertEqual(self._read()[0]['message'], 'from the builder')
+
+
+class RoutingTest(LoggingConfigTestCase):
+
+    def tearDown(self):
+        # resets the routed loggers
+        LogConfigBuilder().console_enabled(False).file_enabled(False).init()
+        super().tearDown()
+
+    def _builder(self):
+        return LogConfigBuilder()\
+            .root_logger(logging.INFO)\
+            .file(self.path('app.log'))\
+            .add_file_output('audit', self.path('audit.log'), json=False)\
+            .route('l4py.audit', 'audit')\
+            .route('l4py.noisy', 'console', level=logging.WARNING)
+
+    def _read(self, file_name):
+        for handler in logging.getLogger().handlers:
+            handler.flush()
+        with open(self.path(file_name)) as file:
+            return file.read().splitlines()
+
+    def test_builder__should_attach_the_outputs_to_the_routed_loggers(self):
+        with unittest.mock.patch.dict(os.environ, {f'{utils.LOG_LEVEL_PREFIX}l4py.audit': 'DEBUG'}):
+            config = self._builder().build_config()
+
+        self.assertEqual(config['loggers']['l4py.audit'], {'level': 'DEBUG', 'handlers': ['file_audit'], 'propagate': False})
+        self.assertEqual(config['loggers']['l4py.noisy'], {'level': logging.WARNING, 'handlers': ['console'], 'propagate': False})
+        self.assertEqual(config['handlers']['file_audit']['filters'], ['chain'])
+        self.assertEqual(config['root']['handlers'], ['console', 'file'])
+
+        config = self._builder().async_handlers(True).build_config()
+        self.assertEqual(config['loggers']['l4py.audit']['handlers'], ['queue_route_0'])
+        self.assertEqual(config['handlers']['queue_route_0']['handlers'], ['cfg://handlers.file_audit'])
+        self.assertEqual(config['handlers']['file_audit']['filters'], [])
+
+    def test_init__should_dispatch_the_records_to_the_routed_outputs_only(self):
+        self._builder().init()
+        console = StringIO()
+        logging.getLogger().handlers[0].setStream(console)
+
+        logging.getLogger('l4py.audit.login').info('user %s logged in', 'royman')
+        logging.getLogger('l4py.noisy').info('dropped by the level')
+        logging.getLogger('l4py.noisy').warning('noisy warning')
+        logging.getLogger('l4py.app').info('application')
+
+        # the plain text formatter appends the context fields to the message
+        messages = lambda lines: [line.split(': ', 1)[1].split(' trace_id: ')[0] for line in lines]
+        self.assertEqual(messages(self._read('audit.log')), ['user royman logged in'])
+        self.assertEqual([json.loads(line)['message'] for line in self._read('app.log')], ['application'])
+        self.assertEqual(messages(console.getvalue().splitlines()), ['noisy warning', 'application'])
+
+    def test_init__should_reset_the_loggers_of_removed_routes(self):
+        for direct in (False, True):
+            self._builder().init(direct=direct)
+            self.assertEqual(config.routed_loggers, {'l4py.audit', 'l4py.noisy'})
+            LogConfigBuilder().console_enabled(False).file(self.path('app.log')).init(direct=direct)
+
+            audit = logging.getLogger('l4py.audit')
+            self.assertEqual((audit.handlers, audit.propagate, audit.level), ([], True, logging.NOTSET))
+            self.assertEqual(config.routed_loggers, set())
+            audit.warning('after the routes, direct=%s', direct)
+            self.assertEqual(json.loads(self._read('app.log')[-1])['message'], f'after the routes, direct={direct}')
+            self.assertEqual(self._read('audit.log'), [])
+
+    def test_builder__should_reject_unknown_outputs(self):
+        with self.assertRaises(ValueError):
+            LogConfigBuilder().route('l4py.audit', 'audit').build_config()
+        with self.assertRaises(ValueError):
+            LogConfigBuilder().file_enabled(False).route('l4py.audit', 'file').build_config()
+        with self.assertRaises(ValueError):
+            self._builder().tail_sampling(True).build_config()
+
+
+class MetricsTest(LoggingConfigTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.metrics = metrics.Metrics()
+
+    def _init(self, enabled):
+        LogConfigBuilder()\
+            .root_logger(logging.INFO)\
+            .file(self.path('app.log'))\
+            .add_sampler('l4py.metrics.muted', 0.0)\
+            .init()
+        logging.getLogger().handlers[0].setStream(StringIO())
+        logging.getLogger().handlers[1].maxBytes = 2048
+        if enabled:
+            metrics.instrument(self.metrics)
+
+    def _counter(self, name, **labels):
+        return sum(
+            counter['value'] for counter in self.metrics.snapshot()['counters']
+            if counter['name'] == name and labels.items() <= counter['labels'].items()
+        )
+
+    def test_instrument__should_count_records_bytes_and_rotations(self):
+        self._init(True)
+        for i in range(30):
+            logging.getLogger('l4py.metrics').info('message %d', i)
+        logging.getLogger('l4py.metrics.muted').warning('muted')
+        logging.getLogger().handlers[1].flush()
+
+        self.assertEqual(self._counter('l4py_records_total', logger='l4py.metrics', level='INFO'), 30)
+        self.assertEqual(self._counter('l4py_records_filtered_total', logger='l4py.metrics.muted'), 1)
+        self.assertEqual(self._counter('l4py_records_filtered_total', logger='l4py.metrics'), 0)
+        self.assertGreater(self._counter('l4py_rotations_total', handler='file'), 0)
+        console_bytes = len(logging.getLogger().handlers[0].stream.getvalue())
+        self.assertEqual(self._counter('l4py_handler_bytes_total', handler='console'), console_bytes)
+        file_bytes = sum(os.path.getsize(name) for name in glob.glob(self.path('app.log*')))
+        self.assertEqual(self._counter('l4py_handler_bytes_total', handler='file'), file_bytes)
+
+        histograms = {(h['name'], tuple(h['labels'].values())): h for h in self.metrics.snapshot()['histograms']}
+        self.assertEqual(histograms[('l4py_emit_seconds', ('console',))]['count'], 30)
+        self.assertEqual(histograms[('l4py_format_seconds', ('TextFormatter',))]['count'], 30)
+
+    def test_export__should_render_prometheus_and_json(self):
+        self._init(True)
+        logging.getLogger('l4py.metrics').warning('quote " in the logger labels')
+
+        text = self.metrics.to_prometheus()
+        self.assertIn('# TYPE l4py_records_total counter', text)
+        self.assertIn('l4py_records_total{logger="l4py.metrics",level="WARNING"} 1', text)
+        self.assertIn('l4py_emit_seconds_bucket{handler="console",le="+Inf"} 1', text)
+        self.assertIn('l4py_emit_seconds_count{handler="console"} 1', text)
+        self.assertEqual(json.loads(self.metrics.to_json()), self.metrics.snapshot())
+
+    def test_disabled__should_not_touch_the_handlers(self):
+        self._init(False)
+        handler = logging.getLogger().handlers[0]
+
+        self.assertNotIn('emit', handler.__dict__)
+        self.assertNotIn('format', handler.formatter.__dict__)
+
 
 if __name__ == '__main__':
     unittest.main()